@@ -1,4 +1,4 @@
-import request from '../utils/request';
+import request, { API_BASE_URL, batchRequest } from '../utils/request';
 type QueryStockByWordResponse = {
   代码: string;
   名称: string;
@@ -16,15 +16,29 @@ export interface KlineDataItem {
   percent: number; // 涨跌幅
   turnoverrate: number; // 换手率
 }
+// K线页面打开时同时发起的接口（K线、指标、详情、自选、备注、画线）经 batchRequest 合并为一次请求
 export const getKlineDataApi = (
   code: string,
   period: string,
   timestamp: string,
   limit: number,
 ) =>
-  request.get<KlineDataItem[]>(
-    `/kline?code=${code}&period=${period}&timestamp=${timestamp}&limit=${limit}`,
-  );
+  batchRequest<KlineDataItem[]>({
+    path: '/kline',
+    params: { code, period, timestamp, limit },
+  });
+// 技术指标：指标名（ma5、macd、k、rsi6、boll_upper等）-> 与K线对齐的序列，数据不足时为 null
+export type IndicatorData = Record<string, (number | null)[]>;
+export const getIndicatorsApi = (
+  code: string,
+  period: string,
+  timestamp: string,
+  limit: number,
+) =>
+  batchRequest<IndicatorData>({
+    path: '/indicators',
+    params: { code, period, timestamp, limit },
+  });
 // 个股详情
 export interface KlineDetailsType {
   name: string; // 股票名称
@@ -45,7 +59,7 @@ export interface KlineDetailsType {
   turnover_rate: number; // 换手率
 }
 export const getKlineDetailsApi = (code: string) =>
-  request.get<KlineDetailsType>(`/stock_details?code=${code}`);
+  batchRequest<KlineDetailsType>({ path: '/stock_details', params: { code } });
 
 // 获取自选列表
 export interface SelectionItem {
@@ -59,7 +73,10 @@ export const getSelectionApi = () =>
   request.get<SelectionItem[]>('/get_selection');
 
 export const getSelectionRemarkApi = (code: string) =>
-  request.get<SelectionItem>('/get_selection_remark?code=' + code);
+  batchRequest<SelectionItem>({
+    path: '/get_selection_remark',
+    params: { code },
+  });
 
 export type SelectionDetailsItem = Pick<
   KlineDetailsType,
@@ -70,6 +87,30 @@ export const getSelectionDetails = (symbols: string) =>
     '/get_selection_detail?symbols=' + symbols,
   );
 
+// 行情推送（SSE）：首次推送完整行情，之后只推送变化的字段
+// 连接被拒绝（如服务端推送连接数已满返回503）时浏览器不再重连，通过 onClosed 通知调用方
+export type QuoteStreamItem = Partial<SelectionDetailsItem> & {
+  symbol: string;
+  code: string;
+};
+export const subscribeQuoteStream = (
+  symbols: string,
+  onQuote: (quote: QuoteStreamItem) => void,
+  onClosed?: () => void,
+) => {
+  const source = new EventSource(`${API_BASE_URL}/stream?symbols=${symbols}`);
+  source.addEventListener('quote', (event) => {
+    onQuote(JSON.parse((event as MessageEvent<string>).data));
+  });
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED && onClosed) {
+      onClosed();
+    }
+  };
+  // 返回取消订阅函数
+  return () => source.close();
+};
+
 // 添加自选
 export const addSelectionApi = (
   code: string,
@@ -87,7 +128,7 @@ export const deleteSelectionApi = (code: string) =>
 
 // 检查自选是否存在
 export const isSelectionExistsApi = (code: string) =>
-  request.get<boolean>('/is_selection_exists?code=' + code);
+  batchRequest<boolean>({ path: '/is_selection_exists', params: { code } });
 
 // 获取自选三省列表
 export interface StockReviewItem {
@@ -97,9 +138,15 @@ export interface StockReviewItem {
   date: string; // 股票日期
   description: string; // 描述
 }
-export const getStockReviewApi = (type: string, keyword: string) =>
+// 列表按日期倒序分页返回，不含description
+export const getStockReviewApi = (
+  type: string,
+  keyword: string,
+  page: number,
+  pageSize: number,
+) =>
   request.get<StockReviewItem[]>(
-    `/get_stock_review?type=${type}&keyword=${keyword}`,
+    `/get_stock_review?type=${type}&keyword=${keyword}&page=${page}&page_size=${pageSize}`,
   );
 
 export const getSingleStockReviewApi = (type: string, id: string) =>
@@ -136,6 +183,16 @@ export interface MarketAnalysisItem {
 export const getAnalysisApi = (code: string) =>
   request.get<MarketAnalysisItem>(`/get_analysis_info?code=${code}`);
 
+// 按日期范围（年-月-日，包含边界）获取多个代码的历史分析
+export const getAnalysisHistoryApi = (
+  code: string,
+  begin: string,
+  end: string,
+) =>
+  request.get<{ [key: string]: { date: string; analysis: string }[] }>(
+    `/get_analysis_history?code=${code}&begin=${begin}&end=${end}`,
+  );
+
 export const addAnalysisApi = (code: string, analysis: string) =>
   request.post<boolean>('/add_analysis_info', {
     analysis,
@@ -160,9 +217,10 @@ export interface StockLineType {
   height: number;
 }
 export const getStockLineApi = (code: string, period: string) =>
-  request.post<StockLineType>('/query_lines', {
-    code,
-    period,
+  batchRequest<StockLineType>({
+    path: '/query_lines',
+    method: 'POST',
+    body: { code, period },
   });
 
 // 添加
@@ -12,11 +12,15 @@ import StockKlineChartVolume, {
   StockKlineChartVolumeBar,
 } from './StockKlineChartVolume';
 import StockKlineChartStick from './StockKlineChartStick';
-import { mapKlineToSvg, calculateMA } from './util';
+import { mapKlineToSvg } from './util';
 import klineConfig from './config';
 import { Radio } from 'antd';
 import { useEffect, useState, useMemo } from 'react';
-import { getKlineDataApi, type KlineDataItem } from '@/apis/api';
+import {
+  getKlineDataApi,
+  getIndicatorsApi,
+  type KlineDataItem,
+} from '@/apis/api';
 export default function StockKlineChartMain({
   code,
   width,
@@ -40,11 +44,24 @@ export default function StockKlineChartMain({
     // 定义获取K线数据的函数
     const fetchKlineData = () => {
       if (code) {
-        getKlineDataApi(code, period, timestamp, limit).then((response) => {
+        Promise.all([
+          getKlineDataApi(code, period, timestamp, limit),
+          // 指标获取失败时不影响K线显示
+          getIndicatorsApi(code, period, timestamp, limit).catch(() => null),
+        ]).then(([response, indicators]) => {
           if (response && response.data) {
             let newData = response.data;
             newData = newData.slice(Math.max(newData.length - 100, 0));
             setData(newData);
+            // 均线由服务端计算，按K线条数对齐，缺失值用-1表示
+            const maData = klineConfig.averageLineConfig.map((item) => {
+              const values = (
+                indicators?.data?.[`ma${item.period}`] || []
+              ).slice(-newData.length);
+              const offset = newData.length - values.length;
+              return newData.map((_, index) => values[index - offset] ?? -1);
+            });
+            setMaData(maData);
             setSelectIndex(newData.length - 1);
             const maxPrice = Math.max(...newData.map((item) => item.high));
             const minPrice = Math.min(...newData.map((item) => item.low));
@@ -81,17 +98,6 @@ export default function StockKlineChartMain({
     [height, minPrice, maxPrice],
   );
 
-  // 4. 计算MA数据
-  useEffect(() => {
-    if (data.length > 0) {
-      const maData = klineConfig.averageLineConfig.map((item) => {
-        return calculateMA(data, item.period);
-      });
-      setMaData(maData);
-      // 这里可以将maData存储到状态中，如果需要在其他组件中使用
-    }
-  }, [data]);
-
   return (
     <div style={{ width: width + 'px' }}>
       {!timestamp && <StockKlineChartDetails code={code} />}
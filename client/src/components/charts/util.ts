@@ -1,5 +1,4 @@
 import klineConfig from './config';
-import type { KlineDataType } from './types';
 import type { LinePoint } from '@/apis/api';
 export function mapKlineToSvg(
   svgHeight: number,
@@ -69,39 +68,6 @@ export const formatVolume = (volume: number): string => {
   }
 };
 
-export function calculateMA(data: KlineDataType[], period: number): number[] {
-  // 验证输入
-  if (!Array.isArray(data) || data.length === 0) {
-    return []; // 如果数据为空，返回空数组
-  }
-
-  const result = [];
-
-  // 遍历所有K线数据
-  for (let i = 0; i < data.length; i++) {
-    // 前period-1个数据点无法计算均线，用null表示
-    if (i < period - 1) {
-      result.push(-1);
-      continue;
-    }
-
-    // 计算从i-period+1到i的收盘价平均值
-    let sum = 0;
-    for (let j = 0; j < period; j++) {
-      // 确保数据点有收盘价属性
-      if (data[i - j] && typeof data[i - j].close === 'number') {
-        sum += data[i - j].close;
-      } else {
-        throw new Error(`第${i - j}个数据点缺少有效的收盘价`);
-      }
-    }
-    // 计算平均值并保留适当的小数位数
-    const average = sum / period;
-    result.push(Number(average.toFixed(2))); // 保留两位小数
-  }
-  return result;
-}
-
 // 计算贯穿线的起点和终点（确保线条穿过整个SVG）
 export const getLinePoints = (
   start: LinePoint,
@@ -1,6 +1,7 @@
 import {
   getSelectionApi,
   getSelectionDetails,
+  subscribeQuoteStream,
   updateSelectionSortApi,
   type SelectionItem,
   type SelectionDetailsItem,
@@ -12,6 +13,8 @@ import './index.css';
 import { useNavigate } from 'react-router-dom';
 import { SwapOutlined } from '@ant-design/icons';
 import { Modal, InputNumber, type InputNumberProps } from 'antd';
+// 推送不可用时轮询行情的间隔（毫秒）
+const POLL_INTERVAL = 5000;
 export default function App({ code }: { code: string }) {
   // 订阅刷新标识，当它变化时会触发组件更新
   const refreshFlag = useSelectionStore((state) => state.refreshFlag);
@@ -40,8 +43,10 @@ export default function App({ code }: { code: string }) {
     if (refreshFlag > 0) initData();
   }, [refreshFlag]);
   useEffect(() => {
-    // 存储定时器ID，用于清理
-    let intervalId: NodeJS.Timeout;
+    // 取消推送订阅的函数，用于清理
+    let unsubscribe: (() => void) | undefined;
+    // 推送连接被拒绝时改为轮询
+    let pollTimer: ReturnType<typeof setInterval> | undefined;
 
     // 定义请求数据的函数
     const fetchData = async () => {
@@ -61,15 +66,30 @@ export default function App({ code }: { code: string }) {
     // 立即执行一次请求
     fetchData();
 
-    // 设置轮询：每隔5秒请求一次（时间可根据需求调整）
+    // 交易时间内订阅服务端推送，只合并变化的字段（替代每秒轮询）
     if (symbols && isInStockTradingTime()) {
-      intervalId = setInterval(fetchData, 1000);
+      unsubscribe = subscribeQuoteStream(
+        symbols,
+        (quote) => {
+          setDynamicData((prev) =>
+            prev.map((item) =>
+              item.code === quote.code ? { ...item, ...quote } : item,
+            ),
+          );
+        },
+        () => {
+          pollTimer = setInterval(fetchData, POLL_INTERVAL);
+        },
+      );
     }
 
-    // 清理函数：组件卸载或code变化时清除定时器
+    // 清理函数：组件卸载或code变化时关闭推送连接
     return () => {
-      if (intervalId) {
-        clearInterval(intervalId);
+      if (unsubscribe) {
+        unsubscribe();
+      }
+      if (pollTimer) {
+        clearInterval(pollTimer);
       }
     };
   }, [symbols]);
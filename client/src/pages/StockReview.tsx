@@ -18,26 +18,52 @@ import {
   addStockReviewApi,
   type StockReviewItem,
 } from '@/apis/api';
+const PAGE_SIZE = 10;
 export default function StockReview() {
   const { type } = useParams<{ type: string }>();
   const [modalOpen, setModalOpen] = useState(false);
-  const [list, setList] = useState<StockReviewItem[]>([]);
   const [showData, setShowData] = useState<StockReviewItem[]>([]);
   const [keyword, setKeyword] = useState('');
+  const [page, setPage] = useState(1);
   const [more, setMore] = useState(false);
+  const [loading, setLoading] = useState(false);
+  // 切换类型时在渲染阶段重置分页，避免请求新类型时仍带着旧的页码
+  const [listType, setListType] = useState(type);
+  if (type !== listType) {
+    setListType(type);
+    setPage(1);
+    setShowData([]);
+    setMore(false);
+  }
   useEffect(() => {
-    if (type) {
-      getStockReviewApi(type, keyword).then((res) => {
-        if (res && res.data) {
-          setList(res.data);
-          setShowData(res.data.slice(0, 10));
-          setMore(res.data.length > 10);
+    if (!type) {
+      return;
+    }
+    // 参数变化后到达的旧响应直接丢弃，避免不同类型、关键字的结果混在一起
+    let ignore = false;
+    setLoading(true);
+    getStockReviewApi(type, keyword, page, PAGE_SIZE)
+      .then((res) => {
+        if (ignore || !res || !res.data) {
+          return;
+        }
+        setShowData((prev) =>
+          page === 1 ? res.data : [...prev, ...res.data],
+        );
+        setMore(res.data.length === PAGE_SIZE);
+      })
+      .finally(() => {
+        if (!ignore) {
+          setLoading(false);
         }
       });
-    }
-  }, [type, keyword]);
+    return () => {
+      ignore = true;
+    };
+  }, [type, keyword, page]);
   const onSearch = (value: string) => {
     setKeyword(value);
+    setPage(1);
   };
   return (
     <div className="relative w100p h100p overflow-hidden">
@@ -64,7 +90,16 @@ export default function StockReview() {
         />
         <List
           size="large"
-          footer={more ? <div>show more</div> : null}
+          footer={
+            more ? (
+              <div
+                className="rs-show-more"
+                onClick={() => !loading && setPage(page + 1)}
+              >
+                {loading ? 'loading...' : 'show more'}
+              </div>
+            ) : null
+          }
           bordered
           dataSource={showData}
           renderItem={(item) => (
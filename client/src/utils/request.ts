@@ -223,9 +223,13 @@ const createRequest = (defaultConfig: Omit<RequestConfig, 'url'> = {}) => {
   };
 };
 
+// 接口基础 URL（从环境变量获取），推送连接（EventSource）也使用该地址
+export const API_BASE_URL: string =
+  import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+
 // 创建默认请求实例
 const request = createRequest({
-  baseURL: import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000', // 从环境变量获取基础 URL
+  baseURL: API_BASE_URL,
 });
 
 // 示例：添加请求拦截器（如添加 Token）
@@ -248,4 +252,82 @@ request.setErrorInterceptor((error) => {
   return error;
 });
 
+// 批量请求：同一轮事件循环内发起的请求合并为一次 /batch 调用，服务端并发执行后按顺序返回
+export interface BatchItem {
+  path: string;
+  method?: 'GET' | 'POST';
+  // GET 请求的查询参数
+  params?: Record<string, unknown>;
+  // POST 请求的请求体
+  body?: Record<string, unknown>;
+}
+
+interface BatchResult {
+  status: number;
+  body: ResponseData<unknown>;
+}
+
+interface BatchEntry {
+  item: BatchItem;
+  resolve: (value: ResponseData<unknown>) => void;
+  reject: (reason: unknown) => void;
+}
+
+// 与服务端 MAX_BATCH_SIZE 一致
+const MAX_BATCH_SIZE = 20;
+let batchQueue: BatchEntry[] = [];
+
+const flushBatch = () => {
+  const queue = batchQueue;
+  batchQueue = [];
+  for (let i = 0; i < queue.length; i += MAX_BATCH_SIZE) {
+    const chunk = queue.slice(i, i + MAX_BATCH_SIZE);
+    if (chunk.length === 1) {
+      // 只有一个请求时直接发送（保留单个接口的 ETag 协商缓存）
+      const { item, resolve, reject } = chunk[0];
+      const method = item.method || 'GET';
+      request
+        .request<unknown>({
+          url: item.path,
+          method,
+          data: method === 'GET' ? item.params : item.body,
+        })
+        .then(resolve, reject);
+      continue;
+    }
+    request
+      .post<BatchResult[]>('/batch', { requests: chunk.map((entry) => entry.item) })
+      .then((res) => {
+        chunk.forEach((entry, j) => {
+          const result = res.data?.[j];
+          if (result && result.status >= 200 && result.status < 300) {
+            entry.resolve(result.body);
+          } else {
+            // 与单个请求失败时的错误格式一致
+            entry.reject({
+              success: false,
+              message:
+                result?.body?.message ||
+                `Request failed with status ${result?.status}`,
+              data: null,
+            });
+          }
+        });
+      })
+      .catch((error) => chunk.forEach((entry) => entry.reject(error)));
+  }
+};
+
+export const batchRequest = <T>(item: BatchItem): Promise<ResponseData<T>> =>
+  new Promise((resolve, reject) => {
+    batchQueue.push({
+      item,
+      resolve: resolve as (value: ResponseData<unknown>) => void,
+      reject,
+    });
+    if (batchQueue.length === 1) {
+      setTimeout(flushBatch, 0);
+    }
+  });
+
 export default request;
@@ -0,0 +1,418 @@
+import itertools
+import os
+from typing import Dict, List, Optional, Tuple
+from bar_file import COLUMNS, BarFile
+from kline_store import KLINES_DIR
+from process_pool import PROCESS_WORKERS, get_process_pool
+from resample import RESAMPLE_RULES, resample
+from screener import (
+    BAR_FEATURES,
+    WINDOW_PATTERN,
+    evaluate_expression,
+    parse_expression,
+)
+
+# 交易成本：佣金（双向）与印花税（卖出）
+COMMISSION = 0.0003
+STAMP_DUTY = 0.0005
+# 各周期每年的K线数量（用于年化）
+BARS_PER_YEAR = {
+    "day": 244,
+    "week": 52,
+    "month": 12,
+    "60m": 244 * 4,
+    "30m": 244 * 8,
+    "15m": 244 * 16,
+    "5m": 244 * 48,
+    "1m": 244 * 240,
+}
+# 参数组合数量上限
+MAX_COMBINATIONS = 200
+# 返回的资金曲线最多保留的点数
+MAX_CURVE_POINTS = 500
+# 全市场回测支持的周期（全市场只在本地预取日线，周线、月线由日线合成）
+UNIVERSE_PERIODS = ("day", "week", "month")
+# 接口最多返回的缺少本地K线的代码数量
+MAX_MISSING_CODES = 100
+
+_FIELDS = [name for name, _ in COLUMNS]
+
+
+def load_bars(np, code: str, period: str, base_dir: str = KLINES_DIR) -> Dict:
+    """
+    从本地K线存储读取全部K线（不访问网络），返回 {字段: 数组}
+    周线、月线和N分钟线由本地基础周期合成
+    """
+    base_period = RESAMPLE_RULES[period][0] if period in RESAMPLE_RULES else period
+    bar_file = BarFile(os.path.join(base_dir, code, f"{base_period}.bars"))
+    try:
+        if period in RESAMPLE_RULES:
+            bars = resample(bar_file.slice(), period)
+            columns = list(zip(*bars)) if bars else [()] * len(_FIELDS)
+            return {
+                name: np.array(values, dtype=float)
+                for name, values in zip(_FIELDS, columns)
+            }
+        result = {}
+        for name in _FIELDS:
+            view = bar_file.view(name)
+            result[name] = np.array(view, dtype=float)
+            view.release()
+        return result
+    finally:
+        bar_file.close()
+
+
+def _shift(np, values, count: int):
+    """序列整体后移 count 位，前面补NaN"""
+    shifted = np.full(len(values), np.nan)
+    if count < len(values):
+        shifted[count:] = values[: len(values) - count]
+    return shifted
+
+
+def _rolling(np, values, window: int, reducer):
+    """滑动窗口统计，前 window-1 个位置为NaN"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        result[window - 1 :] = reducer(windows, axis=1)
+    return result
+
+
+def feature_series(np, bars: Dict, name: str):
+    """特征在每根K线上的取值（与选股使用相同的字段定义）"""
+    if name in BAR_FEATURES:
+        return bars[name]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if name == "vol_ratio":
+            previous = _shift(np, _rolling(np, bars["volume"], 5, np.mean), 1)
+            return bars["volume"] / previous
+        prefix, window = WINDOW_PATTERN.match(name).groups()
+        window = int(window)
+        if prefix == "ma":
+            return _rolling(np, bars["close"], window, np.mean)
+        if prefix == "vma":
+            return _rolling(np, bars["volume"], window, np.mean)
+        if prefix == "ret":
+            return (bars["close"] / _shift(np, bars["close"], window) - 1) * 100
+        if prefix == "hhv":
+            return _rolling(np, bars["high"], window, np.max)
+        return _rolling(np, bars["low"], window, np.min)
+
+
+def _signal(np, bars: Dict, expression: str, cache: Dict):
+    tree, features = parse_expression(expression)
+    for name in features:
+        if name not in cache:
+            cache[name] = feature_series(np, bars, name)
+    result = np.asarray(evaluate_expression(np, tree, cache), dtype=bool)
+    if result.ndim == 0:
+        result = np.full(len(bars["close"]), bool(result))
+    return result
+
+
+def _positions(np, entry, exit_):
+    """
+    由买卖信号得到每根K线收盘后的持仓（1持有、0空仓）
+    同一根K线同时出现买卖信号时以卖出为准
+    """
+    state = np.where(exit_, 0.0, np.where(entry, 1.0, np.nan))
+    # 向前填充最近一次信号
+    index = np.where(np.isnan(state), 0, np.arange(len(state)))
+    np.maximum.accumulate(index, out=index)
+    filled = state[index]
+    filled[np.isnan(filled)] = 0.0
+    return filled
+
+
+def run_backtest(np, bars: Dict, entry: str, exit_: str, bars_per_year: int):
+    """
+    单只股票回测：收盘产生信号，下一根K线开盘成交，全仓进出
+    返回 (统计, 每根K线的净值, 交易列表)
+    """
+    close, open_ = bars["close"], bars["open"]
+    count = len(close)
+    cache = {}
+    signal = _positions(
+        np, _signal(np, bars, entry, cache), _signal(np, bars, exit_, cache)
+    )
+    # 第 t 根K线的实际持仓来自第 t-1 根收盘的信号
+    held = np.concatenate([[0.0], signal[:-1]]).astype(bool)
+    prev_held = np.concatenate([[False], held[:-1]])
+    prev_close = np.concatenate([[np.nan], close[:-1]])
+
+    buy = held & ~prev_held
+    sell = ~held & prev_held
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.select(
+            [held & prev_held, buy, sell],
+            [close / prev_close - 1, close / open_ - 1, open_ / prev_close - 1],
+            0.0,
+        )
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    returns -= buy * COMMISSION + sell * (COMMISSION + STAMP_DUTY)
+    equity = np.cumprod(1 + returns)
+
+    # 逐笔交易：按买入次序分组累乘收益
+    trade_id = np.cumsum(buy)
+    in_trade = held | sell
+    trade_returns = np.array([])
+    if buy.any():
+        log_returns = np.log1p(returns)
+        sums = np.bincount(
+            trade_id[in_trade], weights=log_returns[in_trade], minlength=0
+        )
+        trade_returns = np.expm1(sums[1:])
+    trades = [
+        {
+            "buy": int(bars["timestamp"][i]),
+            "sell": int(bars["timestamp"][j]) if j is not None else None,
+            "return": round(float(r) * 100, 2),
+        }
+        for i, j, r in zip(
+            np.flatnonzero(buy).tolist(),
+            np.flatnonzero(sell).tolist() + [None],
+            trade_returns.tolist(),
+        )
+    ]
+
+    years = count / bars_per_year if count else 0
+    peak = np.maximum.accumulate(equity) if count else equity
+    drawdown = (equity / peak - 1).min() if count else 0.0
+    std = returns.std()
+    stats = {
+        "bars": count,
+        "trades": len(trades),
+        "total_return": round(float(equity[-1] - 1) * 100, 2) if count else 0.0,
+        "annual_return": (
+            round(float(equity[-1] ** (1 / years) - 1) * 100, 2)
+            if years and equity[-1] > 0
+            else 0.0
+        ),
+        "max_drawdown": round(float(drawdown) * 100, 2),
+        "sharpe": (
+            round(float(returns.mean() / std * np.sqrt(bars_per_year)), 2)
+            if std > 0
+            else 0.0
+        ),
+        "win_rate": (
+            round(float((trade_returns > 0).mean()) * 100, 2) if len(trades) else 0.0
+        ),
+        "exposure": round(float(held.mean()) * 100, 2) if count else 0.0,
+    }
+    return stats, equity, trades
+
+
+def _slice_range(np, bars: Dict, begin: Optional[int], end: Optional[int]) -> Dict:
+    timestamps = bars["timestamp"]
+    start = np.searchsorted(timestamps, begin) if begin else 0
+    stop = np.searchsorted(timestamps, end, side="right") if end else len(timestamps)
+    return {name: values[start:stop] for name, values in bars.items()}
+
+
+def _backtest_task(
+    codes: List[str],
+    period: str,
+    entry: str,
+    exit_: str,
+    begin: Optional[int],
+    end: Optional[int],
+    with_curve: bool,
+    base_dir: str,
+):
+    """回测一组股票（在子进程中执行），返回 [(代码, 统计, 资金曲线, 交易列表)]"""
+    import numpy as np
+
+    results = []
+    for code in codes:
+        bars = _slice_range(np, load_bars(np, code, period, base_dir), begin, end)
+        if not len(bars["close"]):
+            continue
+        stats, equity, trades = run_backtest(
+            np, bars, entry, exit_, BARS_PER_YEAR.get(period, 244)
+        )
+        curve = None
+        if with_curve:
+            step = max(len(equity) // MAX_CURVE_POINTS, 1)
+            picked = np.arange(len(equity) - 1, -1, -step)[::-1]
+            curve = {
+                "timestamp": bars["timestamp"][picked].astype(int).tolist(),
+                "equity": np.round(equity[picked], 4).tolist(),
+            }
+        results.append((code, stats, curve, trades))
+    return results
+
+
+def expand_params(entry: str, exit_: str, params: str) -> List[Tuple[Dict, str, str]]:
+    """
+    展开参数组合：params 形如 n=5,10,20;m=2,3，表达式中用 {n}、{m} 引用
+    返回 [(参数, 买入表达式, 卖出表达式)]
+    """
+    grid = {}
+    for item in filter(None, (part.strip() for part in params.split(";"))):
+        name, _, values = item.partition("=")
+        if not name.strip().isidentifier() or not values:
+            raise ValueError(f"参数格式错误: {item}")
+        grid[name.strip()] = [
+            float(v) if "." in v else int(v) for v in values.split(",")
+        ]
+    combinations = list(itertools.product(*grid.values()))
+    if len(combinations) > MAX_COMBINATIONS:
+        raise ValueError(f"参数组合过多（上限{MAX_COMBINATIONS}）")
+    expanded = []
+    for values in combinations:
+        combo = dict(zip(grid, values))
+        try:
+            formatted = (entry.format(**combo), exit_.format(**combo))
+        except (KeyError, IndexError):
+            raise ValueError("表达式中引用了未定义的参数")
+        for expression in formatted:
+            parse_expression(expression)
+        expanded.append((combo, *formatted))
+    return expanded
+
+
+class Backtester:
+    """回测调度：多只股票或多组参数时分片交给共享进程池并行执行"""
+
+    def __init__(self, base_dir: str = KLINES_DIR, max_workers: int = PROCESS_WORKERS):
+        self._base_dir = os.path.abspath(base_dir)
+        self._max_workers = max_workers
+
+    def _run(self, tasks: List[Tuple]):
+        """执行 _backtest_task 参数列表，单个任务时在当前进程执行"""
+        if len(tasks) == 1 or self._max_workers <= 1:
+            return [_backtest_task(*task, self._base_dir) for task in tasks]
+        pool = get_process_pool()
+        futures = [pool.submit(_backtest_task, *task, self._base_dir) for task in tasks]
+        return [future.result() for future in futures]
+
+    def single(self, code, period, entry, exit_, begin=None, end=None):
+        """单只股票、单组参数：返回统计、资金曲线和交易明细"""
+        results = self._run([([code], period, entry, exit_, begin, end, True)])[0]
+        return results[0] if results else None
+
+    def sweep(self, code, period, combos, begin=None, end=None):
+        """单只股票的参数扫描：每组参数一个任务"""
+        tasks = [
+            ([code], period, entry, exit_, begin, end, False)
+            for _, entry, exit_ in combos
+        ]
+        results = []
+        for (combo, _, _), items in zip(combos, self._run(tasks)):
+            if items:
+                results.append({"params": combo, **items[0][1]})
+        return results
+
+    def universe(self, codes, period, entry, exit_, begin=None, end=None):
+        """
+        全市场回测：股票分片并行，返回 (每只股票的统计, 缺少本地K线的代码)
+        区间内没有本地K线的股票不参与回测
+        """
+        shard_count = max(self._max_workers * 4, 1)
+        size = max(-(-len(codes) // shard_count), 1)
+        tasks = [
+            (codes[i : i + size], period, entry, exit_, begin, end, False)
+            for i in range(0, len(codes), size)
+        ]
+        results = [
+            {"code": code, **stats}
+            for items in self._run(tasks)
+            for code, stats, _, _ in items
+        ]
+        covered = {item["code"] for item in results}
+        return results, [code for code in codes if code not in covered]
+
+
+backtester = Backtester()
+
+
+def _summary(results: List[Dict]) -> Dict:
+    """多只股票回测结果的汇总"""
+    if not results:
+        return {"count": 0}
+    returns = sorted(item["total_return"] for item in results)
+    return {
+        "count": len(results),
+        "avg_return": round(sum(returns) / len(returns), 2),
+        "median_return": returns[len(returns) // 2],
+        "win_ratio": round(sum(r > 0 for r in returns) / len(returns) * 100, 2),
+        "avg_max_drawdown": round(
+            sum(item["max_drawdown"] for item in results) / len(results), 2
+        ),
+    }
+
+
+def backtest(params):
+    """
+    回测接口（只使用本地已存储的K线）
+    参数：code（单只股票代码，ALL表示全市场）、period、entry（买入条件）、exit（卖出条件）、
+    params（参数扫描，如 n=5,10,20，表达式中用 {n} 引用）、begin/end（毫秒时间戳）
+    全市场回测只支持 UNIVERSE_PERIODS，返回的 coverage 与选股接口相同
+    """
+    code = params.get("code", [""])[0].strip().upper()
+    period = params.get("period", ["day"])[0].strip().lower()
+    entry = params.get("entry", [""])[0].strip()
+    exit_ = params.get("exit", [""])[0].strip()
+    sweep = params.get("params", [""])[0].strip()
+    begin = params.get("begin", [""])[0].strip()
+    end = params.get("end", [""])[0].strip()
+    if not code or not entry or not exit_:
+        return {"success": False, "message": "缺少code、entry或exit参数"}, 400
+
+    try:
+        begin = int(begin) if begin else None
+        end = int(end) if end else None
+        combos = expand_params(entry, exit_, sweep)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+
+    try:
+        if code == "ALL":
+            if len(combos) > 1:
+                return {"success": False, "message": "全市场回测不支持参数扫描"}, 400
+            if period not in UNIVERSE_PERIODS:
+                return {
+                    "success": False,
+                    "message": "全市场回测只支持日线、周线和月线",
+                }, 400
+            import stock_api
+            from prefetch import universe_prefetcher
+
+            if stock_api.is_loading():
+                return {"success": False, "message": "股票列表加载中，请稍后重试"}, 503
+            codes = [row["代码"].upper() for row in stock_api.get_stock_index().rows]
+            results, missing = backtester.universe(
+                codes, period, combos[0][1], combos[0][2], begin, end
+            )
+            results.sort(key=lambda item: -item["total_return"])
+            return {
+                "success": True,
+                "summary": _summary(results),
+                "data": results[:100],
+                "coverage": {
+                    "total": len(codes),
+                    "covered": len(results),
+                    "missing": missing[:MAX_MISSING_CODES],
+                    "warming": universe_prefetcher.stats()["running"],
+                },
+            }
+
+        if len(combos) > 1:
+            results = backtester.sweep(code, period, combos, begin, end)
+            results.sort(key=lambda item: -item["total_return"])
+            return {"success": True, "count": len(results), "data": results}
+
+        result = backtester.single(code, period, combos[0][1], combos[0][2], begin, end)
+        if result is None:
+            return {"success": False, "message": "本地没有该股票的K线数据"}, 404
+        _, stats, curve, trades = result
+        return {
+            "success": True,
+            "data": {"stats": stats, "curve": curve, "trades": trades},
+        }
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+    except Exception as e:
+        return {"success": False, "message": f"回测失败：{str(e)}"}, 500
@@ -0,0 +1,118 @@
+import bisect
+import mmap
+import os
+import struct
+from array import array
+from typing import List, Sequence, Tuple
+
+# 文件格式：文件头 + 按列连续存放的定长数组（每列 rows 个元素）
+# 文件头：魔数、格式版本、行数
+HEADER = struct.Struct("<4sIQ")
+MAGIC = b"KBAR"
+VERSION = 1
+# 列定义：(列名, array类型码)，q为int64，d为float64
+COLUMNS = [
+    ("timestamp", "q"),
+    ("open", "d"),
+    ("high", "d"),
+    ("low", "d"),
+    ("close", "d"),
+    ("volume", "q"),
+    ("percent", "d"),
+    ("turnoverrate", "d"),
+]
+ITEM_SIZE = 8
+
+
+class BarFile:
+    """
+    列式K线文件的只读视图：整个文件内存映射，各列通过 memoryview 直接访问，
+    按时间戳二分查找，读取窗口只是切片，多个进程可共享系统页缓存
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._file = None
+        self._mmap = None
+        self._columns: List[memoryview] = []
+        if os.path.exists(path) and os.path.getsize(path) > HEADER.size:
+            self._open()
+
+    def _open(self) -> None:
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows = HEADER.unpack_from(self._mmap, 0)
+        expected_size = HEADER.size + rows * ITEM_SIZE * len(COLUMNS)
+        if magic != MAGIC or version != VERSION or len(self._mmap) < expected_size:
+            # 文件损坏或格式不符，视为空文件（K线可重新从上游拉取）
+            self.close()
+            return
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+        for _, typecode in COLUMNS:
+            size = rows * ITEM_SIZE
+            self._columns.append(view[offset : offset + size].cast(typecode))
+            offset += size
+        view.release()
+        self.rows = rows
+
+    def close(self) -> None:
+        """释放内存映射（需先释放所有列视图）"""
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self.rows = 0
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def timestamps(self) -> Sequence[int]:
+        return self._columns[0] if self.rows else []
+
+    def bisect_left(self, timestamp: int) -> int:
+        return bisect.bisect_left(self.timestamps, timestamp)
+
+    def bisect_right(self, timestamp: int) -> int:
+        return bisect.bisect_right(self.timestamps, timestamp)
+
+    def column(self, name: str, start: int = 0, end: int = None) -> List:
+        """读取单列的 [start, end) 区间"""
+        if not self.rows:
+            return []
+        index = [c for c, _ in COLUMNS].index(name)
+        return self._columns[index][start:end].tolist()
+
+    def view(self, name: str, start: int = 0, end: int = None) -> memoryview:
+        """单列 [start, end) 区间的零拷贝视图（需在 close 前使用或复制）"""
+        if not self.rows:
+            return memoryview(array(dict(COLUMNS)[name]))
+        index = [c for c, _ in COLUMNS].index(name)
+        return self._columns[index][start:end]
+
+    def slice(self, start: int = 0, end: int = None) -> List[Tuple]:
+        """读取 [start, end) 区间的K线，按 COLUMNS 顺序组成元组"""
+        if not self.rows:
+            return []
+        return list(zip(*(column[start:end].tolist() for column in self._columns)))
+
+
+def write_bar_file(path: str, bars: List[Tuple]) -> None:
+    """将K线按列写入临时文件后原子替换（已打开的旧映射不受影响）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    columns = list(zip(*bars)) if bars else [()] * len(COLUMNS)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(bars)))
+        for (_, typecode), values in zip(COLUMNS, columns):
+            if typecode == "q":
+                values = [int(round(value)) for value in values]
+            file.write(array(typecode, values).tobytes())
+    os.replace(tmp_path, path)
@@ -0,0 +1,101 @@
+"""
+parse_stock_data 基准测试：对比逐行解析（旧实现）与按列批量解析的耗时，并校验输出一致
+用法：python bench_parse_stock_data.py
+"""
+
+import datetime
+import random
+import timeit
+from get_data_from_xueqiu import parse_stock_data
+
+COLUMNS = [
+    "timestamp",
+    "volume",
+    "open",
+    "high",
+    "low",
+    "close",
+    "chg",
+    "percent",
+    "turnoverrate",
+    "amount",
+]
+SIZES = [100, 1000, 10000]
+# 周期 -> 相邻两根K线的间隔（毫秒）
+PERIODS = {"day": 86400 * 1000, "1m": 60 * 1000}
+
+
+def parse_stock_data_by_row(raw_data):
+    """旧实现：每行构建字典并单独格式化时间"""
+    result = []
+    columns = raw_data.get("data", {}).get("column", [])
+    items = raw_data.get("data", {}).get("item", [])
+
+    for item in items:
+        data_map = dict(zip(columns, item))
+        timestamp = data_map.get("timestamp")
+        if timestamp:
+            dt = datetime.datetime.fromtimestamp(timestamp / 1000)
+            date_str = dt.strftime("%Y-%m-%d %H:%M")
+        else:
+            date_str = ""
+        result.append(
+            {
+                "date": date_str,
+                "open": data_map.get("open") or 0,
+                "high": data_map.get("high") or 0,
+                "low": data_map.get("low") or 0,
+                "close": data_map.get("close") or 0,
+                "volume": data_map.get("volume") or 0,
+                "percent": data_map.get("percent") or 0,
+                "turnoverrate": data_map.get("turnoverrate") or 0,
+            }
+        )
+    return result
+
+
+def make_raw_data(size, step):
+    """生成模拟的雪球K线原始数据（含少量null值）"""
+    rng = random.Random(size)
+    start = 1700000000000 - size * step
+    items = []
+    for i in range(size):
+        close = round(rng.uniform(5, 50), 2)
+        row = [
+            start + i * step,
+            rng.randint(1000, 10**8),
+            close,
+            close + 1,
+            close - 1,
+            close,
+            0.12,
+            round(rng.uniform(-10, 10), 2),
+            round(rng.uniform(0, 20), 2),
+            close * 1000,
+        ]
+        if i % 97 == 0:
+            row[8] = None
+        items.append(row)
+    return {"data": {"column": COLUMNS, "item": items}}
+
+
+def main():
+    print(f"{'周期':<6}{'条数':>8}{'逐行(ms)':>12}{'按列(ms)':>12}{'加速比':>8}")
+    for period, step in PERIODS.items():
+        for size in SIZES:
+            raw_data = make_raw_data(size, step)
+            assert parse_stock_data(raw_data) == parse_stock_data_by_row(raw_data)
+            number = max(10000 // size, 3)
+            old = timeit.timeit(
+                lambda: parse_stock_data_by_row(raw_data), number=number
+            )
+            new = timeit.timeit(lambda: parse_stock_data(raw_data), number=number)
+            old_ms = old / number * 1000
+            new_ms = new / number * 1000
+            print(
+                f"{period:<6}{size:>8}{old_ms:>12.3f}{new_ms:>12.3f}{old / new:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
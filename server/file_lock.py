@@ -0,0 +1,17 @@
+import os
+import threading
+
+# 按文件路径分配的锁（同一文件的读-改-写操作串行执行，不同文件互不阻塞）
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def get_file_lock(file_path: str) -> threading.RLock:
+    """获取指定文件对应的可重入锁（路径统一为绝对路径）"""
+    key = os.path.abspath(file_path)
+    with _file_locks_guard:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = threading.RLock()
+            _file_locks[key] = lock
+    return lock
@@ -1,6 +1,7 @@
-import akshare as ak
-import pandas as pd
+import csv
 import os
+from market_snapshot import market_snapshot
+from upstream_scheduler import get_scheduler
 
 def get_and_save_stock_data(csv_file="stock_codes_names.csv"):
     """
@@ -14,45 +15,31 @@ def get_and_save_stock_data(csv_file="stock_codes_names.csv"):
     
     try:
         print("正在获取A股股票代码和名称...")
-        
-        # 获取A股股票数据
-        stock_df = ak.stock_zh_a_spot()
-        
-        # 处理不同版本AKShare返回的列名差异
-        if '代码' in stock_df.columns and '名称' in stock_df.columns:
-            # 提取代码和名称列
-            result_df = stock_df[['代码', '名称']]
-        elif 'symbol' in stock_df.columns and 'name' in stock_df.columns:
-            # 适配可能的英文列名
-            result_df = stock_df[['symbol', 'name']].rename(
-                columns={'symbol': '代码', 'name': '名称'}
-            )
-        else:
-            # 如果列名不匹配，尝试查找包含"代码"和"名称"含义的列
-            code_col = next((col for col in stock_df.columns if '代码' in col or 'symbol' in col.lower()), None)
-            name_col = next((col for col in stock_df.columns if '名称' in col or 'name' in col.lower()), None)
-            
-            if not code_col or not name_col:
-                raise ValueError("无法识别股票数据中的代码和名称列")
-            
-            result_df = stock_df[[code_col, name_col]].rename(
-                columns={code_col: '代码', name_col: '名称'}
-            )
-        
-        # 去重处理（避免可能的重复数据）
-        result_df = result_df.drop_duplicates(subset=['代码'])
-        
+
+        # 与全市场行情快照共用同一次上游调用，快照随后由后台线程按需刷新
+        table = market_snapshot.latest()
+        rows = {}
+        for code, name in zip(table.codes, table.names):
+            # 去重处理（避免可能的重复数据）
+            rows.setdefault(code, name)
+
         # 保存到CSV
-        result_df.to_csv(csv_file, index=False, encoding="utf-8-sig")
-        print(f"成功提取 {len(result_df)} 条股票数据（仅含代码和名称）")
+        with open(csv_file, mode="w", newline="", encoding="utf-8-sig") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerow(["代码", "名称"])
+            writer.writerows(rows.items())
+        print(f"成功提取 {len(rows)} 条股票数据（仅含代码和名称）")
         print(f"数据已保存到 {csv_file}")
-        
+
     except Exception as e:
         print(f"获取数据失败: {str(e)}")
         # 尝试使用备选接口
         try:
             print("尝试使用备选接口获取基础股票列表...")
-            stock_basic_df = ak.stock_zh_a_basic()
+            # akshare 导入耗时数秒，仅在需要时才导入
+            import akshare as ak
+
+            stock_basic_df = get_scheduler("akshare").call(ak.stock_zh_a_basic)
             if 'code' in stock_basic_df.columns and 'name' in stock_basic_df.columns:
                 result_df = stock_basic_df[['code', 'name']].rename(
                     columns={'code': '代码', 'name': '名称'}
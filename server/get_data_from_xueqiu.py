@@ -1,99 +1,173 @@
-import requests
 import time
 import datetime
+import threading
+from collections import OrderedDict
+from kline_store import KLINE_FIELDS, KlineStore, validate_symbol
+from quote_hub import QuoteHub
+from single_flight import SingleFlight
+from upstream_client import upstream
+from upstream_scheduler import UpstreamError
 
+# 上游请求合并：并发的相同请求共享同一次调用及其解析结果
+upstream_flight = SingleFlight()
+# 记录最近查看过K线的代码数量（供预取任务使用）
+RECENT_CODES = 50
+_recent_codes = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def _touch_recent(code):
+    with _recent_lock:
+        _recent_codes[code] = None
+        _recent_codes.move_to_end(code)
+        while len(_recent_codes) > RECENT_CODES:
+            _recent_codes.popitem(last=False)
 
-def read_cookie_from_file(file_path="cookie.txt"):
-    """从文件读取cookie"""
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return None
+
+def recent_codes():
+    """最近查看过K线的代码（最近的在前）"""
+    with _recent_lock:
+        return list(reversed(_recent_codes))
 
 
 def parse_stock_data(raw_data):
-    """将原始数据转换为目标格式"""
-    result = []
-    # 提取column和item数据
+    """将原始数据转换为目标格式（按列批量转换）"""
+    return format_kline_columns(parse_kline_columns(raw_data))
+
+
+def parse_kline_columns(raw_data):
+    """
+    按列解析K线原始数据：一次性转置item矩阵，
+    返回 {字段: 值列表}，缺失列和null值按0处理
+    """
     columns = raw_data.get("data", {}).get("column", [])
     items = raw_data.get("data", {}).get("item", [])
+    transposed = list(zip(*items))
+    result = {}
+    for field in KLINE_FIELDS:
+        if field in columns and transposed:
+            result[field] = [value or 0 for value in transposed[columns.index(field)]]
+        else:
+            result[field] = [0] * len(items)
+    return result
+
 
-    for item in items:
-        # 创建映射关系（column索引 -> 目标字段）
-        data_map = dict(zip(columns, item))
+def _hour_prefix(hour_key):
+    """
+    计算某个UTC整点小时起点的本地时间前缀（YYYY-MM-DD HH:）和分钟数，
+    该小时内时区偏移发生变化或偏移不是整分钟时返回None
+    """
+    start = hour_key * 3600
+    local = time.localtime(start)
+    if local.tm_sec or time.localtime(start + 3599).tm_gmtoff != local.tm_gmtoff:
+        return None, 0
+    prefix = "%04d-%02d-%02d %02d:" % (
+        local.tm_year,
+        local.tm_mon,
+        local.tm_mday,
+        local.tm_hour,
+    )
+    return prefix, local.tm_min
 
-        # 转换时间戳为YYYY-MM-DD格式
-        timestamp = data_map.get("timestamp")
-        if timestamp:
-            dt = datetime.datetime.fromtimestamp(timestamp / 1000)
-            date_str = dt.strftime("%Y-%m-%d %H:%M")
+
+def format_timestamps(timestamps):
+    """
+    批量将毫秒时间戳格式化为本地时间 YYYY-MM-DD HH:MM（空值返回空字符串）
+    同一UTC小时内出现多根K线时（分钟线），该小时只换算一次本地时间，其余只做分钟偏移
+    """
+    cache = {}
+    result = []
+    append = result.append
+    for timestamp in timestamps:
+        if not timestamp:
+            append("")
+            continue
+        hour_key, offset = divmod(int(timestamp), 3600000)
+        cached = cache.get(hour_key)
+        if cached is not None:
+            prefix, minute = cached
+            minute += offset // 60000
+            if prefix is not None and minute < 60:
+                append(f"{prefix}{minute:02d}")
+                continue
+        elif hour_key in cache:
+            # 同一小时第二次出现，缓存该小时的本地时间前缀
+            cache[hour_key] = _hour_prefix(hour_key)
         else:
-            date_str = ""
-
-        # 组装目标格式数据
-        result.append(
-            {
-                "date": date_str,
-                "open": data_map.get("open") or 0,  # 处理null值
-                "high": data_map.get("high") or 0,
-                "low": data_map.get("low") or 0,
-                "close": data_map.get("close") or 0,
-                "volume": data_map.get("volume") or 0,
-                "percent": data_map.get("percent") or 0,
-                "turnoverrate": data_map.get("turnoverrate") or 0,
-            }
-        )
+            # 首次出现（日线等每小时只有一根时不再额外换算）
+            cache[hour_key] = None
+        local = time.localtime(int(timestamp) // 1000)
+        append("%04d-%02d-%02d %02d:%02d" % local[:5])
     return result
 
 
-def get_headers():
-    # 读取cookie
-    cookie = read_cookie_from_file()
-    if not cookie:
-        return {"success": False, "count": 0, "data": [], "message": "cookie文件不存在"}
-
-    # 请求头
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36",
-        "Accept": "application/json, text/plain, */*",
-        "Referer": "https://xueqiu.com/",
-        "Cookie": cookie,
-    }
-    return headers
+def format_kline_columns(columns):
+    """将按列存放的K线转换为接口返回格式"""
+    dates = format_timestamps(columns["timestamp"])
+    return [
+        {
+            "date": date,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+            "percent": percent,
+            "turnoverrate": turnoverrate,
+        }
+        for date, open_, high, low, close, volume, percent, turnoverrate in zip(
+            dates,
+            columns["open"],
+            columns["high"],
+            columns["low"],
+            columns["close"],
+            columns["volume"],
+            columns["percent"],
+            columns["turnoverrate"],
+        )
+    ]
 
 
 def get_stock_data(params):
+    """/kline 接口：记录为最近查看的代码（行情中心的轮询不经过此处）"""
     # 构建请求参数
     code = params.get("code", [""])[0].strip().upper()
-    period = params.get("period", ["daily"])[0].strip().lower()
+    period = params.get("period", ["day"])[0].strip().lower()
     timestamp = params.get("timestamp", [""])[0].strip().lower()
-    limit = params.get("limit", [100])[0].strip().lower()
-
-    # 获取当前时间戳（毫秒）并延后一天
-    if timestamp == "":
-        # 计算一天的毫秒数：24*60*60*1000 = 86400000
-        ONE_DAY_MS = 86400 * 1000
-        current_timestamp = int(time.time() * 1000)
-        timestamp = current_timestamp + ONE_DAY_MS
-    url = f"https://stock.xueqiu.com/v5/stock/chart/kline.json?symbol={code}&begin={timestamp}&period={period}&type=before&count=-{limit}&indicator=kline,pe,pb,ps,pcf,market_capital,agt,ggt,balance"
-
-    print(url)
-    headers = get_headers()
+    limit = params.get("limit", ["100"])[0].strip().lower()
     try:
-        # 发送请求
-        response = requests.get(url, headers=headers, timeout=10)
-        print(f"请求URL: {url}")  # 调试输出
-        response.raise_for_status()  # 触发HTTP错误
-        raw_data = response.json()
+        # 代码和周期用于拼接本地存储路径，访问文件系统前先校验
+        validate_symbol(code, period)
+    except ValueError as e:
+        return {"success": False, "count": 0, "data": [], "message": str(e)}, 400
+    _touch_recent(code)
+    return _query_stock_data(code, period, timestamp, limit)
+
+
+def _query_stock_data(code, period, timestamp, limit):
+    # 相同 (code, period, timestamp, limit) 的并发请求只向上游发起一次
+    return upstream_flight.do(
+        ("kline", code, period, timestamp, limit),
+        _fetch_stock_data,
+        code,
+        period,
+        timestamp,
+        limit,
+    )
+
+
+def _fetch_stock_data(code, period, timestamp, limit):
+    """从本地K线存储读取窗口（存储按需向雪球增量拉取）并转换为目标格式"""
+    try:
+        end_ts = int(timestamp) if timestamp else None
+        bars = kline_store.get_window(code, period, end_ts, int(limit))
 
         # 检查数据是否为空
-        items = raw_data.get("data", {}).get("item", [])
-        if not items:
+        if not bars:
             return {"success": False, "count": 0, "data": [], "message": "cookie已过期"}
 
         # 解析数据
-        parsed_data = parse_stock_data(raw_data)
+        parsed_data = format_bars(bars)
 
         # 返回成功响应
         return {
@@ -103,9 +177,9 @@ def get_stock_data(params):
             "message": f"成功获取{len(parsed_data)}条数据",
         }
 
-    except requests.exceptions.HTTPError as e:
-        # 处理HTTP错误（如403、401等）
-        return {"success": False, "count": 0, "data": [], "message": "cookie已过期"}
+    except UpstreamError as e:
+        # cookie失效、限流或熔断（消息区分具体原因）
+        return {"success": False, "count": 0, "data": [], "message": str(e)}
     except Exception as e:
         # 处理其他异常
         return {
@@ -116,26 +190,80 @@ def get_stock_data(params):
         }
 
 
+def fetch_kline_rows(code, period, begin, count):
+    """
+    请求雪球K线接口，返回按 KLINE_FIELDS 排列的K线元组列表
+    count为负数表示从begin向前取，为正数表示从begin向后取
+    """
+    url = f"https://stock.xueqiu.com/v5/stock/chart/kline.json?symbol={code}&begin={begin}&period={period}&type=before&count={count}&indicator=kline"
+    print(f"请求URL: {url}")  # 调试输出
+    response = upstream.get(url)
+    response.raise_for_status()  # 触发HTTP错误
+    return parse_kline_rows(response.json())
+
+
+def parse_kline_rows(raw_data):
+    """将原始数据转换为K线元组列表（缺失列和null值按0处理，无时间戳的行丢弃）"""
+    columns = parse_kline_columns(raw_data)
+    rows = zip(*(columns[field] for field in KLINE_FIELDS))
+    return [row for row in rows if row[0]]
+
+
+def format_bars(bars):
+    """将K线元组转换为接口返回格式"""
+    if not bars:
+        return []
+    return format_kline_columns(dict(zip(KLINE_FIELDS, zip(*bars))))
+
+
+# 全局K线存储：/kline 优先读取本地数据，只向上游拉取新增K线
+kline_store = KlineStore(fetch_kline_rows)
+
+
+def fetch_batch_quotes(symbols):
+    """一次批量请求获取多个代码的行情（含详情字段），返回 {symbol: quote}"""
+    return upstream_flight.do(("quote", tuple(symbols)), _fetch_batch_quotes, symbols)
+
+
+def _fetch_batch_quotes(symbols):
+    """请求雪球批量行情接口"""
+    url = f"https://stock.xueqiu.com/v5/stock/batch/quote.json?symbol={','.join(symbols)}&extend=detail"
+    response = upstream.get(url)
+    response.raise_for_status()  # 触发HTTP错误
+    items = response.json().get("data", {}).get("items") or []
+    return {
+        item["quote"]["symbol"]: item["quote"] for item in items if item.get("quote")
+    }
+
+
+def fetch_last_bar(code, period):
+    """获取指定代码和周期的最新一根K线，失败时返回None"""
+    result = _query_stock_data(code.strip().upper(), period, "", "1")
+    if result.get("success") and result["data"]:
+        return result["data"][-1]
+    return None
+
+
+# 全局行情中心：所有客户端共享同一份行情快照
+quote_hub = QuoteHub(fetch_batch_quotes, fetch_last_bar)
+
+
 def get_selection_details(params):
     symbols = params.get("symbols", [""])[0].strip().upper()
-    url = f"https://stock.xueqiu.com/v5/stock/batch/quote.json?symbol={symbols}"
+    symbol_list = [symbol for symbol in symbols.split(",") if symbol]
 
-    headers = get_headers()
     try:
-        # 发送请求
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # 触发HTTP错误
-        raw_data = response.json()
+        # 从行情中心读取快照（未缓存的代码会同步拉取一次）
+        quotes = quote_hub.get_quotes(symbol_list)
 
         # 检查数据是否为空
-        items = raw_data.get("data", {}).get("items", {})
-        if not items:
+        if not quotes:
             return {"success": False, "count": 0, "data": [], "message": "cookie已过期"}
 
         # 返回成功响应
         return {
             "success": True,
-            "data": [item.get("quote") for item in items if item.get("quote")],
+            "data": quotes,
             "message": "成功获取",
         }
 
@@ -152,27 +280,21 @@ def get_selection_details(params):
 def get_stock_details(params):
     # 构建请求参数
     code = params.get("code", [""])[0].strip().upper()
-    url = f"https://stock.xueqiu.com/v5/stock/quote.json?symbol={code}&extend=detail"
 
-    headers = get_headers()
     try:
-        # 发送请求
-        response = requests.get(url, headers=headers, timeout=10)
-        print(f"请求URL: {url}")  # 调试输出
-        response.raise_for_status()  # 触发HTTP错误
-        raw_data = response.json()
+        # 从行情中心读取快照（与自选列表共用同一批量请求）
+        quotes = quote_hub.get_quotes([code])
 
         # 检查数据是否为空
-        items = raw_data.get("data", {}).get("quote", {})
-        if not items:
+        if not quotes:
             return {"success": False, "count": 0, "data": [], "message": "cookie已过期"}
 
         # 返回成功响应
-        return {"success": True, "data": items, "message": "成功获取"}
+        return {"success": True, "data": quotes[0], "message": "成功获取"}
 
-    except requests.exceptions.HTTPError as e:
-        # 处理HTTP错误（如403、401等）
-        return {"success": False, "count": 0, "data": {}, "message": "cookie已过期"}
+    except UpstreamError as e:
+        # cookie失效、限流或熔断（消息区分具体原因）
+        return {"success": False, "count": 0, "data": {}, "message": str(e)}
     except Exception as e:
         # 处理其他异常
         return {
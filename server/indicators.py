@@ -0,0 +1,327 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+import metrics
+from get_data_from_xueqiu import format_timestamps, kline_store, upstream_flight
+from kline_store import KLINE_FIELDS, validate_symbol
+
+# 默认参数（与常用行情软件一致）
+MA_PERIODS = (5, 10, 20, 30, 60)
+EMA_PERIODS = (12, 26)
+MACD_PARAMS = (12, 26, 9)  # 快线、慢线、DEA周期
+KDJ_PARAMS = (9, 3, 3)  # RSV周期、K平滑、D平滑
+RSI_PERIODS = (6, 12, 24)
+BOLL_PARAMS = (20, 2)  # 周期、标准差倍数
+# 在返回窗口之前额外取的K线数量，使EMA等递推指标收敛
+WARMUP = 120
+# 结果保留的小数位数
+DECIMALS = 3
+# 单次请求最多返回的K线数量（超出时按上限返回）
+MAX_LIMIT = 1000
+
+_CLOSE = KLINE_FIELDS.index("close")
+_HIGH = KLINE_FIELDS.index("high")
+_LOW = KLINE_FIELDS.index("low")
+
+# 滑动窗口类指标最多需要向前回看的K线数量（RSI另需前一根收盘价）
+LOOKBACK = max(MA_PERIODS + (KDJ_PARAMS[0], BOLL_PARAMS[0])) + 1
+
+Bar = Tuple[float, ...]
+
+
+def _rolling(np, values, window: int, start: int, reducer, partial: bool = False):
+    """
+    位置 [start, n) 上向前 window 根的滑动窗口统计
+    partial 为真时不足 window 根按已有数据计算（用首个值补齐，仅适用于max/min），否则为NaN
+    """
+    offset = start - window + 1
+    if offset < 0:
+        fill = values[0] if partial else np.nan
+        segment = np.concatenate([np.full(-offset, fill), values])
+    else:
+        segment = values[offset:]
+    windows = np.lib.stride_tricks.sliding_window_view(segment, window)
+    return reducer(windows, axis=1)
+
+
+def _smooth(np, values, alpha: float, prev: Optional[float]):
+    """递推平滑 y = alpha*x + (1-alpha)*y'，prev为起点前一根的值（为空时以首个值为初值）"""
+    out = np.empty(len(values))
+    for i, value in enumerate(values.tolist()):
+        prev = value if prev is None else alpha * value + (1 - alpha) * prev
+        out[i] = prev
+    return out, prev
+
+
+def _compute(np, arrays, start: int, state: Dict) -> Tuple[Dict, Dict]:
+    """
+    计算位置 [start, n) 的全部指标
+    arrays：close/high/low 数组（包含start之前的数据，供滑动窗口使用）
+    state：位置 start-1 的递推状态（空字典表示从头计算），返回结果和位置 n-1 的状态
+    """
+    close, high, low = arrays
+    state = dict(state)
+    tail = close[start:]
+    results = {}
+
+    for n in MA_PERIODS:
+        results[f"ma{n}"] = _rolling(np, close, n, start, np.mean)
+
+    for n in EMA_PERIODS:
+        results[f"ema{n}"], state[f"ema{n}"] = _smooth(
+            np, tail, 2 / (n + 1), state.get(f"ema{n}")
+        )
+
+    fast, slow, signal = MACD_PARAMS
+    ema_fast, state["macd_fast"] = _smooth(
+        np, tail, 2 / (fast + 1), state.get("macd_fast")
+    )
+    ema_slow, state["macd_slow"] = _smooth(
+        np, tail, 2 / (slow + 1), state.get("macd_slow")
+    )
+    dif = ema_fast - ema_slow
+    dea, state["macd_dea"] = _smooth(np, dif, 2 / (signal + 1), state.get("macd_dea"))
+    results["dif"], results["dea"], results["macd"] = dif, dea, 2 * (dif - dea)
+
+    rsv_n, k_n, d_n = KDJ_PARAMS
+    highest = _rolling(np, high, rsv_n, start, np.max, partial=True)
+    lowest = _rolling(np, low, rsv_n, start, np.min, partial=True)
+    spread = highest - lowest
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsv = np.where(spread > 0, (tail - lowest) / spread * 100, 50.0)
+    # K、D初值为50
+    k, state["kdj_k"] = _smooth(np, rsv, 1 / k_n, state.get("kdj_k", 50.0))
+    d, state["kdj_d"] = _smooth(np, k, 1 / d_n, state.get("kdj_d", 50.0))
+    results["k"], results["d"], results["j"] = k, d, 3 * k - 2 * d
+
+    # RSI：涨幅与振幅分别做 SMA(X,N,1) 平滑
+    previous = (
+        close[start - 1 : -1] if start > 0 else np.concatenate([tail[:1], tail[:-1]])
+    )
+    change = tail - previous
+    for n in RSI_PERIODS:
+        up, state[f"rsi{n}_up"] = _smooth(
+            np, np.maximum(change, 0), 1 / n, state.get(f"rsi{n}_up")
+        )
+        total, state[f"rsi{n}_abs"] = _smooth(
+            np, np.abs(change), 1 / n, state.get(f"rsi{n}_abs")
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            results[f"rsi{n}"] = np.where(total > 0, up / total * 100, np.nan)
+
+    boll_n, width = BOLL_PARAMS
+    mid = _rolling(np, close, boll_n, start, np.mean)
+    std = _rolling(np, close, boll_n, start, np.std)
+    results["boll_mid"] = mid
+    results["boll_upper"] = mid + width * std
+    results["boll_lower"] = mid - width * std
+
+    return results, state
+
+
+def _to_lists(np, results: Dict) -> Dict[str, List[Optional[float]]]:
+    """数组转为保留小数的列表（NaN转为None）"""
+    return {
+        name: [
+            None if value != value else value
+            for value in np.round(values, DECIMALS).tolist()
+        ]
+        for name, values in results.items()
+    }
+
+
+class _IndicatorSeries:
+    """单个 代码+周期 的指标缓存：已收盘K线的结果和递推状态，最后一根单独计算"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.capacity = 0
+        # 已收盘部分（除最后一根外）
+        self.timestamps: List[int] = []
+        self.settled_bar: Optional[Bar] = None
+        self.state: Dict = {}
+        self.results: Dict[str, List] = {}
+        # 最后一根（可能尚未收盘）
+        self.last_bar: Optional[Bar] = None
+        self.last_results: Dict[str, List] = {}
+
+
+class IndicatorEngine:
+    """
+    技术指标引擎：按 代码+周期 缓存最新窗口的指标结果，
+    只有最后一根K线变化时从缓存的递推状态增量更新，多个图表共享同一份计算
+    """
+
+    def __init__(self, bar_source: Callable[[str, str, Optional[int], int], List[Bar]]):
+        # bar_source(code, period, timestamp, limit) -> K线列表
+        self._bar_source = bar_source
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _IndicatorSeries] = {}
+
+    def _get_series(self, code: str, period: str) -> _IndicatorSeries:
+        with self._lock:
+            return self._series.setdefault((code, period), _IndicatorSeries())
+
+    @staticmethod
+    def _arrays(np, bars: List[Bar]):
+        columns = list(zip(*bars))
+        return tuple(
+            np.array(columns[index], dtype=float) for index in (_CLOSE, _HIGH, _LOW)
+        )
+
+    def _compute_range(self, np, bars: List[Bar], start: int, end: int, state):
+        """计算位置 [start, end) 的指标，只转换回看窗口内的K线"""
+        offset = max(start - LOOKBACK, 0)
+        arrays = self._arrays(np, bars[offset:end])
+        return _compute(np, arrays, start - offset, state)
+
+    def compute(self, bars: List[Bar]) -> Dict[str, List]:
+        """全量计算一组K线的指标（不使用缓存）"""
+        import numpy as np
+
+        if not bars:
+            return {}
+        results, _ = _compute(np, self._arrays(np, bars), 0, {})
+        return _to_lists(np, results)
+
+    def _rebuild(self, np, series: _IndicatorSeries, bars: List[Bar]) -> None:
+        """从头计算已收盘部分的结果和状态"""
+        series.timestamps = [bar[0] for bar in bars[:-1]]
+        series.settled_bar = bars[-2] if len(bars) > 1 else None
+        series.last_bar = None
+        if series.timestamps:
+            results, series.state = self._compute_range(np, bars, 0, len(bars) - 1, {})
+            series.results = _to_lists(np, results)
+        else:
+            series.state, series.results = {}, {}
+
+    def _extend(self, np, series: _IndicatorSeries, bars: List[Bar]) -> bool:
+        """已收盘部分仍然有效时，只计算其后新收盘的K线，否则返回False"""
+        if series.settled_bar is None:
+            return False
+        timestamps = [bar[0] for bar in bars]
+        index = bisect.bisect_left(timestamps, series.settled_bar[0])
+        # 已收盘K线不在新窗口中、发生变化（除权）或新窗口比缓存更早时需要重建
+        if (
+            index >= len(bars) - 1
+            or bars[index] != series.settled_bar
+            or timestamps[0] < series.timestamps[0]
+        ):
+            return False
+        end = len(bars) - 1
+        if end > index + 1:
+            results, series.state = self._compute_range(
+                np, bars, index + 1, end, series.state
+            )
+            for name, values in _to_lists(np, results).items():
+                series.results[name].extend(values)
+            series.timestamps.extend(timestamps[index + 1 : end])
+            series.settled_bar = bars[end - 1]
+        # 超出容量的旧结果丢弃（递推状态不受影响）
+        overflow = len(series.timestamps) - series.capacity
+        if overflow > 0:
+            del series.timestamps[:overflow]
+            for values in series.results.values():
+                del values[:overflow]
+        return True
+
+    def latest(self, code: str, period: str, limit: int) -> Tuple[List[int], Dict]:
+        """最新 limit 根K线的时间戳和指标（优先使用缓存增量更新）"""
+        import numpy as np
+
+        count = limit + WARMUP
+        bars = self._bar_source(code, period, None, count)
+        if not bars:
+            return [], {}
+
+        series = self._get_series(code, period)
+        with series.lock:
+            cached = series.capacity >= count and self._extend(np, series, bars)
+            metrics.record_cache("indicators", cached)
+            if not cached:
+                series.capacity = max(series.capacity, count)
+                self._rebuild(np, series, bars)
+            if bars[-1] != series.last_bar:
+                # 最后一根从已收盘部分的状态出发单独计算
+                last, _ = self._compute_range(
+                    np, bars, len(bars) - 1, len(bars), series.state
+                )
+                series.last_bar = bars[-1]
+                series.last_results = _to_lists(np, last)
+
+            timestamps = series.timestamps[-(limit - 1) :] if limit > 1 else []
+            skip = len(series.timestamps) - len(timestamps)
+            results = {
+                name: series.results.get(name, [])[skip:] + values
+                for name, values in series.last_results.items()
+            }
+            return timestamps + [bars[-1][0]], results
+
+    def history(
+        self, code: str, period: str, timestamp: int, limit: int
+    ) -> Tuple[List[int], Dict]:
+        """时间不晚于 timestamp 的 limit 根K线的指标（全量计算）"""
+        bars = self._bar_source(code, period, timestamp, limit + WARMUP)
+        results = self.compute(bars)
+        return [bar[0] for bar in bars[-limit:]], {
+            name: values[-limit:] for name, values in results.items()
+        }
+
+
+# 全局指标引擎：基于本地K线存储计算
+indicator_engine = IndicatorEngine(kline_store.get_window)
+
+
+def get_indicators(params):
+    """
+    技术指标接口：MA、EMA、MACD、KDJ、RSI、BOLL
+    参数与 /kline 相同（code、period、timestamp、limit），返回与K线对齐的指标序列
+    limit 超过 MAX_LIMIT 时按上限返回
+    """
+    code = params.get("code", [""])[0].strip().upper()
+    period = params.get("period", ["day"])[0].strip().lower()
+    timestamp = params.get("timestamp", [""])[0].strip()
+    limit = params.get("limit", ["100"])[0].strip()
+    if not code:
+        return {"success": False, "message": "缺少code参数"}, 400
+    try:
+        validate_symbol(code, period)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+    try:
+        limit = int(limit)
+        timestamp = int(timestamp) if timestamp else None
+    except ValueError:
+        return {"success": False, "message": "limit和timestamp必须是整数"}, 400
+    if limit < 1:
+        return {"success": False, "message": "limit必须大于0"}, 400
+    limit = min(limit, MAX_LIMIT)
+
+    # 多个图表同时请求同一组指标时只计算一次
+    return upstream_flight.do(
+        ("indicators", code, period, timestamp, limit),
+        _get_indicators,
+        code,
+        period,
+        timestamp,
+        limit,
+    )
+
+
+def _get_indicators(code, period, end_ts, limit):
+    try:
+        bars = kline_store.get_window(code, period, None, 1) if end_ts else None
+        if end_ts is None or (bars and end_ts >= bars[-1][0]):
+            # 请求最新窗口时使用增量缓存
+            timestamps, results = indicator_engine.latest(code, period, limit)
+        else:
+            timestamps, results = indicator_engine.history(code, period, end_ts, limit)
+        if not timestamps:
+            return {"success": False, "message": "cookie已过期"}
+        return {
+            "success": True,
+            "count": len(timestamps),
+            "data": {"date": format_timestamps(timestamps), **results},
+        }
+    except Exception as e:
+        return {"success": False, "message": f"请求失败：{str(e)}"}, 500
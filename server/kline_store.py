@@ -0,0 +1,278 @@
+import csv
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import metrics
+from bar_file import COLUMNS, BarFile, write_bar_file
+from file_lock import get_file_lock
+from resample import RESAMPLE_RULES, base_limit, resampled_window
+from trading_calendar import is_fresh
+from upstream_scheduler import CookieExpiredError, UpstreamError
+
+# K线存储目录（每个代码一个子目录，每个周期一个列式文件）
+KLINES_DIR = "klines"
+# 存储字段（与雪球kline接口的列名一致）
+KLINE_FIELDS = [name for name, _ in COLUMNS]
+# 增量同步时单次向后拉取的K线数量，拉满时继续向后翻页
+SYNC_COUNT = 200
+# 增量同步最多翻页次数（1分钟线跨越隔夜和周末需要翻页），仍未追上则视为断档并全量重建
+MAX_SYNC_PAGES = 5
+# 交易时段内最新K线的同步间隔（秒），间隔内的请求直接读本地数据；
+# 非交易时段收盘后同步过一次即不再请求上游
+LATEST_TTL = 3.0
+# 首次建立存储时至少拉取的K线数量
+INITIAL_COUNT = 300
+# 一天的毫秒数
+ONE_DAY_MS = 86400 * 1000
+
+# 雪球kline接口支持的周期
+NATIVE_PERIODS = {
+    "day",
+    "week",
+    "month",
+    "quarter",
+    "year",
+    "1m",
+    "5m",
+    "15m",
+    "30m",
+    "60m",
+    "120m",
+}
+# 可请求的周期（原生周期及可由基础周期合成的周期）
+PERIODS = NATIVE_PERIODS | set(RESAMPLE_RULES)
+# 股票代码格式（交易所前缀 + 6位数字，统一大写）
+CODE_PATTERN = re.compile(r"^(SH|SZ|BJ)\d{6}$")
+
+# 一根K线：按 KLINE_FIELDS 顺序排列的元组
+Bar = Tuple[float, ...]
+
+
+def validate_symbol(code: str, period: str) -> None:
+    """校验代码和周期（二者用于拼接存储路径），不合法时抛出 ValueError"""
+    if not CODE_PATTERN.match(code):
+        raise ValueError(f"无效的股票代码: {code}")
+    if period not in PERIODS:
+        raise ValueError(f"不支持的周期: {period}")
+
+
+def _to_number(value: str):
+    """CSV字段转数值（整数保持为int，与上游返回的类型一致）"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+class _Series:
+    """单个 代码+周期 的本地K线序列（按时间升序，底层为内存映射的列式文件）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = BarFile(path)
+        # 是否已拉取到上市首日（再往前没有数据）
+        self.head_complete = False
+        # 最近一次与上游同步最新K线的时间戳（秒）
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.file)
+
+    @property
+    def first_ts(self) -> int:
+        return self.file.timestamps[0]
+
+    @property
+    def last_ts(self) -> int:
+        return self.file.timestamps[-1]
+
+    def tail(self, count: int) -> List[Bar]:
+        """最后 count 根K线"""
+        return self.file.slice(max(len(self.file) - count, 0))
+
+    def _write(self, bars: List[Bar]) -> None:
+        """写入新文件并切换映射（旧映射在替换后释放）"""
+        write_bar_file(self.path, bars)
+        old_file, self.file = self.file, BarFile(self.path)
+        old_file.close()
+
+    def replace_all(self, rows: List[Bar]) -> None:
+        self._write(rows)
+
+    def replace_tail(self, rows: List[Bar]) -> None:
+        """用新拉取的K线覆盖从 rows[0] 开始的尾部"""
+        start = self.file.bisect_left(rows[0][0])
+        self._write(self.file.slice(0, start) + rows)
+
+    def prepend(self, rows: List[Bar]) -> None:
+        """在头部插入更早的K线（只保留早于现有第一根的部分）"""
+        if len(self.file):
+            rows = [bar for bar in rows if bar[0] < self.first_ts]
+        if rows:
+            self._write(rows + self.file.slice())
+
+    def window(self, end_ts: int, limit: int) -> List[Bar]:
+        """返回时间戳不晚于 end_ts 的最后 limit 根K线（二分查找后直接切片）"""
+        end = self.file.bisect_right(end_ts)
+        return self.file.slice(max(end - limit, 0), end)
+
+
+class KlineStore:
+    """
+    本地增量K线存储：每个 代码+周期 持久化一份列式K线文件，
+    最新数据只向上游拉取上次同步之后的K线，历史窗口直接从本地读取
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, str, int, int], List[Bar]],
+        base_dir: str = KLINES_DIR,
+    ):
+        # fetcher(code, period, begin, count) -> K线列表（count为负数表示向前拉取）
+        self._fetcher = fetcher
+        self._base_dir = base_dir
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+
+    def _file_path(self, code: str, period: str) -> str:
+        validate_symbol(code, period)
+        return os.path.join(self._base_dir, code, f"{period}.bars")
+
+    def _load(self, code: str, period: str) -> _Series:
+        """打开（或从缓存获取）指定 代码+周期 的K线序列"""
+        key = (code, period)
+        with self._lock:
+            series = self._series.get(key)
+        if series is not None:
+            return series
+
+        file_path = self._file_path(code, period)
+        self._migrate_csv(code, period, file_path)
+        series = _Series(file_path)
+        with self._lock:
+            return self._series.setdefault(key, series)
+
+    def _migrate_csv(self, code: str, period: str, file_path: str) -> None:
+        """将旧版CSV格式的K线转换为列式文件"""
+        csv_path = os.path.join(self._base_dir, f"{code}_{period}.csv")
+        if not os.path.exists(csv_path) or os.path.exists(file_path):
+            return
+        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader, None)  # 跳过表头
+            bars = [tuple(_to_number(value) for value in row) for row in reader]
+        write_bar_file(file_path, bars)
+        os.remove(csv_path)
+
+    def _rebuild(self, code: str, period: str, series: _Series, count: int) -> None:
+        """全量重新拉取最近 count 根K线（首次建立或复权数据变化时）"""
+        begin = int(time.time() * 1000) + ONE_DAY_MS
+        rows = self._fetcher(code, period, begin, -count)
+        if not rows:
+            # 不写入空序列（否则每次请求都会重建并再次请求上游），保留本地已有数据
+            raise UpstreamError("上游未返回K线数据（cookie已过期或代码不存在）")
+        series.replace_all(rows)
+        series.head_complete = len(rows) < count
+
+    def _sync_latest(self, code: str, period: str, series: _Series, limit: int):
+        """同步最新K线：只拉取倒数第二根之后的数据（最后一根可能尚未收盘）"""
+        fresh = len(series) > 0 and is_fresh(series.synced_at, LATEST_TTL)
+        # 命中表示直接读取本地数据，未命中表示需要向上游同步
+        metrics.record_cache("kline", fresh)
+        if fresh:
+            return
+
+        if not len(series):
+            self._rebuild(code, period, series, max(limit, INITIAL_COUNT))
+        else:
+            # 从倒数第二根（已收盘）开始向后拉取，用于校验本地数据是否仍然有效
+            anchor = series.tail(2)[0]
+            rows = self._fetcher(code, period, int(anchor[0]), SYNC_COUNT)
+            if not rows:
+                raise CookieExpiredError()
+            page, pages = rows, 1
+            # 拉满一页说明后面还有，从本页最后一根继续向后翻页
+            while len(page) >= SYNC_COUNT and pages < MAX_SYNC_PAGES:
+                page = self._fetcher(code, period, int(rows[-1][0]), SYNC_COUNT)
+                rows += [bar for bar in page if bar[0] > rows[-1][0]]
+                pages += 1
+            # 锚点K线变化说明发生了除权（前复权价格整体调整），翻页后仍有断档时同样需要重建
+            if rows[0] != anchor or len(page) >= SYNC_COUNT:
+                self._rebuild(code, period, series, max(len(series), limit))
+            else:
+                series.replace_tail(rows)
+        series.synced_at = time.time()
+
+    def _extend_head(self, code: str, period: str, series: _Series, count: int):
+        """向前补齐历史K线"""
+        rows = self._fetcher(code, period, series.first_ts - 1, -count)
+        if len(rows) < count:
+            series.head_complete = True
+        series.prepend(rows)
+
+    def _resampled_window(
+        self, code: str, period: str, timestamp: Optional[int], limit: int
+    ) -> Optional[List[Bar]]:
+        """
+        本地基础周期K线覆盖所需窗口时由其合成目标周期，否则返回None
+        （不为合成而向上游补拉大量基础K线，改为请求上游的原生周期）
+        """
+        base_period = RESAMPLE_RULES[period][0]
+        count = base_limit(period, limit)
+        with get_file_lock(self._file_path(code, base_period)):
+            series = self._load(code, base_period)
+            if not len(series):
+                return None
+            if timestamp is None or timestamp > series.last_ts:
+                # 最新窗口要求基础K线已同步到最新（只增量拉取少量K线）
+                try:
+                    self._sync_latest(code, base_period, series, count)
+                except UpstreamError:
+                    return None
+            end_ts = series.last_ts if timestamp is None else timestamp
+            end = series.file.bisect_right(end_ts)
+            start = max(end - count, 0)
+            bars = series.file.slice(start, end)
+            next_ts = series.file.timestamps[end] if end < len(series) else None
+            from_head = start == 0 and series.head_complete
+        return resampled_window(bars, period, limit, from_head, next_ts)
+
+    def get_window(
+        self, code: str, period: str, timestamp: Optional[int], limit: int
+    ) -> List[Bar]:
+        """
+        获取K线窗口：timestamp为空时返回最新的 limit 根，
+        否则返回时间不晚于 timestamp 的 limit 根（优先读取本地数据）
+        周线、月线和5/15/30/60分钟线在本地日线、1分钟线足够时由其合成，否则按原生周期存储
+        """
+        if period in RESAMPLE_RULES:
+            bars = self._resampled_window(code, period, timestamp, limit)
+            if bars is not None:
+                return bars
+
+        with get_file_lock(self._file_path(code, period)):
+            series = self._load(code, period)
+
+            if timestamp is None or not len(series) or timestamp > series.last_ts:
+                try:
+                    self._sync_latest(code, period, series, limit)
+                except UpstreamError:
+                    # 上游不可用（熔断、限流或cookie失效）时返回本地已有的旧数据
+                    if not len(series):
+                        raise
+            if not len(series):
+                return []
+            if timestamp is None:
+                timestamp = series.last_ts
+
+            if timestamp < series.first_ts:
+                # 请求的窗口早于本地数据且不连续，直接向上游请求，不写入存储
+                return self._fetcher(code, period, timestamp, -limit)
+
+            local = series.window(timestamp, limit)
+            if len(local) < limit and not series.head_complete:
+                self._extend_head(code, period, series, limit - len(local))
+                local = series.window(timestamp, limit)
+            return local
@@ -1,12 +1,18 @@
 import csv
+import io
 import os
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional
+from file_lock import get_file_lock
 
 # 基础配置
 MARKET_ANALYSIS_DIR = "marketAnalysis"  # 分析文件存放目录
 CSV_HEADERS = ["date", "analysis"]  # 分析文件表头
 DATE_FORMAT = "%Y-%m-%d"  # 日期格式
+# 同时加载多个代码的分析文件时使用的线程数
+LOAD_WORKERS = 4
 
 
 def ensure_directory_exists() -> None:
@@ -24,23 +30,158 @@ def get_csv_path(code: str) -> str:
 def init_csv_file(code: str) -> None:
     """初始化指定股票代码的CSV文件（不存在则创建并写入表头）"""
     csv_path = get_csv_path(code)
-    if not os.path.exists(csv_path):
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
+    with get_file_lock(csv_path):
+        if not os.path.exists(csv_path):
+            with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
+                writer.writeheader()
 
 
-def get_analysis_info(params: Optional[Dict] = None) -> Dict:
+class _AnalysisStore:
     """
-    获取分析信息接口
-    接收参数code，多个code以逗号隔开
-    返回每个code对应的CSV文件最后一条数据
+    单个代码的分析记录：文件只在首次访问或被外部修改后解析一次，
+    之后最新一条直接取缓存，按日期查询走二分查找
     """
-    # 参数校验
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        # (文件中的记录, 升序的日期, 对应的记录序号)，整体替换，读取时无需加锁
+        # 记录保持文件顺序，最后一条即最新
+        self._data = ([], [], [])
+        self._signature = None
+
+    def _file_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def is_fresh(self) -> bool:
+        return self._signature is not None and (
+            self._file_signature() == self._signature
+        )
+
+    def load(self) -> None:
+        """确保缓存与文件一致（需在文件锁内调用）"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with open(self.csv_path, mode="r", newline="", encoding="utf-8") as file:
+            self._set_rows(list(csv.DictReader(file)))
+        self._signature = signature
+
+    @property
+    def _rows(self) -> List[Dict[str, str]]:
+        return self._data[0]
+
+    def _set_rows(self, rows: List[Dict[str, str]]) -> None:
+        # 记录按日期追加，通常已经有序，sorted 对有序数据只需线性时间
+        order = sorted(range(len(rows)), key=lambda i: rows[i]["date"])
+        self._data = (rows, [rows[i]["date"] for i in order], order)
+
+    def latest(self) -> Optional[Dict[str, str]]:
+        rows = self._rows
+        return rows[-1] if rows else None
+
+    def between(self, begin: str, end: str) -> List[Dict[str, str]]:
+        """日期在 [begin, end] 内的记录（按日期升序，空字符串表示不限）"""
+        rows, dates, order = self._data
+        lo = bisect_left(dates, begin) if begin else 0
+        hi = bisect_right(dates, end) if end else len(dates)
+        return [rows[i] for i in order[lo:hi]]
+
+    def put(self, date: str, analysis: str) -> bool:
+        """
+        写入某日的分析，已有则替换并返回True
+        新增直接追加到文件末尾；替换最后一条时截断最后一条后再追加，其余情况原子重写整个文件
+        """
+        row = {"date": date, "analysis": analysis}
+        exists = any(item["date"] == date for item in self._rows)
+        if not exists:
+            self._append(row)
+            rows = self._rows + [row]
+        elif self._rows[-1]["date"] == date and self._truncate_last():
+            self._append(row)
+            rows = self._rows[:-1] + [row]
+        else:
+            rows = [row if item["date"] == date else item for item in self._rows]
+            tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+            with open(tmp_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(tmp_path, self.csv_path)
+        self._set_rows(rows)
+        self._signature = self._file_signature()
+        return exists
+
+    def _append(self, row: Dict[str, str]) -> None:
+        """追加一条记录，文件末尾缺少换行（手工编辑或写入中断）时先补上，避免与最后一行合并"""
+        with open(self.csv_path, mode="rb") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size:
+                file.seek(size - 1)
+            missing_newline = size > 0 and file.read(1) != b"\n"
+        with open(self.csv_path, mode="a", newline="", encoding="utf-8") as file:
+            if missing_newline:
+                file.write("\r\n")
+            csv.DictWriter(file, fieldnames=CSV_HEADERS).writerow(row)
+
+    def _truncate_last(self) -> bool:
+        """
+        从文件末尾截掉最后一条记录（按写入格式重新编码，与文件末尾字节一致才截断），
+        返回是否成功
+        """
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=CSV_HEADERS).writerow(self._rows[-1])
+        encoded = buffer.getvalue().encode("utf-8")
+        with open(self.csv_path, mode="rb+") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size < len(encoded):
+                return False
+            file.seek(size - len(encoded))
+            if file.read() != encoded:
+                return False
+            file.truncate(size - len(encoded))
+        return True
+
+
+_stores: Dict[str, _AnalysisStore] = {}
+_load_pool = ThreadPoolExecutor(
+    max_workers=LOAD_WORKERS, thread_name_prefix="analysis-load"
+)
+
+
+def _get_store(code: str) -> _AnalysisStore:
+    """获取指定代码的分析记录并与文件同步（文件不存在时先创建）"""
+    csv_path = get_csv_path(code)
+    store = _stores.get(csv_path)
+    if store is None:
+        init_csv_file(code)
+        store = _stores.setdefault(csv_path, _AnalysisStore(csv_path))
+    with get_file_lock(csv_path):
+        store.load()
+    return store
+
+
+def _get_stores(codes: List[str]) -> List[_AnalysisStore]:
+    """批量获取分析记录：已缓存的直接返回，需要读取文件的并行加载"""
+    stores = [_stores.get(get_csv_path(code)) for code in codes]
+    cold = [
+        i for i, store in enumerate(stores) if store is None or not store.is_fresh()
+    ]
+    if len(cold) > 1:
+        loaded = _load_pool.map(_get_store, [codes[i] for i in cold])
+    else:
+        loaded = map(_get_store, [codes[i] for i in cold])
+    for i, store in zip(cold, loaded):
+        stores[i] = store
+    return stores
+
+
+def _parse_codes(params: Optional[Dict]):
+    """解析逗号分隔的code参数（兼容列表/字符串类型），返回代码列表或错误响应"""
     if not params or "code" not in params:
         return {"success": False, "message": "缺少code参数"}, 400
 
-    # 处理code参数（兼容列表/字符串类型）
     code_param = params["code"]
     code_str = (
         code_param[0].strip()
@@ -55,30 +196,64 @@ def get_analysis_info(params: Optional[Dict] = None) -> Dict:
     codes = [code.strip().upper() for code in code_str.split(",") if code.strip()]
     if not codes:
         return {"success": False, "message": "未提供有效的code"}, 400
+    return codes
+
 
-    result = {"success": True, "data": {}, "message": "获取分析信息成功"}
+def get_analysis_info(params: Optional[Dict] = None) -> Dict:
+    """
+    获取分析信息接口
+    接收参数code，多个code以逗号隔开
+    返回每个code对应的CSV文件最后一条数据
+    """
+    codes = _parse_codes(params)
+    if isinstance(codes, tuple):
+        return codes
 
     try:
-        for code in codes:
-            csv_path = get_csv_path(code)
-            # 确保文件存在
-            init_csv_file(code)
-
-            last_analysis = None
-            with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                # 读取所有行并获取最后一行
-                rows = list(reader)
-                if rows:
-                    last_analysis = rows[-1]
-
-            result["data"][code] = last_analysis
-
-        return result
+        stores = _get_stores(codes)
+        return {
+            "success": True,
+            "data": {code: store.latest() for code, store in zip(codes, stores)},
+            "message": "获取分析信息成功",
+        }
     except Exception as e:
         return {"success": False, "message": f"获取分析信息失败: {str(e)}"}, 500
 
 
+def get_analysis_history(params: Optional[Dict] = None) -> Dict:
+    """
+    获取历史分析接口
+    接收参数code（多个以逗号隔开）、begin、end（年-月-日，均可省略，包含边界）
+    返回每个code在日期范围内的分析（按日期升序）
+    """
+    codes = _parse_codes(params)
+    if isinstance(codes, tuple):
+        return codes
+
+    begin = params.get("begin", [""])[0].strip()
+    end = params.get("end", [""])[0].strip()
+    try:
+        # 统一为补零的格式（如 2025-9-1 -> 2025-09-01），与文件中的日期按字符串比较
+        begin, end = (
+            datetime.strptime(date, DATE_FORMAT).strftime(DATE_FORMAT) if date else ""
+            for date in (begin, end)
+        )
+    except ValueError:
+        return {"success": False, "message": "begin和end格式应为年-月-日"}, 400
+
+    try:
+        stores = _get_stores(codes)
+        return {
+            "success": True,
+            "data": {
+                code: store.between(begin, end) for code, store in zip(codes, stores)
+            },
+            "message": "获取历史分析成功",
+        }
+    except Exception as e:
+        return {"success": False, "message": f"获取历史分析失败: {str(e)}"}, 500
+
+
 def add_analysis_info(_, request_body: Dict) -> Dict:
     """
     新增分析信息接口
@@ -104,30 +279,8 @@ def add_analysis_info(_, request_body: Dict) -> Dict:
 
     try:
         csv_path = get_csv_path(code)
-        init_csv_file(code)  # 确保文件存在
-        rows: List[Dict] = []
-        today_exists = False
-
-        # 读取现有数据
-        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # 如果找到今天的记录，标记并替换
-                if row["date"] == today:
-                    rows.append({"date": today, "analysis": analysis})
-                    today_exists = True
-                else:
-                    rows.append(row)
-
-        # 如果今天没有记录，添加新记录
-        if not today_exists:
-            rows.append({"date": today, "analysis": analysis})
-
-        # 写回所有数据
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(rows)
+        with get_file_lock(csv_path):
+            today_exists = _get_store(code).put(today, analysis)
 
         return {
             "success": True,
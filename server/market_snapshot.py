@@ -0,0 +1,255 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from trading_calendar import is_fresh
+from upstream_scheduler import background, get_scheduler
+
+# 全市场行情快照的刷新间隔（秒，可通过环境变量 STOCK_SNAPSHOT_INTERVAL 配置）
+SNAPSHOT_INTERVAL = float(os.environ.get("STOCK_SNAPSHOT_INTERVAL", "60"))
+# 刷新失败后的重试间隔（秒）
+RETRY_INTERVAL = 10.0
+# 排行榜单次最多返回的数量
+MAX_RANK_LIMIT = 200
+
+# 上游列名 -> 快照字段（数值列）
+SPOT_COLUMNS = {
+    "最新价": "current",
+    "涨跌额": "chg",
+    "涨跌幅": "percent",
+    "昨收": "last_close",
+    "今开": "open",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+}
+# 涨跌停幅度（%）：按代码前缀区分板块，主板ST股票为5%（创业板、科创板和北交所ST股票不变）
+_LIMIT_PERCENTS = (("bj", 30), ("sz30", 20), ("sh68", 20))
+_MAIN_LIMIT_PERCENT = 10
+_ST_LIMIT_PERCENT = 5
+
+
+def fetch_spot():
+    """从上游一次性获取沪深京A股全部实时行情（DataFrame）"""
+    # akshare 导入耗时数秒，仅在后台线程首次刷新时导入
+    import akshare as ak
+
+    return get_scheduler("akshare").call(ak.stock_zh_a_spot)
+
+
+class SpotTable:
+    """
+    某一时刻的全市场行情：代码、名称为列表，数值字段各为一个numpy数组（按行对齐），
+    按代码查找只需一次字典查找；创建后不再修改，刷新时整体替换
+    """
+
+    def __init__(self, frame, updated_at: float):
+        import numpy as np
+
+        self.updated_at = updated_at
+        self.codes: List[str] = [str(code).lower() for code in frame["代码"]]
+        self.names: List[str] = [str(name) for name in frame["名称"]]
+        self.columns = {
+            field: np.nan_to_num(np.asarray(frame[column], dtype=float))
+            for column, field in SPOT_COLUMNS.items()
+        }
+        self.rows: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+        # 成交量为0视为停牌
+        self.trading = self.columns["volume"] > 0
+        self.limit_percent = np.array(
+            [_limit_percent(code, name) for code, name in zip(self.codes, self.names)]
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def row(self, i: int) -> Dict:
+        item = {"code": self.codes[i], "name": self.names[i]}
+        for field, values in self.columns.items():
+            item[field] = float(values[i])
+        return item
+
+    def quotes(self, codes: List[str]) -> List[Dict]:
+        """按请求顺序返回行情（代码不区分大小写，不存在的代码跳过）"""
+        rows = (self.rows.get(code.lower()) for code in codes)
+        return [self.row(i) for i in rows if i is not None]
+
+    def rank(self, field: str, ascending: bool, limit: int) -> List[Dict]:
+        """按字段排序返回前 limit 只（不含停牌股票）"""
+        import numpy as np
+
+        candidates = np.flatnonzero(self.trading)
+        values = self.columns[field][candidates]
+        if ascending:
+            order = np.argsort(values, kind="stable")
+        else:
+            order = np.argsort(-values, kind="stable")
+        return [self.row(i) for i in candidates[order[:limit]].tolist()]
+
+    def breadth(self) -> Dict:
+        """市场宽度：上涨、下跌、平盘、停牌、涨停、跌停家数及总成交额"""
+        import numpy as np
+
+        percent = self.columns["percent"][self.trading]
+        limit = self.limit_percent[self.trading]
+        # 涨跌幅保留两位小数，与涨跌停幅度相差不超过0.1%即视为涨跌停
+        return {
+            "total": len(self),
+            "up": int(np.count_nonzero(percent > 0)),
+            "down": int(np.count_nonzero(percent < 0)),
+            "flat": int(np.count_nonzero(percent == 0)),
+            "suspended": int(len(self) - np.count_nonzero(self.trading)),
+            "limit_up": int(np.count_nonzero(percent >= limit - 0.1)),
+            "limit_down": int(np.count_nonzero(percent <= 0.1 - limit)),
+            "amount": float(self.columns["amount"].sum()),
+            "updated_at": int(self.updated_at * 1000),
+        }
+
+
+def _limit_percent(code: str, name: str) -> int:
+    for prefix, percent in _LIMIT_PERCENTS:
+        if code.startswith(prefix):
+            return percent
+    if "ST" in name.upper():
+        return _ST_LIMIT_PERCENT
+    return _MAIN_LIMIT_PERCENT
+
+
+class MarketSnapshot:
+    """
+    全市场行情快照：后台线程按固定间隔调用一次上游全量接口，
+    个股行情、排行榜和市场宽度都直接读取内存中的快照
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[], object] = fetch_spot,
+        interval: float = SNAPSHOT_INTERVAL,
+    ):
+        self._fetcher = fetcher
+        self._interval = interval
+        self._lock = threading.Lock()
+        # 同一时刻只有一次刷新（后台线程与同步加载不会重复请求上游）
+        self._refresh_lock = threading.Lock()
+        self._table: Optional[SpotTable] = None
+        self._thread = None
+
+    def table(self) -> Optional[SpotTable]:
+        """当前快照（首次刷新完成前为None），并确保后台刷新线程已启动"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="market-snapshot", daemon=True
+                )
+                self._thread.start()
+        return self._table
+
+    def refresh(self) -> SpotTable:
+        """拉取一次全市场行情并替换快照"""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> SpotTable:
+        frame = self._fetcher()
+        table = SpotTable(frame, time.time())
+        self._table = table
+        return table
+
+    def latest(self) -> SpotTable:
+        """当前快照，尚未加载时在当前线程同步拉取一次（供启动时生成股票列表等使用）"""
+        with self._refresh_lock:
+            if self._table is not None:
+                return self._table
+            return self._refresh()
+
+    def _refresh_if_stale(self) -> Optional[SpotTable]:
+        """快照过期时刷新并返回新快照，仍然有效时返回None"""
+        with self._refresh_lock:
+            table = self._table
+            if table is not None and is_fresh(table.updated_at, self._interval):
+                # 非交易时段行情已定格，无需刷新
+                return None
+            return self._refresh()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                started = time.perf_counter()
+                # 定时刷新属于后台任务，排队时让位于页面请求
+                with background():
+                    table = self._refresh_if_stale()
+                if table is None:
+                    time.sleep(self._interval)
+                    continue
+                elapsed = time.perf_counter() - started
+                print(f"全市场行情快照已更新（{len(table)} 只，耗时 {elapsed:.1f}s）")
+                delay = self._interval
+            except Exception as e:
+                print(f"全市场行情快照更新失败: {str(e)}")
+                delay = RETRY_INTERVAL
+            time.sleep(delay)
+
+
+market_snapshot = MarketSnapshot()
+
+
+def _loading_response():
+    return {"success": False, "message": "行情快照加载中，请稍后重试"}, 503
+
+
+def get_market_quotes(params):
+    """个股行情：codes 为逗号分隔的代码（如 sh600000,sz000001，不区分大小写）"""
+    codes = [
+        code.strip().lower()
+        for code in params.get("codes", [""])[0].split(",")
+        if code.strip()
+    ]
+    if not codes:
+        return {"success": False, "message": "缺少codes参数"}, 400
+
+    table = market_snapshot.table()
+    if table is None:
+        return _loading_response()
+    data = table.quotes(codes)
+    return {
+        "success": True,
+        "data": data,
+        "count": len(data),
+        "updated_at": int(table.updated_at * 1000),
+    }
+
+
+def get_market_rank(params):
+    """
+    排行榜：by 为排序字段（percent涨幅、volume成交量、amount成交额等），
+    order 为 desc（默认）或 asc，limit 为返回数量
+    """
+    field = params.get("by", ["percent"])[0].strip()
+    ascending = params.get("order", ["desc"])[0].strip() == "asc"
+    try:
+        limit = int(params.get("limit", ["20"])[0])
+    except ValueError:
+        return {"success": False, "message": "limit必须是整数"}, 400
+    if limit < 1:
+        return {"success": False, "message": "limit必须大于0"}, 400
+    limit = min(limit, MAX_RANK_LIMIT)
+    if field not in SPOT_COLUMNS.values():
+        return {"success": False, "message": f"不支持的排序字段: {field}"}, 400
+
+    table = market_snapshot.table()
+    if table is None:
+        return _loading_response()
+    return {
+        "success": True,
+        "data": table.rank(field, ascending, limit),
+        "updated_at": int(table.updated_at * 1000),
+    }
+
+
+def get_market_breadth(params):
+    """市场宽度：涨跌家数、涨跌停家数和总成交额"""
+    table = market_snapshot.table()
+    if table is None:
+        return _loading_response()
+    return {"success": True, "data": table.breadth()}
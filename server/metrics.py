@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# 耗时直方图的分桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 响应体大小直方图的分桶上限（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# 文本格式的Content-Type（Prometheus text exposition format 0.0.4）
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """计数器：按标签值分别累加（标签值按 labelnames 顺序传入）"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """直方图：按标签值分别统计各分桶的数量、总和与总数"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值 -> [各分桶计数（非累计，最后一个为 +Inf）, 总和, 总数]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {
+                labels: (list(counts), total, count)
+                for labels, (counts, total, count) in self._values.items()
+            }
+        names = self.labelnames + ("le",)
+        lines = []
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, labels + (le,))} "
+                    f"{cumulative}"
+                )
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表：按注册顺序输出文本格式"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter(
+        "stock_http_requests_total",
+        "HTTP请求数（按接口、方法和状态码）",
+        ("route", "method", "status"),
+    )
+)
+http_request_seconds = registry.register(
+    Histogram(
+        "stock_http_request_duration_seconds",
+        "HTTP请求处理耗时（含编码和压缩）",
+        ("route", "method"),
+    )
+)
+http_response_bytes = registry.register(
+    Histogram(
+        "stock_http_response_size_bytes",
+        "HTTP响应体大小（压缩后）",
+        ("route",),
+        SIZE_BUCKETS,
+    )
+)
+upstream_calls = registry.register(
+    Counter(
+        "stock_upstream_calls_total",
+        "上游调用数（result为ok、error、rejected熔断拒绝、throttled排队超时）",
+        ("upstream", "endpoint", "result"),
+    )
+)
+upstream_call_seconds = registry.register(
+    Histogram(
+        "stock_upstream_call_duration_seconds",
+        "上游调用耗时（不含排队等待令牌的时间）",
+        ("upstream", "endpoint"),
+    )
+)
+cache_requests = registry.register(
+    Counter(
+        "stock_cache_requests_total",
+        "缓存命中与未命中次数",
+        ("cache", "result"),
+    )
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def get_metrics(params) -> str:
+    """全部指标的文本格式（/metrics）"""
+    return registry.render()
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import stock_api
+from get_data_from_xueqiu import kline_store, recent_codes
+from indicators import indicator_engine
+from screener import MAX_WINDOW, SCREEN_PERIOD
+from selection_api import selection_codes
+from trading_calendar import CLOSED, frozen_since, next_open, session_phase
+from upstream_scheduler import CircuitOpenError, background
+
+# 预取的周期（与前端K线页面的周期一致，本地日线、1分钟线足够时周线、月线和分钟线由其合成）
+PREFETCH_PERIODS = ("day", "week", "month", "60m", "30m", "5m", "1m")
+# 每个周期预取的K线数量（与前端默认请求数量一致，指标计算另需向前多取 WARMUP 根）
+PREFETCH_LIMIT = 100
+# 并发预取的线程数（可通过环境变量 STOCK_PREFETCH_WORKERS 配置），实际请求速度受上游限速约束
+PREFETCH_WORKERS = int(os.environ.get("STOCK_PREFETCH_WORKERS", "4"))
+# 开盘前提前多久（秒）再预取一轮，补上收盘后新查看的代码
+PRE_OPEN_LEAD = 30 * 60
+# 允许预取的时段：收盘后、非交易日和开盘前（午休等盘中间隙不预取）
+PREFETCH_PHASES = {"after_close", CLOSED, "pre_market"}
+# 检查是否需要预取的间隔（秒）
+CHECK_INTERVAL = 60.0
+# 全市场日线预取的K线数量（覆盖选股的最长周期，首次建立存储时按 INITIAL_COUNT 拉取）
+UNIVERSE_LIMIT = MAX_WINDOW + 1
+
+
+def _prefetch_codes() -> List[str]:
+    """自选列表在前，其后是最近查看过的代码（去重，统一大写）"""
+    codes = [code.strip().upper() for code in selection_codes() + recent_codes()]
+    return list(dict.fromkeys(code for code in codes if code))
+
+
+def _universe_codes() -> List[str]:
+    """股票列表中的全部代码（统一大写），股票列表在后台加载，等待加载完成"""
+    while stock_api.is_loading():
+        time.sleep(1)
+    if not stock_api.is_ready():
+        return []
+    return [row["代码"].upper() for row in stock_api.get_stock_index().rows]
+
+
+def _warm_bars(code: str, period: str, limit: int) -> None:
+    """只同步本地K线（不计算指标）"""
+    kline_store.get_window(code, period, None, limit)
+
+
+class Prefetcher:
+    """
+    K线预取：收盘后行情定格时、次日开盘前各预取一轮自选和最近查看的股票，
+    各周期K线写入本地存储并计算指标缓存，K线页面打开时只需读取本地数据
+    预取使用后台优先级经上游调度器限速，排队时让位于页面请求
+    """
+
+    def __init__(
+        self,
+        warm: Callable[[str, str, int], object] = indicator_engine.latest,
+        codes: Callable[[], List[str]] = _prefetch_codes,
+        periods=PREFETCH_PERIODS,
+        limit: int = PREFETCH_LIMIT,
+        workers: int = PREFETCH_WORKERS,
+        name: str = "kline-prefetch",
+        run_on_start: bool = False,
+    ):
+        self._warm = warm
+        self._codes = codes
+        self._periods = periods
+        self._limit = limit
+        self._workers = workers
+        self._name = name
+        # 启动后立即预取一轮（不等收盘），用于补齐本地尚未建立的存储
+        self._run_on_start = run_on_start
+        self._lock = threading.Lock()
+        self._thread = None
+        # 上一轮预取的开始时间（时间戳，秒）
+        self._last_round = 0.0
+        self._last_result: Optional[Dict] = None
+        self._running = False
+
+    def start(self) -> None:
+        """启动后台预取线程（重复调用无影响）"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self._name, daemon=True
+                )
+                self._thread.start()
+
+    def is_due(self, now: float) -> bool:
+        """行情定格后尚未预取过，或已进入开盘前的预取时间"""
+        if self._run_on_start and not self._last_round:
+            return True
+        if session_phase(now) not in PREFETCH_PHASES:
+            return False
+        since = frozen_since(now)
+        if since is None:
+            return False
+        if self._last_round < since:
+            return True
+        pre_open = next_open(now) - PRE_OPEN_LEAD
+        return self._last_round < pre_open <= now
+
+    def _run(self) -> None:
+        while True:
+            now = time.time()
+            if self.is_due(now):
+                self._last_round = now
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"K线预取失败: {str(e)}")
+            time.sleep(CHECK_INTERVAL)
+
+    def _prefetch_code(self, code: str) -> int:
+        """预取单只股票的各周期，返回失败的周期数"""
+        failed = 0
+        # 线程池中的线程不继承调用方的上下文，需在任务内设置后台优先级
+        with background():
+            for period in self._periods:
+                try:
+                    self._warm(code, period, self._limit)
+                except CircuitOpenError:
+                    # 上游熔断中，剩余周期也会直接失败
+                    return failed + len(self._periods) - self._periods.index(period)
+                except Exception as e:
+                    print(f"K线预取失败({code} {period}): {str(e)}")
+                    failed += 1
+        return failed
+
+    def run_once(self) -> Dict:
+        """立即预取一轮，返回本轮统计"""
+        started = time.time()
+        self._running = True
+        try:
+            codes = self._codes()
+            with ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix=self._name
+            ) as executor:
+                failed = sum(executor.map(self._prefetch_code, codes))
+        finally:
+            self._running = False
+        finished = time.time()
+        result = {
+            "codes": len(codes),
+            "tasks": len(codes) * len(self._periods),
+            "failed": failed,
+            "started_at": int(started * 1000),
+            "elapsed_ms": int((finished - started) * 1000),
+        }
+        self._last_result = result
+        print(
+            f"K线预取完成（{self._name}：{len(codes)} 只，失败 {failed} 项，"
+            f"耗时 {finished - started:.1f}s）"
+        )
+        return result
+
+    def stats(self) -> Dict:
+        return {"running": self._running, "last_round": self._last_result}
+
+
+prefetcher = Prefetcher()
+# 全市场日线预取：供选股和全市场回测读取本地日线（启动后先补齐一轮，之后每天收盘后同步）
+universe_prefetcher = Prefetcher(
+    warm=_warm_bars,
+    codes=_universe_codes,
+    periods=(SCREEN_PERIOD,),
+    limit=UNIVERSE_LIMIT,
+    name="universe-prefetch",
+    run_on_start=True,
+)
+
+
+def get_prefetch_status(params):
+    """
+    K线预取状态：是否正在预取及上一轮的代码数、失败项数和耗时，
+    universe 为全市场日线预取的状态
+    """
+    return {
+        "success": True,
+        "data": {**prefetcher.stats(), "universe": universe_prefetcher.stats()},
+    }
@@ -0,0 +1,31 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# 计算密集任务（选股、回测）共用的进程池大小，默认与CPU核数一致
+PROCESS_WORKERS = int(os.environ.get("STOCK_PROCESS_WORKERS", "0")) or os.cpu_count()
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """获取共享进程池（首次使用时创建）"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            # 服务器是多线程进程，使用spawn避免fork后子进程继承锁状态
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS, mp_context=get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    """关闭共享进程池（服务器关闭时调用）"""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,164 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from trading_calendar import is_fresh
+
+# 轮询间隔（秒）
+POLL_INTERVAL = 1.0
+# 最新K线的轮询间隔（秒）
+BAR_POLL_INTERVAL = 5.0
+# 超过该时间没有客户端读取的代码，停止轮询（秒）
+WATCH_TTL = 30.0
+# 单次批量请求最多包含的代码数量（避免URL过长）
+BATCH_SIZE = 100
+
+
+class QuoteHub:
+    """
+    行情中心：汇总所有客户端正在关注的代码，每个周期只向上游发起一次批量请求，
+    接口处理函数直接读取内存快照
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[List[str]], Dict[str, Dict]],
+        bar_fetcher: Optional[Callable[[str, str], Optional[Dict]]] = None,
+        poll_interval: float = POLL_INTERVAL,
+        watch_ttl: float = WATCH_TTL,
+    ):
+        # fetcher(symbols) -> {symbol: quote}
+        self._fetcher = fetcher
+        # bar_fetcher(code, period) -> 最新一根K线
+        self._bar_fetcher = bar_fetcher
+        self._poll_interval = poll_interval
+        self._watch_ttl = watch_ttl
+        # 快照更新时通知推送连接
+        self._lock = threading.Condition()
+        self._version = 0
+        self._watched: Dict[str, float] = {}  # symbol -> 最近一次被读取的时间
+        self._snapshot: Dict[str, Dict] = {}  # symbol -> quote
+        self._watched_bars: Dict[Tuple[str, str], float] = {}  # (code, period) -> 时间
+        self._bars: Dict[Tuple[str, str], Dict] = {}  # (code, period) -> 最新K线
+        # 最近一次轮询的时间戳（秒）：非交易时段行情定格后轮询过一次即停止
+        self._quotes_polled_at = 0.0
+        self._bars_polled_at = 0.0
+        self._thread = None
+
+    def watch(self, symbols: Iterable[str]) -> None:
+        """登记关注的代码，并确保后台轮询线程已启动"""
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                self._watched[symbol] = now
+            self._ensure_thread()
+
+    def watch_bars(self, keys: Iterable[Tuple[str, str]]) -> None:
+        """登记需要推送最新K线的 (code, period)"""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._watched_bars[key] = now
+            self._ensure_thread()
+
+    def _ensure_thread(self) -> None:
+        """启动后台轮询线程（调用方需持有锁）"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="quote-hub", daemon=True
+            )
+            self._thread.start()
+
+    def get_quotes(self, symbols: List[str]) -> List[Dict]:
+        """按请求顺序返回快照中的行情，快照中缺失的代码会立即同步拉取一次"""
+        self.watch(symbols)
+        with self._lock:
+            missing = [symbol for symbol in symbols if symbol not in self._snapshot]
+        if missing:
+            self.refresh(missing)
+        with self._lock:
+            return [self._snapshot[s] for s in symbols if s in self._snapshot]
+
+    def refresh(self, symbols: List[str]) -> None:
+        """批量拉取指定代码的行情并写入快照"""
+        quotes = {}
+        for i in range(0, len(symbols), BATCH_SIZE):
+            quotes.update(self._fetcher(symbols[i : i + BATCH_SIZE]))
+        with self._lock:
+            self._snapshot.update(quotes)
+            self._notify()
+
+    def refresh_bars(self, keys: List[Tuple[str, str]]) -> None:
+        """逐个拉取最新K线，有变化时写入快照"""
+        for key in keys:
+            bar = self._bar_fetcher(*key)
+            if bar is None:
+                continue
+            with self._lock:
+                if self._bars.get(key) != bar:
+                    self._bars[key] = bar
+                    self._notify()
+
+    def _notify(self) -> None:
+        """快照版本号加一并唤醒等待中的推送连接（调用方需持有锁）"""
+        self._version += 1
+        self._lock.notify_all()
+
+    def wait_for_update(self, version: int, timeout: float) -> int:
+        """阻塞直到快照版本号超过version或超时，返回当前版本号"""
+        with self._lock:
+            self._lock.wait_for(lambda: self._version > version, timeout)
+            return self._version
+
+    def snapshot(
+        self, symbols: List[str], bar_keys: List[Tuple[str, str]] = ()
+    ) -> Tuple[Dict[str, Dict], Dict[Tuple[str, str], Dict]]:
+        """读取指定代码的行情快照和最新K线快照"""
+        with self._lock:
+            quotes = {s: self._snapshot[s] for s in symbols if s in self._snapshot}
+            bars = {k: self._bars[k] for k in bar_keys if k in self._bars}
+            return quotes, bars
+
+    def _active_symbols(self) -> List[str]:
+        """返回仍在关注期内的代码，同时清理过期代码"""
+        expire_before = time.monotonic() - self._watch_ttl
+        with self._lock:
+            for symbol, last_seen in list(self._watched.items()):
+                if last_seen < expire_before:
+                    del self._watched[symbol]
+                    self._snapshot.pop(symbol, None)
+            return list(self._watched)
+
+    def _active_bar_keys(self) -> List[Tuple[str, str]]:
+        """返回仍在关注期内的 (code, period)，同时清理过期项"""
+        expire_before = time.monotonic() - self._watch_ttl
+        with self._lock:
+            for key, last_seen in list(self._watched_bars.items()):
+                if last_seen < expire_before:
+                    del self._watched_bars[key]
+                    self._bars.pop(key, None)
+            return list(self._watched_bars)
+
+    def _run(self) -> None:
+        """
+        后台轮询：每个周期把所有关注代码合并为一次批量请求
+        非交易时段行情不变，定格后成功轮询过一次即不再请求上游（新关注的代码由 get_quotes 拉取）
+        """
+        while True:
+            started = time.monotonic()
+            symbols = self._active_symbols()
+            if symbols and not is_fresh(self._quotes_polled_at, self._poll_interval):
+                try:
+                    polled_at = time.time()
+                    self.refresh(symbols)
+                    self._quotes_polled_at = polled_at
+                except Exception as e:
+                    print(f"行情轮询失败: {str(e)}")
+            bars_due = not is_fresh(self._bars_polled_at, BAR_POLL_INTERVAL)
+            if self._bar_fetcher and bars_due:
+                self._bars_polled_at = time.time()
+                try:
+                    self.refresh_bars(self._active_bar_keys())
+                except Exception as e:
+                    print(f"K线轮询失败: {str(e)}")
+            elapsed = time.monotonic() - started
+            time.sleep(max(self._poll_interval - elapsed, 0))
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+from get_data_from_xueqiu import quote_hub
+
+# 无数据变化时发送心跳的间隔（秒），同时用于探测断开的连接
+HEARTBEAT_INTERVAL = 15.0
+# 等待快照更新的最长时间（秒），决定服务器关闭时推送连接的退出延迟
+WAIT_TIMEOUT = 1.0
+# 同时保持的推送连接上限（可通过环境变量 STOCK_MAX_STREAMS 配置）：每个连接在存活期间占用一个
+# 服务器工作线程，默认最多占用工作线程数（STOCK_SERVER_WORKERS）的一半，其余留给普通接口
+MAX_STREAMS = int(
+    os.environ.get(
+        "STOCK_MAX_STREAMS",
+        str(max(int(os.environ.get("STOCK_SERVER_WORKERS", "32")) // 2, 1)),
+    )
+)
+# 超出上限时建议客户端重试的间隔（秒）
+RETRY_AFTER = 30
+# 服务器关闭时置位，通知所有推送连接退出
+_closing = threading.Event()
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def close_streams():
+    """通知所有推送连接结束（服务器关闭时调用）"""
+    _closing.set()
+
+
+def _parse_bar_keys(klines_param: str):
+    """解析 klines 参数，格式：SZ300395:day,SZ300395:30m"""
+    keys = []
+    for item in klines_param.split(","):
+        code, _, period = item.strip().partition(":")
+        if code and period:
+            keys.append((code.upper(), period.lower()))
+    return keys
+
+
+def _format_event(event: str, data) -> bytes:
+    """按SSE格式组装一条事件"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _send_error(handler, status_code: int, message: str, headers=()) -> None:
+    body = json.dumps({"success": False, "message": message}, ensure_ascii=False)
+    handler.send_response(status_code)
+    handler.send_header("Content-type", "application/json")
+    handler.send_header("Access-Control-Allow-Origin", "*")
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+    handler.wfile.write(body.encode("utf-8"))
+
+
+def stream_quotes(handler, query_params):
+    """
+    行情推送接口（Server-Sent Events）
+    参数 symbols：订阅的代码（逗号分隔）；klines：订阅最新K线的 代码:周期（逗号分隔）
+    首次推送完整行情，之后只推送变化的字段；最新K线变化时推送 kline 事件
+    连接数达到 MAX_STREAMS 时返回503，客户端改为轮询
+    """
+    symbols_param = query_params.get("symbols", [""])[0].strip().upper()
+    symbols = [symbol for symbol in symbols_param.split(",") if symbol]
+    bar_keys = _parse_bar_keys(query_params.get("klines", [""])[0])
+    if not symbols and not bar_keys:
+        _send_error(handler, 400, "缺少symbols或klines参数")
+        return
+
+    if not _stream_slots.acquire(blocking=False):
+        _send_error(
+            handler,
+            503,
+            "推送连接数已达上限，请稍后重试",
+            [("Retry-After", str(RETRY_AFTER))],
+        )
+        return
+    try:
+        _stream(handler, symbols, bar_keys)
+    finally:
+        _stream_slots.release()
+
+
+def _stream(handler, symbols, bar_keys):
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/event-stream; charset=utf-8")
+    handler.send_header("Cache-Control", "no-cache")
+    handler.send_header("Connection", "keep-alive")
+    handler.send_header("Access-Control-Allow-Origin", "*")
+    handler.end_headers()
+
+    sent_quotes = {}  # symbol -> 已推送的完整行情
+    sent_bars = {}  # (code, period) -> 已推送的K线
+    version = -1
+    last_write = time.monotonic()
+    try:
+        while not _closing.is_set():
+            # 每轮都续期关注，连接存活期间行情中心持续轮询这些代码
+            quote_hub.watch(symbols)
+            quote_hub.watch_bars(bar_keys)
+            version = quote_hub.wait_for_update(version, WAIT_TIMEOUT)
+            quotes, bars = quote_hub.snapshot(symbols, bar_keys)
+
+            chunks = []
+            for symbol, quote in quotes.items():
+                previous = sent_quotes.get(symbol, {})
+                changed = {k: v for k, v in quote.items() if previous.get(k) != v}
+                if changed:
+                    # 始终携带 symbol 和 code，便于客户端合并
+                    changed["symbol"] = symbol
+                    changed["code"] = quote.get("code")
+                    chunks.append(_format_event("quote", changed))
+                    sent_quotes[symbol] = quote
+            for (code, period), bar in bars.items():
+                if sent_bars.get((code, period)) != bar:
+                    chunks.append(
+                        _format_event(
+                            "kline", {"code": code, "period": period, "bar": bar}
+                        )
+                    )
+                    sent_bars[(code, period)] = bar
+
+            now = time.monotonic()
+            if chunks:
+                handler.wfile.write(b"".join(chunks))
+            elif now - last_write >= HEARTBEAT_INTERVAL:
+                handler.wfile.write(b": ping\n\n")
+            else:
+                continue
+            handler.wfile.flush()
+            last_write = now
+    except (BrokenPipeError, ConnectionResetError):
+        # 客户端断开连接
+        return
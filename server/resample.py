@@ -0,0 +1,139 @@
+import datetime
+from itertools import groupby
+from typing import Callable, List, Optional, Tuple
+
+# 可由基础周期合成的周期：周期 -> (基础周期, 每根包含的基础K线数量，用于估算需要读取的基础K线)
+RESAMPLE_RULES = {
+    "week": ("day", 5),
+    "month": ("day", 23),
+    "5m": ("1m", 5),
+    "15m": ("1m", 15),
+    "30m": ("1m", 30),
+    "60m": ("1m", 60),
+}
+# 单次合成最多读取的基础K线数量
+MAX_BASE_BARS = 20000
+
+# A股交易时间（北京时间，距当日零点的分钟数）
+CHINA_OFFSET_MS = 8 * 3600 * 1000
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+SESSION_MINUTES = 240
+ONE_DAY_MS = 86400 * 1000
+ONE_MINUTE_MS = 60 * 1000
+
+Bar = Tuple[float, ...]
+
+
+def _session_minute(minute_of_day: int) -> int:
+    """
+    分钟K线（以结束时间标记）在当日交易时段内的序号 1..240
+    09:30的集合竞价K线并入第一根，午休期间和收盘后的K线分别并入上午、下午最后一根
+    """
+    if minute_of_day <= MORNING_CLOSE:
+        return min(max(minute_of_day - MORNING_OPEN, 1), 120)
+    if minute_of_day <= AFTERNOON_OPEN:
+        return 120
+    return min(minute_of_day - AFTERNOON_OPEN + 120, SESSION_MINUTES)
+
+
+def _minute_bucket(minutes: int) -> Callable[[int], int]:
+    """N分钟K线的分组函数：返回所属K线的结束时间戳（毫秒）"""
+
+    def bucket(timestamp: int) -> int:
+        day, offset = divmod(timestamp + CHINA_OFFSET_MS, ONE_DAY_MS)
+        index = _session_minute(offset // ONE_MINUTE_MS)
+        end = -(-index // minutes) * minutes
+        if end <= 120:
+            minute_of_day = MORNING_OPEN + end
+        else:
+            minute_of_day = AFTERNOON_OPEN + end - 120
+        return day * ONE_DAY_MS + minute_of_day * ONE_MINUTE_MS - CHINA_OFFSET_MS
+
+    return bucket
+
+
+def _week_bucket(timestamp: int) -> int:
+    """所在自然周（周一开始）的序号"""
+    day = (timestamp + CHINA_OFFSET_MS) // ONE_DAY_MS
+    # 1970-01-01 为周四
+    return (day + 3) // 7
+
+
+def _month_bucket(timestamp: int) -> int:
+    date = datetime.date(1970, 1, 1) + datetime.timedelta(
+        days=(timestamp + CHINA_OFFSET_MS) // ONE_DAY_MS
+    )
+    return date.year * 12 + date.month
+
+
+def _aggregate(label: int, group: List[Bar]) -> Bar:
+    """
+    合并一组基础K线：开盘取第一根，最高/最低取极值，收盘取最后一根，成交量与换手率求和，
+    涨跌幅相对第一根的昨收（由其收盘价和涨跌幅反推）计算
+    """
+    first, last = group[0], group[-1]
+    high = max(bar[2] for bar in group)
+    low = min(bar[3] for bar in group)
+    volume = sum(bar[5] for bar in group)
+    turnoverrate = round(sum(bar[7] for bar in group), 4)
+    pre_close = first[4] / (1 + first[6] / 100)
+    percent = round((last[4] / pre_close - 1) * 100, 2) if pre_close else 0
+    return (label, first[1], high, low, last[4], volume, percent, turnoverrate)
+
+
+def _bucket_key(period: str) -> Callable[[int], int]:
+    """目标周期的分组函数：基础K线时间戳 -> 所属分组"""
+    if period == "week":
+        return _week_bucket
+    if period == "month":
+        return _month_bucket
+    return _minute_bucket(RESAMPLE_RULES[period][1])
+
+
+def resample(bars: List[Bar], period: str) -> List[Bar]:
+    """
+    将基础周期K线（按 KLINE_FIELDS 顺序的元组，时间升序）合成为目标周期
+    周线、月线以周期内第一根日线的时间标记；分钟线以结束时间标记（与上游一致）
+    """
+    key = _bucket_key(period)
+    label_first = period in ("week", "month")
+
+    result = []
+    for bucket, items in groupby(bars, key=lambda bar: key(int(bar[0]))):
+        group = list(items)
+        label = group[0][0] if label_first else bucket
+        result.append(_aggregate(label, group))
+    return result
+
+
+def base_limit(period: str, limit: int) -> int:
+    """合成 limit 根目标周期K线需要读取的基础K线数量（多两根的量，用于丢弃首尾不完整的K线）"""
+    return min((limit + 2) * RESAMPLE_RULES[period][1], MAX_BASE_BARS)
+
+
+def resampled_window(
+    bars: List[Bar],
+    period: str,
+    limit: int,
+    from_head: bool,
+    next_ts: Optional[int],
+) -> Optional[List[Bar]]:
+    """
+    由基础周期窗口合成目标周期的最后 limit 根，基础K线不足以合成时返回None
+    from_head 表示窗口从上市首根基础K线开始（开头一根是完整的）；
+    next_ts 为窗口之后的下一根基础K线的时间戳（没有则为None）
+    窗口开头的一根可能只包含部分基础K线，予以丢弃；
+    结尾的一根在窗口之后仍有同组的基础K线时（历史窗口截止于周期中间）同样不完整，予以丢弃
+    """
+    result = resample(bars, period)
+    if result and not from_head:
+        result = result[1:]
+    if result and next_ts is not None:
+        key = _bucket_key(period)
+        if key(int(next_ts)) == key(int(bars[-1][0])):
+            result = result[:-1]
+    if len(result) < limit and not from_head:
+        return None
+    return result[-limit:] if limit > 0 else []
@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import json
+
+# 可选依赖：安装后自动启用（orjson 编码更快，brotli 压缩率更高）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于该字节数的响应不压缩（压缩收益抵不上开销）
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# 标准库编码器：紧凑分隔符，关闭循环引用检查（响应数据不存在循环引用）
+_compact_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), check_circular=False
+)
+
+
+def encode_json(data) -> bytes:
+    """将响应数据编码为UTF-8 JSON（优先使用orjson）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # orjson不支持的类型（如非字符串键）回退到标准库
+            pass
+    return _compact_encoder.encode(data).encode("utf-8")
+
+
+def negotiate_encoding(accept_encoding: str, body_size: int):
+    """根据 Accept-Encoding 选择压缩方式（br优先于gzip），不压缩时返回None"""
+    if body_size < MIN_COMPRESS_SIZE or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding) -> bytes:
+    """按选定的方式压缩响应体"""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def make_etag(body: bytes, encoding) -> str:
+    """根据响应内容计算强ETag（不同压缩方式的表示使用不同的ETag）"""
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中当前ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较，忽略 W/ 前缀
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
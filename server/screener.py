@@ -0,0 +1,374 @@
+import ast
+import os
+import re
+import threading
+from typing import Dict, List, Set, Tuple
+import metrics
+from bar_file import HEADER, BarFile
+from kline_store import KLINES_DIR
+from process_pool import PROCESS_WORKERS, get_process_pool
+
+# 选股使用的K线周期（读取本地K线存储中的日线）
+SCREEN_PERIOD = "day"
+# 每个进程分到的分片数量（分片越多负载越均衡）
+SHARDS_PER_WORKER = 4
+# 股票数量少于该值时直接在当前进程计算（进程间通信开销大于收益）
+MIN_PARALLEL_CODES = 500
+# 表达式长度上限
+MAX_EXPRESSION_LENGTH = 500
+# 结果保留的小数位数
+DECIMALS = 3
+# 接口最多返回的缺少本地日线的代码数量
+MAX_MISSING_CODES = 100
+
+# 直接取最后一根K线的字段
+BAR_FEATURES = ["open", "high", "low", "close", "volume", "percent", "turnoverrate"]
+# 带周期参数的特征：名称前缀 -> 说明
+WINDOW_FEATURES = {
+    "ma": "N日收盘均价",
+    "vma": "N日平均成交量",
+    "ret": "N日涨幅(%)",
+    "hhv": "N日最高价",
+    "llv": "N日最低价",
+}
+# 另有 vol_ratio：量比（当日成交量 / 前5日平均成交量）
+MAX_WINDOW = 250
+WINDOW_PATTERN = re.compile(r"^(%s)(\d+)$" % "|".join(WINDOW_FEATURES))
+
+# 允许出现在表达式中的语法节点
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BoolOp,
+    ast.And,
+    ast.Or,
+    ast.UnaryOp,
+    ast.Not,
+    ast.USub,
+    ast.UAdd,
+    ast.BinOp,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Compare,
+    ast.Gt,
+    ast.GtE,
+    ast.Lt,
+    ast.LtE,
+    ast.Eq,
+    ast.NotEq,
+    ast.Name,
+    ast.Load,
+    ast.Constant,
+)
+
+
+def feature_window(name: str) -> int:
+    """特征需要的K线数量，未知特征抛出 ValueError"""
+    if name in BAR_FEATURES:
+        return 1
+    if name == "vol_ratio":
+        return 6
+    match = WINDOW_PATTERN.match(name)
+    if not match:
+        raise ValueError(f"未知的字段: {name}")
+    window = int(match.group(2))
+    if not 1 <= window <= MAX_WINDOW:
+        raise ValueError(f"周期超出范围(1-{MAX_WINDOW}): {name}")
+    # 涨幅需要额外一根作为基准
+    return window + 1 if match.group(1) == "ret" else window
+
+
+def parse_expression(expression: str) -> Tuple[ast.Expression, Set[str]]:
+    """
+    解析选股表达式（只允许比较、算术和 and/or/not），返回语法树和用到的特征
+    例：close > ma20 and vol_ratio > 2 and ret5 > 10
+    """
+    if not expression or len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError("表达式为空或过长")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise ValueError("表达式语法错误")
+    features = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"不支持的语法: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("只支持数值常量")
+        if isinstance(node, ast.Name):
+            feature_window(node.id)
+            features.add(node.id)
+    return tree, features
+
+
+def evaluate_expression(np, node, values: Dict):
+    """在特征数组上按元素计算表达式（NaN参与的比较结果为False）"""
+    if isinstance(node, ast.Expression):
+        return evaluate_expression(np, node.body, values)
+    if isinstance(node, ast.Name):
+        return values[node.id]
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.BoolOp):
+        operands = [evaluate_expression(np, value, values) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return combine.reduce(operands)
+    if isinstance(node, ast.UnaryOp):
+        operand = evaluate_expression(np, node.operand, values)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp):
+        left = evaluate_expression(np, node.left, values)
+        right = evaluate_expression(np, node.right, values)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return left / right
+    if isinstance(node, ast.Compare):
+        result = None
+        left = evaluate_expression(np, node.left, values)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = evaluate_expression(np, comparator, values)
+            with np.errstate(invalid="ignore"):
+                if isinstance(op, ast.Gt):
+                    current = left > right
+                elif isinstance(op, ast.GtE):
+                    current = left >= right
+                elif isinstance(op, ast.Lt):
+                    current = left < right
+                elif isinstance(op, ast.LtE):
+                    current = left <= right
+                elif isinstance(op, ast.Eq):
+                    current = left == right
+                else:
+                    current = left != right
+            result = current if result is None else np.logical_and(result, current)
+            left = right
+        return result
+    raise ValueError(f"不支持的语法: {type(node).__name__}")
+
+
+def _load_matrix(np, codes: List[str], base_dir: str, lookback: int):
+    """
+    读取各股票最后 lookback 根日线，按列组成 (股票数, lookback) 的矩阵（右对齐，不足补NaN）
+    """
+    matrix = {name: np.full((len(codes), lookback), np.nan) for name in BAR_FEATURES}
+    for row, code in enumerate(codes):
+        bar_file = BarFile(os.path.join(base_dir, code, f"{SCREEN_PERIOD}.bars"))
+        try:
+            start = max(len(bar_file) - lookback, 0)
+            count = len(bar_file) - start
+            if not count:
+                continue
+            for name in matrix:
+                view = bar_file.view(name, start)
+                matrix[name][row, lookback - count :] = view
+                view.release()
+        finally:
+            bar_file.close()
+    return matrix
+
+
+def _compute_features(np, matrix: Dict, features: Set[str]) -> Dict:
+    """由K线矩阵计算各特征（每个特征是长度为股票数的数组）"""
+    values = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name in features:
+            if name in BAR_FEATURES:
+                values[name] = matrix[name][:, -1]
+            elif name == "vol_ratio":
+                volume = matrix["volume"]
+                values[name] = volume[:, -1] / volume[:, -6:-1].mean(axis=1)
+            else:
+                prefix, window = WINDOW_PATTERN.match(name).groups()
+                window = int(window)
+                if prefix == "ma":
+                    values[name] = matrix["close"][:, -window:].mean(axis=1)
+                elif prefix == "vma":
+                    values[name] = matrix["volume"][:, -window:].mean(axis=1)
+                elif prefix == "ret":
+                    close = matrix["close"]
+                    values[name] = (close[:, -1] / close[:, -window - 1] - 1) * 100
+                elif prefix == "hhv":
+                    values[name] = matrix["high"][:, -window:].max(axis=1)
+                else:
+                    values[name] = matrix["low"][:, -window:].min(axis=1)
+    return values
+
+
+def _scan_shard(codes: List[str], expression: str, base_dir: str, extra: Tuple):
+    """
+    扫描一个分片（在子进程中执行）：读取K线、计算特征并筛选
+    extra 为不参与筛选但需要返回的特征（如排序字段），返回 [(代码, {特征: 数值})]
+    """
+    import numpy as np
+
+    tree, features = parse_expression(expression)
+    features.update(extra)
+    lookback = max((feature_window(name) for name in features), default=1)
+    matrix = _load_matrix(np, codes, base_dir, lookback)
+    values = _compute_features(np, matrix, features)
+    mask = np.asarray(evaluate_expression(np, tree, values), dtype=bool)
+    if mask.ndim == 0:
+        # 表达式不含任何字段（常量表达式）
+        mask = np.full(len(codes), bool(mask))
+    names = sorted(features)
+    rounded = {name: np.round(values[name], DECIMALS) for name in names}
+    return [
+        (codes[row], {name: _to_number(rounded[name][row]) for name in names})
+        for row in np.flatnonzero(mask).tolist()
+    ]
+
+
+def _to_number(value):
+    """numpy数值转为float（NaN转为None）"""
+    value = float(value)
+    return None if value != value else value
+
+
+class Screener:
+    """
+    全市场选股：股票列表分片后交给进程池，各进程直接读取本地列式K线文件，
+    以向量化方式计算特征和条件；本地日线未变化时相同表达式的结果直接复用
+    """
+
+    def __init__(self, base_dir: str = KLINES_DIR, max_workers: int = PROCESS_WORKERS):
+        self._base_dir = os.path.abspath(base_dir)
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        # (表达式语法树, 额外特征, 数据状态) -> 结果
+        self._cache: Dict[Tuple, List] = {}
+
+    def _data_state(self, codes: List[str]) -> Tuple[Tuple, List[str]]:
+        """
+        各股票日线文件的状态：返回 (签名, 缺少本地日线的代码)
+        签名由股票列表、有数据的文件数和最大修改时间组成，任一日线更新后签名即变化
+        """
+        missing = []
+        latest = 0
+        for code in codes:
+            path = os.path.join(self._base_dir, code, f"{SCREEN_PERIOD}.bars")
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                missing.append(code)
+                continue
+            if stat.st_size <= HEADER.size:
+                missing.append(code)
+                continue
+            latest = max(latest, stat.st_mtime_ns)
+        signature = (hash(tuple(codes)), len(codes) - len(missing), latest)
+        return signature, missing
+
+    def scan(
+        self,
+        codes: List[str],
+        expression: str,
+        extra: Tuple = (),
+        use_cache: bool = True,
+    ):
+        """
+        扫描指定股票，返回 (满足条件的 [(代码, {特征: 数值})]（按代码顺序）, 缺少本地日线的代码)
+        extra 为额外返回的特征；缺少本地日线的股票不参与筛选
+        """
+        tree, _ = parse_expression(expression)
+        for name in extra:
+            feature_window(name)
+        signature, missing = self._data_state(codes)
+        cache_key = (ast.dump(tree), tuple(extra), signature)
+        if use_cache:
+            with self._lock:
+                cached = self._cache.get(cache_key)
+            metrics.record_cache("screener", cached is not None)
+            if cached is not None:
+                return cached, missing
+
+        if len(codes) < MIN_PARALLEL_CODES or self._max_workers <= 1:
+            result = _scan_shard(codes, expression, self._base_dir, extra)
+        else:
+            shard_count = self._max_workers * SHARDS_PER_WORKER
+            size = -(-len(codes) // shard_count)
+            shards = [codes[i : i + size] for i in range(0, len(codes), size)]
+            pool = get_process_pool()
+            futures = [
+                pool.submit(_scan_shard, shard, expression, self._base_dir, extra)
+                for shard in shards
+            ]
+            result = [item for future in futures for item in future.result()]
+
+        with self._lock:
+            # 只保留当前数据状态下的缓存
+            self._cache = {
+                key: value for key, value in self._cache.items() if key[-1] == signature
+            }
+            self._cache[cache_key] = result
+        return result, missing
+
+
+screener = Screener()
+
+
+def screen_stocks(params):
+    """
+    选股接口：expr 为选股表达式，可用字段：
+    open/high/low/close/volume/percent/turnoverrate（最新一根日线）、
+    maN、vmaN、retN、hhvN、llvN、vol_ratio；
+    sort 为排序字段（降序，默认按代码），limit 为返回数量，refresh=1 时忽略缓存
+    返回的 coverage 为参与筛选的股票数（有本地日线）和缺少本地日线的代码（最多 MAX_MISSING_CODES 个），
+    全市场日线由后台预取补齐，warming 表示预取仍在进行
+    """
+    import stock_api
+    from prefetch import universe_prefetcher
+
+    expression = params.get("expr", [""])[0].strip()
+    sort_field = params.get("sort", [""])[0].strip()
+    limit = params.get("limit", ["100"])[0].strip()
+    refresh = params.get("refresh", ["0"])[0].strip() == "1"
+    if not expression:
+        return {"success": False, "message": "缺少expr参数"}, 400
+
+    if stock_api.is_loading():
+        return {"success": False, "message": "股票列表加载中，请稍后重试"}, 503
+
+    try:
+        limit = int(limit)
+        # 股票列表中的代码为小写，K线存储中为大写
+        names = {
+            row["代码"].upper(): row["名称"] for row in stock_api.get_stock_index().rows
+        }
+        extra = (sort_field,) if sort_field else ()
+        matches, missing = screener.scan(
+            list(names), expression, extra, use_cache=not refresh
+        )
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+    except Exception as e:
+        return {"success": False, "message": f"选股失败：{str(e)}"}, 500
+
+    if sort_field:
+        # 降序，缺失值排在最后
+        matches = sorted(
+            matches,
+            key=lambda item: (item[1][sort_field] is None, -(item[1][sort_field] or 0)),
+        )
+    data = [
+        {"code": code, "name": names.get(code, ""), **values}
+        for code, values in matches[:limit]
+    ]
+    return {
+        "success": True,
+        "count": len(matches),
+        "data": data,
+        "coverage": {
+            "total": len(names),
+            "covered": len(names) - len(missing),
+            "missing": missing[:MAX_MISSING_CODES],
+            "warming": universe_prefetcher.stats()["running"],
+        },
+    }
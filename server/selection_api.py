@@ -1,5 +1,7 @@
 import csv
 import os
+from typing import Dict, List
+from file_lock import get_file_lock
 
 # 自选
 # CSV文件路径
@@ -16,23 +18,88 @@ def init_csv_file():
             writer.writeheader()
 
 
+class _SelectionStore:
+    """
+    自选列表的内存索引：按代码后6位建立有序字典（顺序即文件中的顺序），
+    查询直接读内存；新增追加写入文件，修改、排序、删除原子替换整个文件
+    文件被外部修改（修改时间或大小变化）时自动重新加载
+    """
+
+    def __init__(self, csv_file: str):
+        self.csv_file = csv_file
+        self.rows: Dict[str, Dict[str, str]] = {}
+        self._signature = None
+
+    @staticmethod
+    def key(code: str) -> str:
+        return code.strip().upper()[-6:]
+
+    def _file_signature(self):
+        stat = os.stat(self.csv_file)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """确保内存数据与文件一致（需在文件锁内调用）"""
+        init_csv_file()
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        rows = {}
+        with open(self.csv_file, mode="r", newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                # 后6位相同的记录保留最后一条（与追加写入的覆盖行为一致），下次整体替换时合并
+                key = self.key(row["code"])
+                if key in rows:
+                    print(f"自选列表中 {key} 重复，保留最后一条: {row}")
+                rows[key] = row
+        self.rows = rows
+        self._signature = signature
+
+    def append(self, row: Dict[str, str]) -> None:
+        """新增一条记录（追加写入文件末尾）"""
+        with open(self.csv_file, mode="a", newline="", encoding="utf-8") as file:
+            csv.DictWriter(file, fieldnames=CSV_HEADERS).writerow(row)
+        self.rows[self.key(row["code"])] = row
+        self._signature = self._file_signature()
+
+    def replace(self, rows: Dict[str, Dict[str, str]]) -> None:
+        """整体替换（写入临时文件后原子替换）"""
+        tmp_file = f"{self.csv_file}.{os.getpid()}.tmp"
+        with open(tmp_file, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
+            writer.writeheader()
+            writer.writerows(rows.values())
+        os.replace(tmp_file, self.csv_file)
+        self.rows = rows
+        self._signature = self._file_signature()
+
+
+_store = _SelectionStore(CSV_FILE)
+
+
+def selection_codes() -> List[str]:
+    """自选列表中的全部代码（按文件中的顺序）"""
+    with get_file_lock(CSV_FILE):
+        _store.load()
+        return [row["code"] for row in _store.rows.values()]
+
+
+def _to_item(row: Dict[str, str]) -> Dict[str, str]:
+    return {
+        "code": row["code"],
+        "name": row["name"],
+        "color": row["color"],
+        "remark": row["remark"],
+        "sort": row["sort"],
+    }
+
+
 def get_selection(params=None):
     """获取自选列表（GET请求）"""
-    init_csv_file()
-    selections = []
     try:
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                selections.append(
-                    {
-                        "code": row["code"],
-                        "name": row["name"],
-                        "color": row["color"],
-                        "remark": row["remark"],
-                        "sort": row["sort"],
-                    }
-                )
+        with get_file_lock(CSV_FILE):
+            _store.load()
+            selections = [_to_item(row) for row in _store.rows.values()]
         return {
             "success": True,
             "data": selections,
@@ -62,22 +129,16 @@ def get_selection_remark(params=None):
         return {"success": False, "message": "code参数不能为空"}, 400
 
     try:
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # 匹配code（不区分大小写）
-                if row["code"].strip().upper() == target_code:
-                    return {
-                        "success": True,
-                        "data": {
-                            "code": row["code"],
-                            "name": row["name"],
-                            "color": row["color"],
-                            "remark": row["remark"],
-                            "sort": row["sort"],
-                        },
-                        "message": f"获取{target_code}备注成功",
-                    }
+        with get_file_lock(CSV_FILE):
+            _store.load()
+            row = _store.rows.get(_store.key(target_code))
+        # 匹配完整code（不区分大小写）
+        if row is not None and row["code"].strip().upper() == target_code:
+            return {
+                "success": True,
+                "data": _to_item(row),
+                "message": f"获取{target_code}备注成功",
+            }
 
         # 未找到对应code的记录
         return {
@@ -92,12 +153,10 @@ def get_selection_remark(params=None):
 
 def is_selection_exists(params):
     code = params.get("code", [""])[0].strip().upper()
-    with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            if row["code"][-6:] == code[-6:]:
-                return {"success": True, "data": True}
-    return {"success": True, "data": False}
+    with get_file_lock(CSV_FILE):
+        _store.load()
+        exists = _store.key(code) in _store.rows
+    return {"success": True, "data": exists}
 
 
 def add_selection(_, request_body):
@@ -116,35 +175,27 @@ def add_selection(_, request_body):
         update_fields["remark"] = request_body["remark"].strip()
 
     try:
-        # 读取所有行并保留原始顺序
-        rows = []
-        item_index = -1  # 记录目标行的位置
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for idx, row in enumerate(reader):
-                # 匹配代码（取后6位）
-                if row["code"][-6:] == code[-6:]:
-                    item_index = idx
-                    # 只更新传入的非空字段，其他字段保持不变
-                    updated_row = {**row, **update_fields}
-                    rows.append(updated_row)
-                else:
-                    rows.append(row)
-
-        # 如果不存在则新增
-        if item_index == -1:
-            # 新行基础数据，缺失字段用空值填充
-            new_row = {"code": code, "name": "", "color": "", "remark": "", "sort": ""}
-            update_fields["sort"] = len(rows) + 1
-            # 应用更新字段
-            new_row.update(update_fields)
-            rows.append(new_row)
-
-        # 写回所有数据
-        with open(CSV_FILE, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(rows)
+        with get_file_lock(CSV_FILE):
+            _store.load()
+            key = _store.key(code)
+            row = _store.rows.get(key)
+            if row is not None:
+                # 已存在：只更新传入的非空字段，其他字段保持不变
+                rows = dict(_store.rows)
+                rows[key] = {**row, **update_fields}
+                _store.replace(rows)
+            else:
+                # 不存在则新增，缺失字段用空值填充
+                new_row = {
+                    "code": code,
+                    "name": "",
+                    "color": "",
+                    "remark": "",
+                    "sort": "",
+                }
+                update_fields["sort"] = str(len(_store.rows) + 1)
+                new_row.update(update_fields)
+                _store.append(new_row)
 
         return {"success": True, "data": True, "message": "自选项目添加/更新成功"}
 
@@ -162,44 +213,28 @@ def update_selection_sort(_, request_body):
         return {"success": False, "message": "请提供有效的新排序代码列表"}, 400
 
     try:
-        # 1. 读取现有所有数据
-        existing_rows = []
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            existing_rows = list(reader)  # 转为列表便于处理
-
-        # 2. 按新顺序重新组织数据
-        # 2.1 先收集所有匹配新顺序的行
-        ordered_rows = []
-        code_set = {code[-6:].upper() for code in new_order_codes}  # 取后6位并去重
-
-        for code in new_order_codes:
-            code_suffix = code[-6:].upper()
-            # 查找匹配的行
-            for row in existing_rows:
-                if row["code"][-6:].upper() == code_suffix:
-                    ordered_rows.append(row)
-                    existing_rows.remove(row)  # 移除已匹配的行，避免重复
-                    break
-
-        # 2.2 剩余未在新顺序中出现的行追加到末尾（可选逻辑）
-        ordered_rows.extend(existing_rows)
-
-        # 3. 重新分配sort值（1,2,3...与行数一致）
-        for idx, row in enumerate(ordered_rows):
-            row["sort"] = str(idx + 1)  # 从1开始编号
-
-        # 4. 写回CSV
-        with open(CSV_FILE, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(ordered_rows)
+        with get_file_lock(CSV_FILE):
+            _store.load()
+            # 按新顺序取出匹配的行，剩余未在新顺序中出现的行追加到末尾
+            remaining = dict(_store.rows)
+            ordered = {}
+            for code in new_order_codes:
+                key = _store.key(str(code))
+                row = remaining.pop(key, None)
+                if row is not None:
+                    ordered[key] = row
+            ordered.update(remaining)
+
+            # 重新分配sort值（1,2,3...与行数一致）
+            for idx, (key, row) in enumerate(ordered.items()):
+                ordered[key] = {**row, "sort": str(idx + 1)}
+            _store.replace(ordered)
 
         return {
             "success": True,
             "data": {
-                "total": len(ordered_rows),
-                "newSort": [row["sort"] for row in ordered_rows],
+                "total": len(ordered),
+                "newSort": [row["sort"] for row in ordered.values()],
             },
             "message": "排序更新成功",
         }
@@ -212,26 +247,18 @@ def delete_selection(_, request_body):
     """删除自选项目（POST请求）"""
     code = request_body.get("code", "").strip().upper()
     try:
-        rows = []
-        found = False
-
-        # 读取所有行并查找要删除的项目
-        with open(CSV_FILE, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row["code"][-6:] != code[-6:]:
-                    rows.append(row)
-                else:
-                    found = True
-
-        if not found:
-            return {"success": False, "message": f"未找到代码为 {code} 的自选项目"}, 404
-
-        # 写回所有保留的行
-        with open(CSV_FILE, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(rows)
+        with get_file_lock(CSV_FILE):
+            _store.load()
+            key = _store.key(code)
+            if key not in _store.rows:
+                return {
+                    "success": False,
+                    "message": f"未找到代码为 {code} 的自选项目",
+                }, 404
+
+            rows = dict(_store.rows)
+            del rows[key]
+            _store.replace(rows)
 
         return {
             "success": True,
@@ -0,0 +1,56 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+from upstream_scheduler import Priority, current_level, use_priority
+
+
+class _Call:
+    """一次进行中的调用：完成后保存结果或异常"""
+
+    def __init__(self, priority: Priority):
+        # 发起调用时的优先级，前台请求加入时提升
+        self.priority = priority
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    请求合并：同一key同一时刻只执行一次调用，
+    并发到达的相同请求等待该调用完成并共享其结果（或异常）
+    优先级更高的请求加入时提升进行中调用的上游排队优先级
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        level = current_level()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(Priority(level))
+                self._calls[key] = call
+
+        if not leader:
+            # 跟随者：等待进行中的调用完成（后台发起的调用被前台请求加入时提升优先级）
+            call.priority.promote(level)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with use_priority(call.priority):
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再唤醒，之后到达的请求会发起新的调用
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -1,6 +1,59 @@
-from get_all_stock import get_and_save_stock_data
-from stock_server import run_server
+import os
+import sys
+import time
+
+# 设置 STOCK_SERVER_PROFILE_IMPORTS=1 时打印各模块的导入耗时
+# （更细的依赖明细可使用 python -X importtime start.py）
+PROFILE_IMPORTS = os.environ.get("STOCK_SERVER_PROFILE_IMPORTS") == "1"
+# 按依赖顺序导入，每一项只统计此前尚未导入的部分
+STARTUP_MODULES = [
+    "requests",
+    "upstream_client",
+    "get_data_from_xueqiu",
+    "quote_stream",
+    "stock_api",
+    "selection_api",
+    "stock_review_api",
+    "stock_line_api",
+    "market_analysis_api",
+    "prefetch",
+    "response_encoding",
+    "stock_server",
+    "get_all_stock",
+]
+
+
+def profile_imports():
+    """逐个导入启动所需模块并打印耗时"""
+    import importlib
+
+    total = 0.0
+    for name in STARTUP_MODULES:
+        if name in sys.modules:
+            continue
+        started = time.perf_counter()
+        importlib.import_module(name)
+        elapsed = time.perf_counter() - started
+        total += elapsed
+        print(f"导入 {name:<22}{elapsed * 1000:8.1f} ms")
+    print(f"导入合计 {total * 1000:.1f} ms")
+
 
 if __name__ == "__main__":
-    get_and_save_stock_data();
-    run_server()
\ No newline at end of file
+    started = time.perf_counter()
+    if PROFILE_IMPORTS:
+        profile_imports()
+
+    import stock_api
+    from get_all_stock import get_and_save_stock_data
+    from prefetch import prefetcher, universe_prefetcher
+    from stock_server import run_server
+
+    # 股票列表在后台获取并建立索引，服务器立即开始监听（加载完成前 /search 返回503）
+    stock_api.load_stock_index_async(get_and_save_stock_data)
+    # 收盘后、开盘前在后台预取自选和最近查看股票的K线
+    prefetcher.start()
+    # 全市场日线在后台补齐并每天收盘后同步（选股和全市场回测读取本地日线）
+    universe_prefetcher.start()
+    print(f"启动准备耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    run_server()
@@ -1,66 +1,208 @@
-import pandas as pd
-def fuzzy_match_stocks(stock_df, keyword, top_n=10):
-    if not keyword or stock_df.empty:
-        return pd.DataFrame()
-    
-    # 确保代码为字符串类型
-    stock_df['代码'] = stock_df['代码'].astype(str)
-    
-    # 1. 计算匹配分数：位置越靠前，分数越高
-    def calculate_score(row):
-        code = row['代码']
-        name = row['名称']
-        score = 0
-        
-        # 代码匹配（权重高于名称）
-        if keyword in code:
-            # 位置越靠前分数越高（例如长度为10的字符串，位置0得10分，位置9得1分）
-            code_pos = code.index(keyword)
-            code_length = len(code)
-            score += (code_length - code_pos) * 2  # 代码匹配权重翻倍
-        
-        # 名称匹配
-        if keyword in name:
-            name_pos = name.index(keyword)
-            name_length = len(name)
-            score += (name_length - name_pos)
-        
-        return score
-    
-    # 2. 计算所有行的分数
-    stock_df['match_score'] = stock_df.apply(calculate_score, axis=1)
-    
-    # 3. 筛选出有匹配的结果，并按分数降序排序
-    matched = stock_df[stock_df['match_score'] > 0]
-    sorted_results = matched.sort_values(by='match_score', ascending=False)
-    
-    # 4. 移除临时列，返回前N项
-    return sorted_results.drop(columns=['match_score']).head(top_n)
+import csv
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# 可选依赖：安装 pypinyin 后拼音首字母更准确（支持多音字词组），否则按GB2312编码区间推算
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+STOCK_CSV_FILE = "stock_codes_names.csv"
+
+# GB2312一级汉字按拼音排序，各声母首字的区位编码（用于推算拼音首字母）
+_GB2312_INITIALS = [
+    (0xB0A1, "a"),
+    (0xB0C5, "b"),
+    (0xB2C1, "c"),
+    (0xB4EE, "d"),
+    (0xB6EA, "e"),
+    (0xB7A2, "f"),
+    (0xB8C1, "g"),
+    (0xB9FE, "h"),
+    (0xBBF7, "j"),
+    (0xBFA6, "k"),
+    (0xC0AC, "l"),
+    (0xC2E8, "m"),
+    (0xC4C3, "n"),
+    (0xC5B6, "o"),
+    (0xC5BE, "p"),
+    (0xC6DA, "q"),
+    (0xC8BB, "r"),
+    (0xC8F6, "s"),
+    (0xCBFA, "t"),
+    (0xCDDA, "w"),
+    (0xCEF4, "x"),
+    (0xD1B9, "y"),
+    (0xD4D1, "z"),
+]
+_GB2312_LEVEL1_END = 0xD7F9
+# 股票名称中常见的多音字（GB2312按其他读音排序）
+_POLYPHONE_INITIALS = {"行": "h", "长": "c", "重": "c", "厦": "x", "藏": "z"}
+
+
+def _char_initial(char: str) -> str:
+    """单个汉字的拼音首字母（非GB2312一级汉字返回空字符串）"""
+    if char in _POLYPHONE_INITIALS:
+        return _POLYPHONE_INITIALS[char]
+    try:
+        encoded = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(encoded) != 2:
+        return ""
+    code = encoded[0] << 8 | encoded[1]
+    if code < _GB2312_INITIALS[0][0] or code > _GB2312_LEVEL1_END:
+        return ""
+    initial = ""
+    for start, letter in _GB2312_INITIALS:
+        if code < start:
+            break
+        initial = letter
+    return initial
+
+
+def pinyin_initials(name: str) -> str:
+    """名称的拼音首字母（小写），如 平安银行 -> payh，字母数字原样保留"""
+    if lazy_pinyin is not None:
+        return "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return "".join(
+        char.lower() if char.isascii() else _char_initial(char) for char in name
+    )
+
+
+def _match_score(text: str, keyword: str) -> int:
+    """位置越靠前分数越高（例如长度为10的字符串，位置0得10分，位置9得1分）"""
+    pos = text.find(keyword)
+    return len(text) - pos if pos >= 0 else 0
+
+
+def _substrings(text: str):
+    """字符串的全部子串（不重复）"""
+    return {
+        text[start:end]
+        for start in range(len(text))
+        for end in range(start + 1, len(text) + 1)
+    }
+
+
+class StockIndex:
+    """
+    股票搜索索引：股票列表只加载一次，为代码、名称和拼音首字母的每个子串
+    预先计算好按匹配分数排序的股票序号，查询只需一次字典查找
+    """
+
+    def __init__(self, rows: List[List[str]]):
+        self.rows = [{"代码": row[0], "名称": row[1]} for row in rows]
+        # 子串 -> [(-分数, 序号)]
+        scored: Dict[str, List[Tuple[int, int]]] = {}
+        for i, (code, name) in enumerate(rows):
+            code, name = code.lower(), name.lower()
+            initials = pinyin_initials(name)
+            for keyword in (
+                _substrings(code) | _substrings(name) | _substrings(initials)
+            ):
+                # 代码匹配（权重高于名称），名称不匹配时使用拼音首字母
+                score = _match_score(code, keyword) * 2
+                score += _match_score(name, keyword) or _match_score(initials, keyword)
+                scored.setdefault(keyword, []).append((-score, i))
+        # 按分数降序排列，分数相同时保持原始顺序
+        self._ranked: Dict[str, List[int]] = {
+            keyword: [i for _, i in sorted(items)] for keyword, items in scored.items()
+        }
+
+    def search(self, keyword: str, top_n: int) -> List[Dict[str, str]]:
+        """按匹配分数降序返回前 top_n 项"""
+        ranked = self._ranked.get(keyword.lower(), [])
+        return [self.rows[i] for i in ranked[:top_n]]
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+# 后台加载进行中时置位，此时搜索接口直接返回503而不是阻塞等待
+_loading = threading.Event()
+
+
+def _load_rows(csv_file: str) -> List[List[str]]:
+    with open(csv_file, mode="r", newline="", encoding="utf-8-sig") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # 跳过表头
+        return [row[:2] for row in reader if len(row) >= 2]
+
+
+def get_stock_index(csv_file: str = STOCK_CSV_FILE) -> StockIndex:
+    """获取搜索索引（股票列表文件更新后自动重建）"""
+    global _index, _index_mtime
+    mtime = os.path.getmtime(csv_file)
+    if _index is not None and mtime == _index_mtime:
+        return _index
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = StockIndex(_load_rows(csv_file))
+            _index_mtime = mtime
+        return _index
+
+
+def is_ready() -> bool:
+    """搜索索引是否已可用"""
+    return _index is not None
+
+
+def is_loading() -> bool:
+    """后台加载进行中且索引尚不可用"""
+    return _index is None and _loading.is_set()
+
+
+def load_stock_index_async(prepare: Callable[[], None] = None) -> threading.Thread:
+    """
+    在后台线程中准备股票列表并建立搜索索引，服务器无需等待即可开始监听
+    prepare：建立索引前执行的准备工作（如股票列表文件不存在时从网络获取）
+    """
+    _loading.set()
+
+    def load():
+        started = time.perf_counter()
+        try:
+            if prepare is not None:
+                prepare()
+            index = get_stock_index()
+            elapsed = time.perf_counter() - started
+            print(f"股票搜索索引已就绪（{len(index.rows)} 只，耗时 {elapsed:.2f}s）")
+        except Exception as e:
+            print(f"股票搜索索引加载失败: {str(e)}")
+        finally:
+            _loading.clear()
+
+    thread = threading.Thread(target=load, name="stock-index-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def fuzzy_match_stocks(keyword, top_n=10):
+    """模糊匹配股票代码、名称和拼音首字母"""
+    if not keyword:
+        return []
+    return get_stock_index().search(keyword, top_n)
+
+
 def query_stock_by_word(params):
     """根据查询参数返回股票代码和名称"""
-    
-    keyword = params.get('w', [''])[0].strip()
-    
+
+    keyword = params.get("w", [""])[0].strip()
+
     if not keyword:
-        return {'success': False, 'message': '缺少查询关键词'}, 400
-    
+        return {"success": False, "message": "缺少查询关键词"}, 400
+
+    if is_loading():
+        return {"success": False, "message": "股票列表加载中，请稍后重试"}, 503
+
     try:
-        # 读取股票数据
-        stock_df = pd.read_csv("stock_codes_names.csv", encoding="utf-8-sig")
-        
         # 进行模糊匹配
-        results = fuzzy_match_stocks(stock_df, keyword, 10)
-        print(results)
-        
-        # 格式化结果
-        result_list = results.to_dict(orient='records')
-        
-        return {
-            'success': True,
-            'data': result_list,
-            'count': len(result_list)
-        }
-    except Exception as e:
-        return {'success': False, 'error': str(e)}, 500
-
+        result_list = fuzzy_match_stocks(keyword, 10)
 
+        return {"success": True, "data": result_list, "count": len(result_list)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}, 500
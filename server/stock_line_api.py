@@ -1,13 +1,19 @@
 import csv
 import os
 import json
+import threading
+import time
 from typing import List, Dict, Optional
-
+from file_lock import get_file_lock
 
 # 画线数据存储目录
 LINES_DIR = "lines"
 # CSV表头（id不再单独列，lines数组内包含id）
 LINE_HEADERS = ["code", "period", "lines", "width", "height"]
+# 增量日志中的操作条数达到该值时立即在后台合并到CSV
+COMPACT_THRESHOLD = 100
+# 最后一次写入后空闲该时间（秒）再合并，拖动画线时的连续修改只合并一次
+COMPACT_DELAY = 30.0
 
 
 def init_line_dir():
@@ -22,25 +28,238 @@ def get_line_file_path(code: str) -> str:
     return os.path.join(LINES_DIR, f"{code.upper()}.csv")
 
 
-def _find_row_by_code_period(
-    file_path: str, code: str, period: str
-) -> tuple[Optional[Dict], List[Dict]]:
+def get_line_log_path(code: str) -> str:
+    """获取指定股票代码的画线增量日志路径（每行一条JSON格式的新增/删除操作）"""
+    init_line_dir()
+    return os.path.join(LINES_DIR, f"{code.upper()}.log")
+
+
+def _stat_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _PeriodLines:
+    """单个周期的画线：lines字段在首次访问时才解析，查询某个周期不会解析其他周期"""
+
+    def __init__(self, raw: str = "", width: str = "0", height: str = "0"):
+        self._raw = raw
+        self._lines: Optional[List[Dict]] = None
+        self.width = width
+        self.height = height
+
+    @property
+    def lines(self) -> List[Dict]:
+        """解析后的线条数组（格式异常时抛出 json.JSONDecodeError）"""
+        if self._lines is None:
+            self._lines = json.loads(self._raw) if self._raw.strip() else []
+        return self._lines
+
+    def set_lines(self, lines: List[Dict]) -> None:
+        self._lines = lines
+
+    def serialize(self) -> str:
+        if self._lines is None:
+            return self._raw
+        return json.dumps(self._lines, ensure_ascii=False)
+
+
+class _SymbolLines:
     """
-    工具函数：从CSV中查找code+period匹配的行
-    返回：(匹配的行, 所有行列表)
+    单只股票的画线数据：CSV为合并后的快照，之后的新增/删除操作追加写入增量日志
+    内存中按周期保存画线，文件被外部修改时（签名变化）重新加载
     """
-    all_rows = []
-    target_row = None
-    if os.path.exists(file_path):
-        with open(file_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            all_rows = list(reader)
-            # 查找code（大写）和period完全匹配的行
-            for row in all_rows:
-                if row["code"].upper() == code.upper() and row["period"] == period:
-                    target_row = row
-                    break
-    return target_row, all_rows
+
+    def __init__(self, code: str):
+        self.code = code
+        self.csv_path = get_line_file_path(code)
+        self.log_path = get_line_log_path(code)
+        self.periods: Dict[str, _PeriodLines] = {}
+        # 增量日志中尚未合并的操作条数
+        self.pending = 0
+        self._signature = None
+
+    def _file_signature(self):
+        return _stat_signature(self.csv_path), _stat_signature(self.log_path)
+
+    def load(self) -> None:
+        """确保内存数据与文件一致（需在文件锁内调用）"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self.periods, self.pending = {}, 0
+        # 单条记录异常时跳过该条并打印日志，不影响同一股票的其他画线
+        if signature[0] is not None:
+            with open(self.csv_path, mode="r", newline="", encoding="utf-8") as file:
+                for row in csv.DictReader(file):
+                    if any(row.get(name) is None for name in LINE_HEADERS):
+                        print(f"画线数据记录不完整，已跳过({self.code}): {row}")
+                        continue
+                    if row["code"].upper() == self.code:
+                        self.periods[row["period"]] = _PeriodLines(
+                            row["lines"], row["width"], row["height"]
+                        )
+        if signature[1] is not None:
+            with open(self.log_path, mode="r", encoding="utf-8") as file:
+                for number, text in enumerate(file, 1):
+                    try:
+                        self._apply(json.loads(text))
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        # 写入中断留下的不完整记录或格式异常的操作
+                        print(
+                            f"画线日志第{number}行异常，已跳过({self.code}): {str(e)}"
+                        )
+                        continue
+                    self.pending += 1
+        self._signature = signature
+
+    def _apply(self, operation: Dict) -> None:
+        """
+        在内存中执行一条操作（重复执行结果不变，合并中断后重放日志也是安全的）
+        操作格式异常时抛出 KeyError/TypeError 等，且不修改内存数据
+        """
+        period = operation["period"]
+        if operation["op"] == "add":
+            new_lines = operation["lines"]
+            # 去重追加（避免重复id）
+            new_line_ids = {line["id"] for line in new_lines}
+            width, height = str(operation["width"]), str(operation["height"])
+            target = self.periods.get(period)
+            if target is None:
+                target = self.periods[period] = _PeriodLines()
+            target.set_lines(
+                [
+                    line
+                    for line in self._current_lines(period, target)
+                    if line.get("id") not in new_line_ids
+                ]
+                + new_lines
+            )
+            target.width = width
+            target.height = height
+        elif period in self.periods:
+            line_id = operation["id"]
+            target = self.periods[period]
+            target.set_lines(
+                [
+                    line
+                    for line in self._current_lines(period, target)
+                    if line.get("id") != line_id
+                ]
+            )
+
+    def _current_lines(self, period: str, target: _PeriodLines) -> List[Dict]:
+        """已有的线条，CSV中该周期的数据无法解析时视为空（打印日志），新操作仍可生效"""
+        try:
+            return target.lines
+        except json.JSONDecodeError:
+            print(f"画线数据格式异常，已忽略原有线条({self.code} {period})")
+            return []
+
+    def record(self, operation: Dict) -> None:
+        """执行一条操作并追加写入增量日志"""
+        self._apply(operation)
+        try:
+            with open(self.log_path, mode="a", encoding="utf-8") as file:
+                file.write(json.dumps(operation, ensure_ascii=False) + "\n")
+        except Exception:
+            # 写入失败时内存数据已变化，下次访问强制重新加载
+            self._signature = None
+            raise
+        self.pending += 1
+        self._signature = self._file_signature()
+
+    def compact(self) -> None:
+        """将内存数据写回CSV（原子替换）并清空增量日志（需在文件锁内调用）"""
+        self.load()
+        if not self.pending:
+            return
+        tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=LINE_HEADERS)
+            writer.writeheader()
+            for period, target in self.periods.items():
+                writer.writerow(
+                    {
+                        "code": self.code,
+                        "period": period,
+                        "lines": target.serialize(),
+                        "width": target.width,
+                        "height": target.height,
+                    }
+                )
+        os.replace(tmp_path, self.csv_path)
+        # 若在此处中断，下次加载时重放日志，结果不变
+        open(self.log_path, mode="w").close()
+        self.pending = 0
+        self._signature = self._file_signature()
+
+
+class _Compactor:
+    """后台合并线程：日志达到阈值时立即合并，否则在最后一次写入空闲一段时间后合并"""
+
+    def __init__(
+        self, threshold: int = COMPACT_THRESHOLD, delay: float = COMPACT_DELAY
+    ):
+        self._threshold = threshold
+        self._delay = delay
+        self._lock = threading.Condition()
+        self._due: Dict[str, float] = {}  # code -> 计划合并的时间
+        self._thread = None
+
+    def schedule(self, symbol: _SymbolLines) -> None:
+        due = time.monotonic()
+        if symbol.pending < self._threshold:
+            due += self._delay
+        with self._lock:
+            self._due[symbol.code] = due
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="line-compactor", daemon=True
+                )
+                self._thread.start()
+            self._lock.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready = [code for code, due in self._due.items() if due <= now]
+                for code in ready:
+                    del self._due[code]
+                if not ready:
+                    timeout = min(self._due.values(), default=now + 60) - now
+                    self._lock.wait(timeout)
+                    continue
+            for code in ready:
+                compact_lines(code)
+
+
+_symbols: Dict[str, _SymbolLines] = {}
+_compactor = _Compactor()
+
+
+def _get_symbol(code: str) -> _SymbolLines:
+    """获取指定股票的画线数据并与文件同步（需在文件锁内调用）"""
+    code = code.upper()
+    symbol = _symbols.get(code)
+    if symbol is None:
+        symbol = _symbols.setdefault(code, _SymbolLines(code))
+    symbol.load()
+    return symbol
+
+
+def compact_lines(code: str) -> None:
+    """将指定股票的增量日志合并到CSV"""
+    file_path = get_line_file_path(code)
+    try:
+        with get_file_lock(file_path):
+            _get_symbol(code).compact()
+    except Exception as e:
+        print(f"画线数据合并失败({code}): {str(e)}")
 
 
 def query_lines(_, request_body: Dict) -> Dict:
@@ -55,47 +274,33 @@ def query_lines(_, request_body: Dict) -> Dict:
     if not code or not period:
         return {"success": False, "message": "code和period为必填参数"}, 400
 
+    empty = {"code": code, "period": period, "lines": [], "width": 0, "height": 0}
     file_path = get_line_file_path(code)
-    target_row, _ = _find_row_by_code_period(file_path, code, period)
-
-    if not target_row:
-        # 无匹配数据时返回空对象（符合前端"无数据"预期）
-        return {
-            "success": True,
-            "data": {
-                "code": code,
-                "period": period,
-                "lines": [],
-                "width": 0,
-                "height": 0,
-            },
-            "message": "未找到匹配的画线数据",
-        }
-
     try:
-        # 解析lines字段（JSON字符串转数组）
-        lines = json.loads(target_row["lines"]) if target_row["lines"].strip() else []
-        # 组装返回数据（确保类型正确）
-        result = {
-            "code": target_row["code"],
-            "period": target_row["period"],
-            "lines": lines,
-            "width": int(target_row["width"]) if target_row["width"].strip() else 0,
-            "height": int(target_row["height"]) if target_row["height"].strip() else 0,
-        }
+        with get_file_lock(file_path):
+            target = _get_symbol(code).periods.get(period)
+            if target is None:
+                # 无匹配数据时返回空对象（符合前端"无数据"预期）
+                return {
+                    "success": True,
+                    "data": empty,
+                    "message": "未找到匹配的画线数据",
+                }
+            # 组装返回数据（确保类型正确）
+            result = {
+                "code": code.upper(),
+                "period": period,
+                "lines": list(target.lines),
+                "width": int(target.width) if target.width.strip() else 0,
+                "height": int(target.height) if target.height.strip() else 0,
+            }
         return {"success": True, "data": result, "message": "画线数据查询成功"}
 
     except json.JSONDecodeError:
         # lines字段解析失败时返回空数组
         return {
             "success": True,
-            "data": {
-                "code": code,
-                "period": period,
-                "lines": [],
-                "width": 0,
-                "height": 0,
-            },
+            "data": empty,
             "message": "画线数据格式异常，已返回空数据",
         }
     except Exception as e:
@@ -104,8 +309,8 @@ def query_lines(_, request_body: Dict) -> Dict:
 
 def add_line(_, request_body: Dict) -> Dict:
     """
-    新增画线数据：按code+period匹配行，在lines数组中追加新线条（含id）
-    若无匹配行则创建新行
+    新增画线数据：按code+period匹配，在lines数组中追加新线条（含id）
+    操作追加写入增量日志，由后台合并到CSV
     """
     # 必传参数校验
     required_fields = ["code", "period", "lines", "width", "height"]
@@ -135,45 +340,19 @@ def add_line(_, request_body: Dict) -> Dict:
         return {"success": False, "message": "width和height必须是有效数字"}, 400
 
     file_path = get_line_file_path(code)
-    target_row, all_rows = _find_row_by_code_period(file_path, code, period)
-
     try:
-        if target_row:
-            # 已有匹配行：读取原有lines并追加新线条
-            existing_lines = (
-                json.loads(target_row["lines"]) if target_row["lines"].strip() else []
+        with get_file_lock(file_path):
+            symbol = _get_symbol(code)
+            symbol.record(
+                {
+                    "op": "add",
+                    "period": period,
+                    "lines": new_lines,
+                    "width": width,
+                    "height": height,
+                }
             )
-            # 去重追加（避免重复id）
-            new_line_ids = {line["id"] for line in new_lines}
-            existing_lines = [
-                line for line in existing_lines if line["id"] not in new_line_ids
-            ]
-            existing_lines.extend(new_lines)
-            # 更新目标行数据
-            target_row["lines"] = json.dumps(existing_lines, ensure_ascii=False)
-            target_row["width"] = str(width)
-            target_row["height"] = str(height)
-            # 替换原数组中的目标行
-            for i, row in enumerate(all_rows):
-                if row["code"].upper() == code and row["period"] == period:
-                    all_rows[i] = target_row
-                    break
-        else:
-            # 无匹配行：创建新行
-            new_row = {
-                "code": code,
-                "period": period,
-                "lines": json.dumps(new_lines, ensure_ascii=False),
-                "width": str(width),
-                "height": str(height),
-            }
-            all_rows.append(new_row)
-
-        # 写回文件
-        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=LINE_HEADERS)
-            writer.writeheader()
-            writer.writerows(all_rows)
+        _compactor.schedule(symbol)
 
         return {
             "success": True,
@@ -187,7 +366,7 @@ def add_line(_, request_body: Dict) -> Dict:
 
 def delete_line(_, request_body: Dict) -> Dict:
     """
-    删除画线数据：按code+period找到行，删除lines数组中id匹配的元素
+    删除画线数据：按code+period找到对应周期，删除lines数组中id匹配的元素
     """
     # 参数校验
     code = request_body.get("code", "").strip()
@@ -197,43 +376,32 @@ def delete_line(_, request_body: Dict) -> Dict:
         return {"success": False, "message": "code、period和id为必填参数"}, 400
 
     file_path = get_line_file_path(code)
-    target_row, all_rows = _find_row_by_code_period(file_path, code, period)
-
-    # 检查行是否存在
-    if not target_row:
-        return {
-            "success": False,
-            "message": f"未找到code={code}且period={period}的画线数据",
-        }, 404
-
     try:
-        # 解析lines数组
-        lines = json.loads(target_row["lines"]) if target_row["lines"].strip() else []
-        # 过滤掉id匹配的元素
-        original_count = len(lines)
-        lines = [line for line in lines if line.get("id") != line_id]
-
-        if len(lines) == original_count:
-            # 未找到对应id的线条
-            return {"success": False, "message": f"未找到id={line_id}的画线数据"}, 404
-
-        # 更新行数据
-        target_row["lines"] = json.dumps(lines, ensure_ascii=False)
-        # 替换原数组中的目标行
-        for i, row in enumerate(all_rows):
-            if row["code"].upper() == code and row["period"] == period:
-                all_rows[i] = target_row
-                break
-
-        # 写回文件
-        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=LINE_HEADERS)
-            writer.writeheader()
-            writer.writerows(all_rows)
+        with get_file_lock(file_path):
+            symbol = _get_symbol(code)
+            target = symbol.periods.get(period)
+
+            # 检查周期是否存在
+            if target is None:
+                return {
+                    "success": False,
+                    "message": f"未找到code={code}且period={period}的画线数据",
+                }, 404
+
+            if not any(line.get("id") == line_id for line in target.lines):
+                # 未找到对应id的线条
+                return {
+                    "success": False,
+                    "message": f"未找到id={line_id}的画线数据",
+                }, 404
+
+            symbol.record({"op": "delete", "period": period, "id": line_id})
+            remaining = len(target.lines)
+        _compactor.schedule(symbol)
 
         return {
             "success": True,
-            "data": {"remainingCount": len(lines)},
+            "data": {"remainingCount": remaining},
             "message": f"成功删除id={line_id}的画线数据",
         }
 
@@ -1,7 +1,9 @@
 import csv
 import uuid
 import os
+from array import array
 from typing import Dict, List, Optional
+from file_lock import get_file_lock
 
 # 基础配置
 BASE_CSV_FILE = "stock_review_{type}.csv"  # 带类型占位符的文件名
@@ -16,78 +18,214 @@ def get_csv_path(type: str) -> str:
 def init_csv_file(type: str) -> None:
     """初始化指定类型的CSV文件（不存在则创建并写入表头）"""
     csv_path = get_csv_path(type)
-    if not os.path.exists(csv_path):
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
+    with get_file_lock(csv_path):
+        if not os.path.exists(csv_path):
+            with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
+                writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
+                writer.writeheader()
+
+
+class _ReviewStore:
+    """
+    单个类型的评论索引：按id建立哈希索引，标题、描述、代码按字符二元组建立倒排索引
+    （中文无需分词，任意子串都能命中），列表按日期倒序排列
+    新增只追加写入文件末尾，删除时原子替换整个文件；文件被外部修改时自动重新加载
+    """
+
+    def __init__(self, csv_path: str):
+        self.csv_path = csv_path
+        # 槽位 -> 记录（删除后置为None）
+        self._rows: List[Optional[Dict[str, str]]] = []
+        self._by_id: Dict[str, int] = {}
+        # 二元组 -> 包含它的槽位（升序追加，4字节整数数组）
+        self._postings: Dict[str, array] = {}
+        # 按日期倒序排列的槽位（新增、删除后重新计算）
+        self._ordered: Optional[List[int]] = None
+        self._signature = None
+
+    def _file_signature(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """确保索引与文件一致（需在文件锁内调用）"""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self._rows, self._by_id, self._postings = [], {}, {}
+        with open(self.csv_path, mode="r", newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                self._index(row)
+        self._ordered = None
+        self._signature = signature
+
+    @staticmethod
+    def _search_text(row: Dict[str, str]) -> str:
+        return "\n".join((row["title"], row["description"], row["code"])).lower()
+
+    def _index(self, row: Dict[str, str]) -> None:
+        slot = len(self._rows)
+        self._rows.append(row)
+        self._by_id[row["id"]] = slot
+        text = self._search_text(row)
+        for gram in {text[i : i + 2] for i in range(len(text) - 1)}:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(slot)
+
+    def get(self, review_id: str) -> Optional[Dict[str, str]]:
+        slot = self._by_id.get(review_id)
+        return self._rows[slot] if slot is not None else None
+
+    def append(self, row: Dict[str, str]) -> None:
+        """新增一条记录（追加写入文件末尾）"""
+        with open(self.csv_path, mode="rb+") as file:
+            # 文件末尾缺少换行时先补上，避免与新行拼接
+            file.seek(0, os.SEEK_END)
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                missing_newline = file.read(1) != b"\n"
+            else:
+                missing_newline = False
+        with open(self.csv_path, mode="a", newline="", encoding="utf-8") as file:
+            if missing_newline:
+                file.write("\r\n")
+            csv.DictWriter(file, fieldnames=CSV_HEADERS).writerow(row)
+        self._index(row)
+        self._ordered = None
+        self._signature = self._file_signature()
+
+    def delete(self, review_id: str) -> bool:
+        """删除一条记录（原子替换文件），不存在时返回False"""
+        slot = self._by_id.get(review_id)
+        if slot is None:
+            return False
+        tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode="w", newline="", encoding="utf-8") as file:
             writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
             writer.writeheader()
+            writer.writerows(
+                row for i, row in enumerate(self._rows) if row is not None and i != slot
+            )
+        os.replace(tmp_path, self.csv_path)
+        # 倒排索引中的槽位在查询时过滤，下次重新加载时清理
+        self._rows[slot] = None
+        del self._by_id[review_id]
+        self._ordered = None
+        self._signature = self._file_signature()
+        return True
+
+    def _sorted_slots(self) -> List[int]:
+        if self._ordered is None:
+            slots = [i for i, row in enumerate(self._rows) if row is not None]
+            # 日期为毫秒时间戳字符串，空日期排在最后；同一日期后添加的在前
+            slots.sort(
+                key=lambda i: (_date_key(self._rows[i]["date"]), i), reverse=True
+            )
+            self._ordered = slots
+        return self._ordered
+
+    def search(self, keyword: str) -> List[int]:
+        """按日期倒序返回匹配关键字的槽位（不区分大小写，匹配标题、描述和代码）"""
+        ordered = self._sorted_slots()
+        if not keyword:
+            return ordered
+        if len(keyword) == 1:
+            candidates = set(ordered)
+        else:
+            # 取最稀有的二元组缩小候选范围，再校验完整子串
+            grams = {keyword[i : i + 2] for i in range(len(keyword) - 1)}
+            postings = [self._postings.get(gram) for gram in grams]
+            if not all(postings):
+                return []
+            candidates = set(min(postings, key=len))
+        matched = {
+            slot
+            for slot in candidates
+            if self._rows[slot] is not None
+            and keyword in self._search_text(self._rows[slot])
+        }
+        return [slot for slot in ordered if slot in matched]
+
+    def rows(self, slots: List[int]) -> List[Dict[str, str]]:
+        return [self._rows[slot] for slot in slots]
+
+
+def _date_key(date: str) -> int:
+    try:
+        return int(date)
+    except ValueError:
+        return -1
+
+
+_stores: Dict[str, _ReviewStore] = {}
+
+
+def _get_store(type: str) -> _ReviewStore:
+    """获取指定类型的评论索引并与文件同步（需在文件锁内调用）"""
+    csv_path = get_csv_path(type)
+    store = _stores.get(csv_path)
+    if store is None:
+        store = _stores.setdefault(csv_path, _ReviewStore(csv_path))
+    store.load()
+    return store
+
+
+def _get_param(params: Dict, name: str, default: str = "") -> str:
+    """读取查询参数（兼容列表/字符串类型）"""
+    value = params.get(name, default)
+    return (value[0] if isinstance(value, list) else str(value)).strip()
 
 
 def get_stock_review(params: Optional[Dict] = None) -> Dict:
-    """获取指定类型的股票评论列表（支持title模糊搜索）"""
+    """
+    获取指定类型的股票评论列表：按日期倒序，支持关键字搜索（标题、描述、代码）和分页
+    列表不返回描述，详情通过 get_single_stock_review 获取
+    参数 page 从1开始，page_size 为空时返回全部
+    """
     # 1. 基础参数校验（type参数必传）
     if not params or "type" not in params:
         return {"success": False, "message": "缺少type参数"}, 400
 
-    # 2. 处理type参数（兼容列表/字符串类型）
-    type_param = params["type"]
-    type = (
-        type_param[0].strip()
-        if isinstance(type_param, list)
-        else str(type_param).strip()
-    )
+    type = _get_param(params, "type")
     if not type:
         return {"success": False, "message": "type参数不能为空"}, 400
 
-    # 3. 处理搜索关键字（可选参数，默认空字符串）
-    keyword = ""
-    if "keyword" in params:
-        keyword_param = params["keyword"]
-        # 同样兼容列表/字符串类型的参数
-        keyword = (
-            keyword_param[0].strip().lower()  # 转小写，支持不区分大小写搜索
-            if isinstance(keyword_param, list)
-            else str(keyword_param).strip().lower()
-        )
-
-    # 4. 初始化文件并获取路径
+    # 2. 搜索关键字（可选参数，不区分大小写）与分页参数
+    keyword = _get_param(params, "keyword").lower()
+    try:
+        page = max(int(_get_param(params, "page") or 1), 1)
+        page_size = int(_get_param(params, "page_size") or 0)
+    except ValueError:
+        return {"success": False, "message": "分页参数格式错误"}, 400
+
+    # 3. 初始化文件并获取路径
     init_csv_file(type)
     csv_path = get_csv_path(type)
-    reviews: List[Dict] = []
 
     try:
-        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # 5. 模糊匹配逻辑：如果有keyword，则筛选title包含关键字的项
-                if keyword:
-                    # 将title转小写后判断是否包含关键字（不区分大小写）
-                    if keyword in row["title"].strip().lower():
-                        reviews.append(
-                            {
-                                "id": row["id"],
-                                "title": row["title"],
-                                "code": row["code"],
-                                "date": row["date"],
-                                "description": row["description"],
-                            }
-                        )
-                else:
-                    # 无keyword时，返回所有项
-                    reviews.append(
-                        {
-                            "id": row["id"],
-                            "title": row["title"],
-                            "code": row["code"],
-                            "date": row["date"],
-                            "description": row["description"],
-                        }
-                    )
-
-        # 6. 构建返回结果
+        with get_file_lock(csv_path):
+            store = _get_store(type)
+            slots = store.search(keyword)
+            total = len(slots)
+            if page_size > 0:
+                slots = slots[(page - 1) * page_size : page * page_size]
+            reviews = [
+                {
+                    "id": row["id"],
+                    "title": row["title"],
+                    "code": row["code"],
+                    "date": row["date"],
+                }
+                for row in store.rows(slots)
+            ]
+
+        # 4. 构建返回结果
         return {
             "success": True,
             "data": reviews,
-            "count": len(reviews),
+            "count": total,
             "message": f"获取{type}类型评论成功（搜索关键字：{keyword or '无'}）",
         }
     except Exception as e:
@@ -108,28 +246,16 @@ def add_stock_review(_, request_body: Dict) -> Dict:
     try:
         csv_path = get_csv_path(type)
         init_csv_file(type)  # 确保文件存在
-        rows: List[Dict] = []
-
-        # 读取现有数据
-        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            rows = list(reader)
-
-        # 添加新数据
-        new_item = {
-            "id": str(uuid.uuid4()),  # 确保UUID是字符串类型
-            "code": code,
-            "title": title,
-            "date": date,
-            "description": description,
-        }
-        rows.append(new_item)
-
-        # 写回所有数据
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(rows)
+        with get_file_lock(csv_path):
+            new_item = {
+                "id": str(uuid.uuid4()),  # 确保UUID是字符串类型
+                "code": code,
+                "title": title,
+                "date": date,
+                "description": description,
+            }
+            # 只追加新行，不重写整个文件
+            _get_store(type).append(new_item)
 
         return {"success": True, "data": new_item, "message": f"添加{type}类型评论成功"}
     except Exception as e:
@@ -141,30 +267,19 @@ def get_single_stock_review(params: Dict) -> Dict:
     if "type" not in params or "id" not in params:
         return {"success": False, "message": "缺少type或id参数"}, 400
 
-    # 2. 处理type参数（兼容列表/字符串类型）
-    type_param = params["type"]
-    type = (
-        type_param[0].strip()
-        if isinstance(type_param, list)
-        else str(type_param).strip()
-    )
-    target_id = (
-        params["id"][0].strip()
-        if isinstance(params["id"], list)
-        else params["id"].strip()
-    )
+    type = _get_param(params, "type")
+    target_id = _get_param(params, "id")
 
     try:
         csv_path = get_csv_path(type)
-        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row["id"] == target_id:
-                    return {
-                        "success": True,
-                        "data": row,
-                        "message": f"获取{type}类型评论成功",
-                    }
+        with get_file_lock(csv_path):
+            row = _get_store(type).get(target_id)
+        if row is not None:
+            return {
+                "success": True,
+                "data": row,
+                "message": f"获取{type}类型评论成功",
+            }
 
         return {
             "success": False,
@@ -184,29 +299,12 @@ def delete_stock_review(_, request_body: Dict) -> Dict:
     csv_path = get_csv_path(type)
 
     try:
-        rows: List[Dict] = []
-        found = False
-
-        # 读取并过滤数据
-        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row["id"] != target_id:
-                    rows.append(row)
-                else:
-                    found = True
-
-        if not found:
-            return {
-                "success": False,
-                "message": f"未找到ID为{target_id}的{type}类型评论",
-            }, 404
-
-        # 写回过滤后的数据
-        with open(csv_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=CSV_HEADERS)
-            writer.writeheader()
-            writer.writerows(rows)
+        with get_file_lock(csv_path):
+            if not _get_store(type).delete(target_id):
+                return {
+                    "success": False,
+                    "message": f"未找到ID为{target_id}的{type}类型评论",
+                }, 404
 
         return {"success": True, "data": True, "message": f"删除{type}类型评论成功"}
     except Exception as e:
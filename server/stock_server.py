@@ -1,13 +1,112 @@
 import http.server
 import socketserver
 import json
+import os
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 import stock_api as sa
 import get_data_from_xueqiu as xq
 import selection_api as sla
 import stock_review_api as sra
 import stock_line_api as slia
 import market_analysis_api as maa
+import market_snapshot as ms
+import quote_stream as qs
+import indicators as ind
+import screener as scr
+import backtest as bt
+import process_pool
+import response_encoding as renc
+import upstream_client as uc
+import trading_calendar as tcal
+import prefetch as pf
+import metrics
+
+
+def handle_not_found(query_params, request_body=None):
+    """处理未匹配的路径"""
+    return {"success": False, "message": "接口不存在"}, 404
+
+
+def dispatch(path, query_params, request_body=None):
+    """
+    调用路由对应的处理函数，返回 (响应数据, 状态码)
+    request_body 为 None 时按GET接口调用，否则按POST接口调用
+    """
+    if request_body is None and path in POST_ONLY_ROUTES:
+        return {"success": False, "message": "该接口只支持POST请求"}, 405
+    handler = ROUTES.get(path, handle_not_found)
+    try:
+        if request_body is None:
+            response_data, status_code = handler(query_params), 200
+        else:
+            # 同时传递查询参数和请求体给处理器
+            response_data, status_code = handler(query_params, request_body), 200
+    except Exception as e:
+        response_data = {"success": False, "error": str(e)}
+        status_code = 500
+    # 处理可能没有状态码的情况
+    if isinstance(response_data, tuple):
+        response_data, status_code = response_data
+    return response_data, status_code
+
+
+def observe_request(path, method, started, status_code, size=None):
+    """
+    记录请求数、耗时和响应体大小（未注册的路径合并统计，避免标签无限增长）
+    批量接口的子请求没有单独的响应体，size 为 None 时不记录大小
+    """
+    route = path if path in ROUTES or path in TEXT_ROUTES else "not_found"
+    metrics.http_requests.inc(route, method, str(status_code))
+    metrics.http_request_seconds.observe(time.perf_counter() - started, route, method)
+    if size is not None:
+        metrics.http_response_bytes.observe(size, route)
+
+
+def _batch_item(item):
+    """执行批量请求中的一项，返回 {status, body}"""
+    if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+        return {"status": 400, "body": {"success": False, "message": "缺少path"}}
+    path = item["path"]
+    if path == "/batch" or path in STREAM_ROUTES:
+        return {"status": 400, "body": {"success": False, "message": "不支持的接口"}}
+    params = item.get("params") or {}
+    if not isinstance(params, dict):
+        return {
+            "status": 400,
+            "body": {"success": False, "message": "params必须是对象"},
+        }
+    # GET参数与 parse_qs 的结果保持一致：参数名 -> 字符串列表
+    query_params = {
+        key: [str(v) for v in value] if isinstance(value, list) else [str(value)]
+        for key, value in params.items()
+    }
+    # 子请求按各自的接口统计（与单独请求时一致）
+    started = time.perf_counter()
+    if item.get("method", "GET").upper() == "POST":
+        body, status = dispatch(path, query_params, item.get("body") or {})
+        observe_request(path, "POST", started, status)
+    else:
+        body, status = dispatch(path, query_params)
+        observe_request(path, "GET", started, status)
+    return {"status": status, "body": body}
+
+
+def handle_batch(_, request_body):
+    """
+    批量接口：请求体 {"requests": [{"path", "method", "params", "body"}, ...]}
+    各子请求并发执行，按顺序返回 [{"status", "body"}]，单项失败不影响其他项
+    """
+    if not isinstance(request_body, dict):
+        return {"success": False, "message": "请求体必须是JSON对象"}, 400
+    items = request_body.get("requests")
+    if not isinstance(items, list) or not items:
+        return {"success": False, "message": "requests必须是非空数组"}, 400
+    if len(items) > MAX_BATCH_SIZE:
+        return {"success": False, "message": f"单次最多{MAX_BATCH_SIZE}个请求"}, 400
+    return {"success": True, "data": list(_batch_executor.map(_batch_item, items))}
+
 
 ROUTES = {
     "/search": sa.query_stock_by_word,
@@ -32,16 +131,57 @@ ROUTES = {
     # 大盘分析
     "/get_analysis_info": maa.get_analysis_info,
     "/add_analysis_info": maa.add_analysis_info,
+    "/get_analysis_history": maa.get_analysis_history,  # 按日期范围查询历史分析
+    "/indicators": ind.get_indicators,
+    "/screen": scr.screen_stocks,  # 全市场选股
+    "/backtest": bt.backtest,  # 策略回测（本地K线）
+    # 全市场行情快照
+    "/market_quote": ms.get_market_quotes,
+    "/market_rank": ms.get_market_rank,  # 涨幅、成交量等排行
+    "/market_breadth": ms.get_market_breadth,  # 涨跌家数
+    "/batch": handle_batch,  # 一次请求执行多个接口
+    "/market_session": tcal.get_market_session,  # 当前交易时段
+    "/upstream_stats": uc.get_upstream_stats,  # 上游连接复用与耗时统计
+    "/prefetch_status": pf.get_prefetch_status,  # K线预取状态
+}
+
+# 只能通过POST调用的接口（GET请求返回405）
+POST_ONLY_ROUTES = {"/batch"}
+
+# 各接口的缓存策略（未配置的GET接口默认每次协商，POST接口不缓存）
+CACHE_CONTROL = {
+    "/search": "public, max-age=300",  # 股票列表变化很少
+    "/kline": "no-cache",  # 可缓存，但每次用ETag校验
+    "/indicators": "no-cache",
+    "/stock_details": "no-cache",
+    "/get_selection_detail": "no-cache",
+    "/get_single_stock_review": "no-cache",
+}
+DEFAULT_GET_CACHE_CONTROL = "no-cache"
+POST_CACHE_CONTROL = "no-store"
+
+# 长连接推送接口：处理函数直接写入响应流
+STREAM_ROUTES = {
+    "/stream": qs.stream_quotes,  # 行情与最新K线推送（SSE）
+}
+
+# 文本接口：处理函数返回字符串，原样作为响应体（不缓存）
+TEXT_ROUTES = {
+    "/metrics": metrics.get_metrics,  # 运行指标（Prometheus文本格式）
 }
 
 # 配置
 PORT = 8000  # 服务端口
 HOST = "0.0.0.0"  # 允许所有网络接口访问，便于局域网测试
-
-
-def handle_not_found(query_params):
-    """处理未匹配的路径"""
-    return {"success": False, "message": "接口不存在"}, 404
+# 工作线程数（可通过环境变量 STOCK_SERVER_WORKERS 配置）
+MAX_WORKERS = int(os.environ.get("STOCK_SERVER_WORKERS", "32"))
+# 批量接口单次最多包含的子请求数量
+MAX_BATCH_SIZE = 20
+# 执行批量子请求的线程数（独立于连接线程池，避免批量请求占满工作线程后互相等待）
+BATCH_WORKERS = 16
+_batch_executor = ThreadPoolExecutor(
+    max_workers=BATCH_WORKERS, thread_name_prefix="stock-batch"
+)
 
 
 class StockHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
@@ -62,30 +202,94 @@ class StockHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         """处理跨域预检请求"""
         self._set_headers()
 
+    def _send_text(self, text, content_type):
+        """发送文本响应，返回 (状态码, 响应体字节数)"""
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+        return 200, len(body)
+
+    def _send_json(self, response_data, status_code, cache_control):
+        """
+        发送JSON响应：按 Accept-Encoding 压缩，附带强ETag，
+        If-None-Match 命中时返回304且不发送响应体
+        返回实际发送的 (状态码, 响应体字节数)
+        """
+        if status_code != 200:
+            # 错误响应（如加载中的503）不允许缓存
+            cache_control = "no-store"
+        body = renc.encode_json(response_data)
+        encoding = renc.negotiate_encoding(
+            self.headers.get("Accept-Encoding", ""), len(body)
+        )
+        etag = renc.make_etag(body, encoding)
+
+        not_modified = status_code == 200 and renc.etag_matches(
+            self.headers.get("If-None-Match", ""), etag
+        )
+        if status_code == 200 and self.command == "GET":
+            metrics.record_cache("http_etag", not_modified)
+        if not_modified:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return 304, 0
+
+        body = renc.compress(body, encoding)
+        self.send_response(status_code)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Access-Control-Allow-Origin", "*")  # 允许所有域名访问
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+        self.end_headers()
+        self.wfile.write(body)
+        return status_code, len(body)
+
+    def _observe(self, path, started, status_code, size):
+        observe_request(path, self.command, started, status_code, size)
+
     def do_GET(self):
+        started = time.perf_counter()
         # 解析URL和查询参数
         parsed_url = urllib.parse.urlparse(self.path)
         query_params = urllib.parse.parse_qs(parsed_url.query)
 
-        # 查找路由对应的处理函数
-        handler = ROUTES.get(parsed_url.path, handle_not_found)
+        # 推送接口自行管理响应流
+        stream_handler = STREAM_ROUTES.get(parsed_url.path)
+        if stream_handler:
+            stream_handler(self, query_params)
+            return
 
-        # 执行处理函数并获取响应
-        try:
-            response_data, status_code = handler(query_params), 200
-        except Exception as e:
-            response_data = {"success": False, "error": str(e)}
-            status_code = 500
-        # 处理可能没有状态码的情况
-        if isinstance(response_data, tuple):
-            response_data, status_code = response_data
+        text_handler = TEXT_ROUTES.get(parsed_url.path)
+        if text_handler:
+            sent = self._send_text(text_handler(query_params), metrics.CONTENT_TYPE)
+            self._observe(parsed_url.path, started, *sent)
+            return
+
+        # 执行路由对应的处理函数并获取响应
+        response_data, status_code = dispatch(parsed_url.path, query_params)
 
         # 返回响应
-        self._set_headers(status_code)
-        self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode("utf-8"))
+        cache_control = CACHE_CONTROL.get(parsed_url.path, DEFAULT_GET_CACHE_CONTROL)
+        sent = self._send_json(response_data, status_code, cache_control)
+        self._observe(parsed_url.path, started, *sent)
 
     def do_POST(self):
         """处理POST请求"""
+        started = time.perf_counter()
         # 解析URL
         parsed_url = urllib.parse.urlparse(self.path)
 
@@ -106,30 +310,55 @@ class StockHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         # 解析查询参数
         query_params = urllib.parse.parse_qs(parsed_url.query)
 
-        # 查找路由对应的处理函数
-        handler = ROUTES.get(parsed_url.path, handle_not_found)
+        # 执行路由对应的处理函数并获取响应
+        response_data, status_code = dispatch(
+            parsed_url.path, query_params, request_body
+        )
+
+        # 返回响应
+        sent = self._send_json(response_data, status_code, POST_CACHE_CONTROL)
+        self._observe(parsed_url.path, started, *sent)
+
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """基于线程池的HTTP服务器：每个连接交给工作线程处理，慢请求不再阻塞其他接口"""
+
+    allow_reuse_address = True
+    request_queue_size = 128
 
-        # 执行处理函数并获取响应
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="stock-http"
+        )
+
+    def process_request(self, request, client_address):
+        """将连接提交到线程池，主线程立即返回继续accept"""
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
         try:
-            # 同时传递查询参数和请求体给处理器
-            response_data, status_code = handler(query_params, request_body), 200
-        except Exception as e:
-            response_data = {"success": False, "error": str(e)}
-            status_code = 500
-        # 处理可能没有状态码的情况
-        if isinstance(response_data, tuple):
-            response_data, status_code = response_data
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
 
-        # 返回响应
-        self._set_headers(status_code)
-        self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode("utf-8"))
+    def server_close(self):
+        qs.close_streams()
+        process_pool.shutdown_process_pool()
+        _batch_executor.shutdown(wait=False, cancel_futures=True)
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 
-def run_server():
-    """启动HTTP服务器"""
+def run_server(max_workers=MAX_WORKERS):
+    """启动HTTP服务器（线程池并发处理请求）"""
     # 配置服务器
-    with socketserver.TCPServer((HOST, PORT), StockHTTPRequestHandler) as httpd:
-        print(f"服务器已启动，地址: http://{HOST}:{PORT}")
+    with ThreadPoolHTTPServer(
+        (HOST, PORT), StockHTTPRequestHandler, max_workers
+    ) as httpd:
+        print(f"服务器已启动，地址: http://{HOST}:{PORT}（工作线程数: {max_workers}）")
         print(f"可用接口:")
         print("按 Ctrl+C 停止服务器")
 
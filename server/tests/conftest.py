@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 服务端模块均为扁平结构（在 server 目录下运行），测试时将其加入导入路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pytest
+
+from backtest import COMMISSION, STAMP_DUTY, Backtester, backtest, run_backtest
+from bar_file import write_bar_file
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def make_bars(prices):
+    """prices: [(开盘, 收盘)]，最高、最低取开收盘的极值"""
+    return {
+        "timestamp": np.arange(len(prices), dtype=float) * DAY_MS,
+        "open": np.array([p[0] for p in prices], dtype=float),
+        "high": np.array([max(p) for p in prices], dtype=float),
+        "low": np.array([min(p) for p in prices], dtype=float),
+        "close": np.array([p[1] for p in prices], dtype=float),
+        "volume": np.full(len(prices), 100.0),
+    }
+
+
+# 第1根收盘产生买入信号，第2根开盘买入；第3根收盘产生卖出信号，第4根开盘卖出
+ROUND_TRIP = [(10, 10), (10, 11), (12, 13), (13, 10), (9, 9), (9, 9)]
+
+
+def test_round_trip_pnl_and_trades():
+    stats, equity, trades = run_backtest(
+        np, make_bars(ROUND_TRIP), "close > 10.5", "close < 10.5", 244
+    )
+    bought = 13 / 12 - 1 - COMMISSION  # 买入当根：开盘到收盘
+    held = 10 / 13 - 1  # 持有：收盘到收盘
+    sold = 9 / 10 - 1 - COMMISSION - STAMP_DUTY  # 卖出当根：前收盘到开盘
+    expected = [1, 1, 1 + bought]
+    expected.append(expected[-1] * (1 + held))
+    expected.append(expected[-1] * (1 + sold))
+    expected.append(expected[-1])
+    assert equity.tolist() == pytest.approx(expected)
+
+    total = (1 + bought) * (1 + held) * (1 + sold) - 1
+    assert trades == [
+        {"buy": 2 * DAY_MS, "sell": 4 * DAY_MS, "return": round(total * 100, 2)}
+    ]
+    assert stats["bars"] == 6
+    assert stats["trades"] == 1
+    assert stats["total_return"] == round(total * 100, 2)
+    assert stats["win_rate"] == 0.0
+    # 持仓K线为第2、3根（卖出当根开盘即空仓）
+    assert stats["exposure"] == round(2 / 6 * 100, 2)
+    peak = expected[2]
+    assert stats["max_drawdown"] == round((expected[4] / peak - 1) * 100, 2)
+
+
+def test_open_trade_at_end_has_no_sell():
+    prices = [(10, 10), (10, 11), (11, 12), (12, 13)]
+    stats, equity, trades = run_backtest(
+        np, make_bars(prices), "close > 10.5", "close < 0", 244
+    )
+    total = (12 / 11 - COMMISSION) * (13 / 12) - 1
+    assert trades == [
+        {"buy": 2 * DAY_MS, "sell": None, "return": round(total * 100, 2)}
+    ]
+    assert equity[-1] == pytest.approx(1 + total)
+    assert stats["win_rate"] == 100.0
+
+
+def test_exit_wins_over_entry_on_same_bar():
+    stats, equity, trades = run_backtest(
+        np, make_bars(ROUND_TRIP), "close > 10.5", "close > 10.5", 244
+    )
+    assert trades == []
+    assert equity.tolist() == [1.0] * len(ROUND_TRIP)
+    assert stats["total_return"] == 0.0
+
+
+def test_two_trades_are_accounted_separately():
+    prices = [(10, 10), (10, 11), (11, 10), (10, 10), (10, 11), (11, 12), (12, 10)]
+    stats, _, trades = run_backtest(
+        np, make_bars(prices), "close > 10.5", "close < 10.5", 244
+    )
+    first = (10 / 11 - COMMISSION) * (10 / 10 - COMMISSION - STAMP_DUTY) - 1
+    second = (12 / 11 - COMMISSION) * (10 / 12) - 1
+    assert [trade["buy"] for trade in trades] == [2 * DAY_MS, 5 * DAY_MS]
+    assert [trade["sell"] for trade in trades] == [3 * DAY_MS, None]
+    assert [trade["return"] for trade in trades] == [
+        round(first * 100, 2),
+        round(second * 100, 2),
+    ]
+    assert stats["total_return"] == round(((1 + first) * (1 + second) - 1) * 100, 2)
+
+
+def write_days(base_dir, code, prices):
+    path = os.path.join(base_dir, code, "day.bars")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bars = [
+        (i * DAY_MS, o, max(o, c), min(o, c), c, 100, 0.0, 0.1)
+        for i, (o, c) in enumerate(prices)
+    ]
+    write_bar_file(path, bars)
+
+
+def test_universe_reports_missing_codes(tmp_path):
+    write_days(str(tmp_path), "SH600000", ROUND_TRIP)
+    backtester = Backtester(str(tmp_path), max_workers=1)
+    results, missing = backtester.universe(
+        ["SH600000", "SZ000001"], "day", "close > 10.5", "close < 10.5"
+    )
+    assert [item["code"] for item in results] == ["SH600000"]
+    assert results[0]["trades"] == 1
+    assert missing == ["SZ000001"]
+
+
+def test_universe_rejects_minute_periods():
+    params = {
+        "code": ["ALL"],
+        "period": ["5m"],
+        "entry": ["close > ma5"],
+        "exit": ["close < ma5"],
+    }
+    _, status = backtest(params)
+    assert status == 400
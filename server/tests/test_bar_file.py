@@ -0,0 +1,88 @@
+from bar_file import HEADER, BarFile, write_bar_file
+
+BARS = [
+    (1700000000000, 10.0, 10.5, 9.8, 10.2, 12345, 1.5, 0.25),
+    (1700086400000, 10.2, 10.9, 10.1, 10.8, 23456, 5.88, 0.5),
+    (1700172800000, 10.8, 11.0, 10.3, 10.4, 34567, -3.7, 0.75),
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "SH600000" / "day.bars")
+    write_bar_file(path, BARS)
+    bar_file = BarFile(path)
+    try:
+        assert len(bar_file) == 3
+        assert bar_file.slice() == BARS
+        assert bar_file.slice(1, 2) == BARS[1:2]
+        assert list(bar_file.timestamps) == [bar[0] for bar in BARS]
+        assert bar_file.column("close") == [10.2, 10.8, 10.4]
+        assert bar_file.column("volume", 1) == [23456, 34567]
+    finally:
+        bar_file.close()
+
+
+def test_integer_columns_are_rounded(tmp_path):
+    path = str(tmp_path / "day.bars")
+    write_bar_file(path, [(1700000000000.0, 1.0, 1.0, 1.0, 1.0, 99.6, 0.0, 0.0)])
+    bar_file = BarFile(path)
+    try:
+        bar = bar_file.slice()[0]
+        assert bar[0] == 1700000000000 and isinstance(bar[0], int)
+        assert bar[5] == 100 and isinstance(bar[5], int)
+    finally:
+        bar_file.close()
+
+
+def test_bisect(tmp_path):
+    path = str(tmp_path / "day.bars")
+    write_bar_file(path, BARS)
+    bar_file = BarFile(path)
+    try:
+        assert bar_file.bisect_left(BARS[1][0]) == 1
+        assert bar_file.bisect_right(BARS[1][0]) == 2
+        assert bar_file.bisect_right(0) == 0
+        assert bar_file.bisect_left(BARS[-1][0] + 1) == 3
+    finally:
+        bar_file.close()
+
+
+def test_missing_and_empty_files(tmp_path):
+    missing = BarFile(str(tmp_path / "missing.bars"))
+    assert len(missing) == 0
+    assert missing.slice() == []
+    assert missing.column("close") == []
+
+    path = str(tmp_path / "empty.bars")
+    write_bar_file(path, [])
+    empty = BarFile(path)
+    assert len(empty) == 0
+    assert list(empty.timestamps) == []
+
+
+def test_corrupted_file_is_treated_as_empty(tmp_path):
+    path = str(tmp_path / "day.bars")
+    write_bar_file(path, BARS)
+    with open(path, "r+b") as file:
+        file.write(b"XXXX")
+    assert len(BarFile(path)) == 0
+
+    # 行数与文件大小不符（写入被截断）
+    write_bar_file(path, BARS)
+    with open(path, "r+b") as file:
+        file.truncate(HEADER.size + 8)
+    assert len(BarFile(path)) == 0
+
+
+def test_rewrite_does_not_affect_open_mapping(tmp_path):
+    path = str(tmp_path / "day.bars")
+    write_bar_file(path, BARS)
+    old = BarFile(path)
+    try:
+        write_bar_file(path, BARS[:1])
+        assert old.slice() == BARS
+        new = BarFile(path)
+        assert new.slice() == BARS[:1]
+        new.close()
+    finally:
+        old.close()
@@ -0,0 +1,127 @@
+import random
+
+import pytest
+
+from indicators import MAX_LIMIT, WARMUP, IndicatorEngine, get_indicators
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def make_bars(count, seed=7):
+    rng = random.Random(seed)
+    bars, close = [], 10.0
+    for i in range(count):
+        open_ = close
+        close = max(1.0, close * (1 + rng.uniform(-0.05, 0.05)))
+        high = max(open_, close) * (1 + rng.uniform(0, 0.02))
+        low = min(open_, close) * (1 - rng.uniform(0, 0.02))
+        bars.append((i * DAY_MS, open_, high, low, close, 1000 + i, 0.0, 0.1))
+    return bars
+
+
+class GrowingSource:
+    """模拟K线存储：只返回最新的 limit 根，可追加新K线或修改最后一根"""
+
+    def __init__(self, bars):
+        self.bars = list(bars)
+
+    def __call__(self, code, period, timestamp, limit):
+        return self.bars[-limit:]
+
+
+def assert_matches(actual, expected):
+    assert actual.keys() == expected.keys()
+    for name, values in actual.items():
+        assert len(values) == len(expected[name]), name
+        for got, want in zip(values, expected[name]):
+            if want is None:
+                assert got is None, name
+            else:
+                assert got == pytest.approx(want, abs=2e-3), name
+
+
+def full_tail(engine, bars, start, limit):
+    """从首个窗口的起点全量计算，取最后 limit 根"""
+    results = engine.compute(bars[start:])
+    return {name: values[-limit:] for name, values in results.items()}
+
+
+def test_incremental_matches_full_recompute():
+    limit = 50
+    all_bars = make_bars(400)
+    first = limit + WARMUP
+    source = GrowingSource(all_bars[:first])
+    engine = IndicatorEngine(source)
+
+    timestamps, results = engine.latest("SH600000", "day", limit)
+    assert timestamps == [bar[0] for bar in all_bars[first - limit : first]]
+    assert_matches(results, full_tail(engine, source.bars, 0, limit))
+
+    rng = random.Random(1)
+    for end in range(first + 1, len(all_bars) + 1):
+        # 盘中最后一根多次变化，随后收盘并出现新K线
+        last = list(all_bars[end - 1])
+        last[4] *= 1 + rng.uniform(-0.01, 0.01)
+        source.bars = all_bars[: end - 1] + [tuple(last)]
+        _, results = engine.latest("SH600000", "day", limit)
+        assert_matches(results, full_tail(engine, source.bars, 0, limit))
+
+        source.bars = all_bars[:end]
+        timestamps, results = engine.latest("SH600000", "day", limit)
+        assert timestamps == [bar[0] for bar in all_bars[end - limit : end]]
+        assert_matches(results, full_tail(engine, source.bars, 0, limit))
+
+
+def test_settled_bar_change_triggers_rebuild():
+    limit = 30
+    all_bars = make_bars(300)
+    source = GrowingSource(all_bars[:200])
+    engine = IndicatorEngine(source)
+    engine.latest("SH600000", "day", limit)
+
+    # 除权：历史K线整体变化，需从新窗口重建
+    source.bars = [
+        (bar[0],) + tuple(value * 0.5 for value in bar[1:5]) + bar[5:]
+        for bar in all_bars[:201]
+    ]
+    _, results = engine.latest("SH600000", "day", limit)
+    start = len(source.bars) - (limit + WARMUP)
+    assert_matches(results, full_tail(engine, source.bars, start, limit))
+
+
+def test_warmup_leading_values_are_none():
+    engine = IndicatorEngine(GrowingSource(make_bars(10)))
+    _, results = engine.latest("SH600000", "day", 10)
+    assert results["ma5"][:4] == [None] * 4
+    assert results["ma5"][4] is not None
+    assert results["ma60"] == [None] * 10
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"code": ["SH600000"], "limit": ["0"]},
+        {"code": ["SH600000"], "limit": ["-5"]},
+        {"code": ["SH600000"], "limit": ["abc"]},
+        {"code": ["SH600000"], "timestamp": ["later"]},
+        {"code": ["../x"]},
+        {"code": ["SH600000"], "period": ["daily"]},
+    ],
+)
+def test_handler_rejects_invalid_params(params):
+    _, status = get_indicators(params)
+    assert status == 400
+
+
+def test_handler_clamps_limit(monkeypatch):
+    import indicators
+
+    calls = []
+
+    def fake(code, period, end_ts, limit):
+        calls.append(limit)
+        return {"success": True}
+
+    monkeypatch.setattr(indicators, "_get_indicators", fake)
+    get_indicators({"code": ["SH600000"], "limit": ["100000"]})
+    assert calls == [MAX_LIMIT]
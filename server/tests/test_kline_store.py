@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from kline_store import KlineStore
+from upstream_scheduler import UpstreamError
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def bar(i, close=10.0):
+    return (i * DAY_MS, close, close, close, close, 100, 0.0, 0.1)
+
+
+class Fetcher:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self, code, period, begin, count):
+        self.calls += 1
+        if count < 0:
+            return [row for row in self.rows if row[0] <= begin][count:]
+        return [row for row in self.rows if row[0] >= begin][:count]
+
+
+@pytest.mark.parametrize(
+    "code, period",
+    [
+        ("../../x", "day"),
+        ("SH60000", "day"),
+        ("sh600000", "day"),
+        ("HK00700", "day"),
+        ("SH600000", "../day"),
+        ("SH600000", "daily"),
+    ],
+)
+def test_rejects_invalid_symbol_before_touching_disk(tmp_path, code, period):
+    fetcher = Fetcher([bar(1)])
+    store = KlineStore(fetcher, str(tmp_path))
+    with pytest.raises(ValueError):
+        store.get_window(code, period, None, 10)
+    assert fetcher.calls == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_upstream_is_not_persisted(tmp_path):
+    fetcher = Fetcher([])
+    store = KlineStore(fetcher, str(tmp_path))
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            store.get_window("SH600000", "day", None, 10)
+    assert not os.path.exists(os.path.join(tmp_path, "SH600000", "day.bars"))
+
+    # 上游恢复后正常建立存储
+    fetcher.rows = [bar(i) for i in range(1, 6)]
+    assert len(store.get_window("SH600000", "day", None, 10)) == 5
+
+
+def test_empty_sync_falls_back_to_local_bars(tmp_path):
+    rows = [bar(i) for i in range(1, 6)]
+    fetcher = Fetcher(rows)
+    store = KlineStore(fetcher, str(tmp_path))
+    assert store.get_window("SH600000", "day", None, 3) == rows[-3:]
+
+    # 再次同步时上游返回空数据（cookie失效），返回本地已有的K线
+    fetcher.rows = []
+    series = store._load("SH600000", "day")
+    series.synced_at = 0
+    assert store.get_window("SH600000", "day", None, 3) == rows[-3:]
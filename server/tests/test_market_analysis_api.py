@@ -0,0 +1,37 @@
+import csv
+
+from market_analysis_api import _AnalysisStore
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def test_append_after_line_without_newline(tmp_path):
+    path = str(tmp_path / "SH000001.csv")
+    # 手工编辑后最后一行没有换行
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        file.write("date,analysis\r\n2026-10-15,震荡")
+    store = _AnalysisStore(path)
+    store.load()
+
+    assert store.put("2026-10-16", "上涨") is False
+    assert read_rows(path) == [
+        {"date": "2026-10-15", "analysis": "震荡"},
+        {"date": "2026-10-16", "analysis": "上涨"},
+    ]
+
+
+def test_replace_last_row(tmp_path):
+    path = str(tmp_path / "SH000001.csv")
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        file.write("date,analysis\r\n")
+    store = _AnalysisStore(path)
+    store.load()
+
+    store.put("2026-10-15", "震荡")
+    store.put("2026-10-16", "上涨")
+    assert store.put("2026-10-16", "回落") is True
+    assert read_rows(path)[-1] == {"date": "2026-10-16", "analysis": "回落"}
+    assert len(read_rows(path)) == 2
@@ -0,0 +1,45 @@
+import pytest
+
+from market_snapshot import _limit_percent
+
+
+@pytest.mark.parametrize(
+    "code, name, percent",
+    [
+        ("sh600000", "浦发银行", 10),
+        ("sz000001", "平安银行", 10),
+        ("sh600001", "ST某某", 5),
+        ("sz000002", "*ST某某", 5),
+        ("sz300001", "创业板", 20),
+        ("sz300002", "ST创业", 20),
+        ("sh688001", "科创板", 20),
+        ("sh688002", "*ST科创", 20),
+        ("bj430001", "北交所", 30),
+        ("bj430002", "ST北交", 30),
+    ],
+)
+def test_limit_percent(code, name, percent):
+    assert _limit_percent(code, name) == percent
+
+
+def make_table():
+    from market_snapshot import SPOT_COLUMNS, SpotTable
+
+    frame = {"代码": ["sh600000", "sz300001"], "名称": ["浦发银行", "ST创业"]}
+    for column in SPOT_COLUMNS:
+        frame[column] = [1.0, 2.0]
+    return SpotTable(frame, 0.0)
+
+
+def test_quotes_ignore_code_case():
+    table = make_table()
+    quotes = table.quotes(["SZ300001", "sh600000", "SH999999"])
+    assert [quote["code"] for quote in quotes] == ["sz300001", "sh600000"]
+
+
+def test_rank_and_breadth():
+    table = make_table()
+    ranked = table.rank("percent", False, 1)
+    assert [item["code"] for item in ranked] == ["sz300001"]
+    breadth = table.breadth()
+    assert (breadth["total"], breadth["up"], breadth["limit_up"]) == (2, 2, 0)
@@ -0,0 +1,38 @@
+import datetime
+
+from prefetch import Prefetcher
+from trading_calendar import _to_timestamp
+
+LIVE = _to_timestamp(datetime.datetime(2026, 10, 16, 10, 0))
+AFTER_CLOSE = _to_timestamp(datetime.datetime(2026, 10, 16, 16, 0))
+
+
+def make_prefetcher(calls, **kwargs):
+    return Prefetcher(
+        warm=lambda code, period, limit: calls.append((code, period, limit)),
+        codes=lambda: ["SH600000", "SZ000001"],
+        periods=("day",),
+        limit=251,
+        workers=1,
+        **kwargs,
+    )
+
+
+def test_runs_after_close_only_by_default():
+    prefetcher = make_prefetcher([])
+    assert not prefetcher.is_due(LIVE)
+    assert prefetcher.is_due(AFTER_CLOSE)
+
+
+def test_run_on_start_is_due_immediately_once():
+    calls = []
+    prefetcher = make_prefetcher(calls, run_on_start=True)
+    assert prefetcher.is_due(LIVE)
+
+    prefetcher._last_round = LIVE
+    result = prefetcher.run_once()
+    assert calls == [("SH600000", "day", 251), ("SZ000001", "day", 251)]
+    assert (result["codes"], result["tasks"], result["failed"]) == (2, 2, 0)
+    # 启动时的一轮完成后按收盘时间预取
+    assert not prefetcher.is_due(LIVE + 60)
+    assert prefetcher.is_due(AFTER_CLOSE)
@@ -0,0 +1,180 @@
+import datetime
+
+import pytest
+
+from kline_store import KlineStore
+from resample import base_limit, resample, resampled_window
+
+CHINA_OFFSET = datetime.timedelta(hours=8)
+
+
+def ts(*args) -> int:
+    """北京时间 -> 毫秒时间戳"""
+    china_time = datetime.datetime(*args)
+    return int(
+        (china_time - CHINA_OFFSET - datetime.datetime(1970, 1, 1)).total_seconds()
+        * 1000
+    )
+
+
+def bar(timestamp, close=10.0, volume=100, percent=0.0):
+    return (timestamp, close, close + 1, close - 1, close, volume, percent, 0.1)
+
+
+def session_minutes(day: datetime.date):
+    """一个交易日的1分钟K线时间戳（09:30集合竞价一根 + 上午120根 + 下午120根，以结束时间标记）"""
+    times = [datetime.datetime.combine(day, datetime.time(9, 30))]
+    start = datetime.datetime.combine(day, datetime.time(9, 30))
+    times += [start + datetime.timedelta(minutes=i) for i in range(1, 121)]
+    start = datetime.datetime.combine(day, datetime.time(13, 0))
+    times += [start + datetime.timedelta(minutes=i) for i in range(1, 121)]
+    return [ts(*t.timetuple()[:5]) for t in times]
+
+
+def labels(bars):
+    return [
+        (
+            datetime.datetime(1970, 1, 1)
+            + datetime.timedelta(milliseconds=b[0])
+            + CHINA_OFFSET
+        )
+        for b in bars
+    ]
+
+
+def test_minute_buckets_follow_sessions():
+    bars = [bar(t) for t in session_minutes(datetime.date(2026, 10, 16))]
+    result = resample(bars, "30m")
+    times = [label.strftime("%H:%M") for label in labels(result)]
+    assert times == [
+        "10:00",
+        "10:30",
+        "11:00",
+        "11:30",
+        "13:30",
+        "14:00",
+        "14:30",
+        "15:00",
+    ]
+    # 09:30集合竞价K线并入第一根
+    assert result[0][5] == 31 * 100
+    assert all(item[5] == 30 * 100 for item in result[1:])
+
+
+def test_60m_does_not_span_lunch_break():
+    bars = [bar(t) for t in session_minutes(datetime.date(2026, 10, 16))]
+    times = [label.strftime("%H:%M") for label in labels(resample(bars, "60m"))]
+    assert times == ["10:30", "11:30", "14:00", "15:00"]
+
+
+def test_lunch_and_after_close_bars_join_session_edges():
+    day = (2026, 10, 16)
+    bars = [bar(ts(*day, 11, 31)), bar(ts(*day, 15, 1))]
+    times = [label.strftime("%H:%M") for label in labels(resample(bars, "5m"))]
+    assert times == ["11:30", "15:00"]
+
+
+def test_week_and_month_labels_use_first_trading_day():
+    days = [datetime.date(2026, 9, 28) + datetime.timedelta(days=i) for i in range(14)]
+    bars = [bar(ts(d.year, d.month, d.day, 15)) for d in days if d.weekday() < 5]
+    weeks = resample(bars, "week")
+    assert [label.date() for label in labels(weeks)] == [
+        datetime.date(2026, 9, 28),
+        datetime.date(2026, 10, 5),
+    ]
+    months = resample(bars, "month")
+    assert [label.date() for label in labels(months)] == [
+        datetime.date(2026, 9, 28),
+        datetime.date(2026, 10, 1),
+    ]
+
+
+def test_aggregate_fields():
+    day = (2026, 10, 16)
+    bars = [
+        (ts(*day, 9, 31), 10.0, 10.5, 9.5, 10.2, 100, 2.0, 0.1),
+        (ts(*day, 9, 32), 10.2, 11.0, 10.0, 10.8, 200, 5.88, 0.2),
+    ]
+    (result,) = resample(bars, "5m")
+    assert result[1:6] == (10.0, 11.0, 9.5, 10.8, 300)
+    assert result[7] == pytest.approx(0.3)
+    # 相对第一根的昨收（10.2 / 1.02 = 10）计算涨跌幅
+    assert result[6] == pytest.approx(8.0)
+
+
+def test_window_drops_partial_head():
+    day = datetime.date(2026, 10, 16)
+    minutes = session_minutes(day)
+    # 从10:15开始的窗口，第一根30分钟线（10:30）只有一半数据
+    bars = [bar(t) for t in minutes if t >= ts(2026, 10, 16, 10, 15)]
+    result = resampled_window(bars, "30m", 3, False, None)
+    assert [label.strftime("%H:%M") for label in labels(result)] == [
+        "14:00",
+        "14:30",
+        "15:00",
+    ]
+    full = resampled_window(bars, "30m", 100, True, None)
+    assert labels(full)[0].strftime("%H:%M") == "10:30"
+
+
+def test_window_drops_partial_tail():
+    minutes = session_minutes(datetime.date(2026, 10, 16))
+    end = minutes.index(ts(2026, 10, 16, 14, 10))
+    bars = [bar(t) for t in minutes[: end + 1]]
+    result = resampled_window(bars, "30m", 2, True, minutes[end + 1])
+    # 14:30那根在窗口之后还有K线，不完整
+    assert [label.strftime("%H:%M") for label in labels(result)] == ["13:30", "14:00"]
+    # 窗口恰好在分组结束处截止时保留最后一根
+    end = minutes.index(ts(2026, 10, 16, 14, 30))
+    bars = [bar(t) for t in minutes[: end + 1]]
+    result = resampled_window(bars, "30m", 1, True, minutes[end + 1])
+    assert labels(result)[0].strftime("%H:%M") == "14:30"
+
+
+def test_window_returns_none_when_base_bars_are_short():
+    bars = [bar(t) for t in session_minutes(datetime.date(2026, 10, 16))]
+    assert resampled_window(bars, "30m", 20, False, None) is None
+    assert len(resampled_window(bars, "30m", 20, True, None)) == 8
+
+
+def test_base_limit():
+    assert base_limit("30m", 10) == 12 * 30
+    assert base_limit("60m", 10000) == 20000
+
+
+class _FakeFetcher:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __call__(self, code, period, begin, count):
+        self.calls.append(period)
+        rows = self.rows.get(period, [])
+        if count < 0:
+            return [row for row in rows if row[0] <= begin][count:]
+        return [row for row in rows if row[0] >= begin][:count]
+
+
+def test_store_falls_back_to_native_period(tmp_path):
+    native = [bar(ts(2026, 10, 16, 10, 30)), bar(ts(2026, 10, 16, 11, 30))]
+    fetcher = _FakeFetcher({"60m": native})
+    store = KlineStore(fetcher, str(tmp_path))
+    assert store.get_window("SH600000", "60m", None, 2) == native
+    # 没有本地1分钟线，不为合成而拉取1分钟线
+    assert "1m" not in fetcher.calls
+
+
+def test_store_resamples_from_local_base(tmp_path):
+    minutes = []
+    for day in (13, 14, 15, 16):
+        minutes += session_minutes(datetime.date(2026, 10, day))
+    fetcher = _FakeFetcher({"1m": [bar(t) for t in minutes]})
+    store = KlineStore(fetcher, str(tmp_path))
+    end = minutes[-1]
+    store.get_window("SH600000", "1m", end, len(minutes))
+    fetcher.calls.clear()
+
+    result = store.get_window("SH600000", "60m", end, 8)
+    assert fetcher.calls == []
+    assert len(result) == 8
+    assert labels(result)[0].strftime("%d %H:%M") == "15 10:30"
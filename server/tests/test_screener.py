@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from bar_file import write_bar_file
+from screener import MAX_EXPRESSION_LENGTH, Screener, feature_window, parse_expression
+
+DAY_MS = 24 * 3600 * 1000
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "",
+        "close > " + "1" * MAX_EXPRESSION_LENGTH,
+        "close >",
+        "__import__('os').system('ls')",
+        "close.real > 1",
+        "abs(close) > 1",
+        "close[0] > 1",
+        "close > 'a'",
+        "[close] == [1]",
+        "(lambda: 1)() > 0",
+        "close if close > 1 else 0",
+        "close ** 2 > 1",
+        "close % 2 > 1",
+        "unknown > 1",
+        "ma0 > 1",
+        "ma251 > 1",
+        "x = 1",
+    ],
+)
+def test_rejects_unsafe_or_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        parse_expression(expression)
+
+
+def test_accepts_supported_expressions():
+    _, features = parse_expression(
+        "close > ma20 and vol_ratio > 2 and not (ret5 < -10 or -hhv250 >= llv1 * 2)"
+    )
+    assert features == {"close", "ma20", "vol_ratio", "ret5", "hhv250", "llv1"}
+
+
+def test_feature_windows():
+    assert feature_window("close") == 1
+    assert feature_window("vol_ratio") == 6
+    assert feature_window("ma20") == 20
+    assert feature_window("ret5") == 6
+
+
+def write_days(base_dir, code, closes):
+    path = os.path.join(base_dir, code, "day.bars")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bars = [
+        (i * DAY_MS, close, close, close, close, 100, 0.0, 0.1)
+        for i, close in enumerate(closes)
+    ]
+    write_bar_file(path, bars)
+
+
+def test_scan_reports_missing_codes(tmp_path):
+    write_days(str(tmp_path), "SH600000", [10.0] * 5 + [12.0])
+    write_days(str(tmp_path), "SH600001", [10.0] * 6)
+    screener = Screener(str(tmp_path), max_workers=1)
+    codes = ["SH600000", "SH600001", "SH600002"]
+
+    result, missing = screener.scan(codes, "close > ma5", extra=("ret5",))
+    assert result == [("SH600000", {"close": 12.0, "ma5": 10.4, "ret5": 20.0})]
+    assert missing == ["SH600002"]
+
+
+def test_scan_cache_follows_data_updates(tmp_path):
+    write_days(str(tmp_path), "SH600000", [10.0] * 6)
+    screener = Screener(str(tmp_path), max_workers=1)
+    assert screener.scan(["SH600000"], "close > ma5") == ([], [])
+
+    write_days(str(tmp_path), "SH600000", [10.0] * 5 + [11.0])
+    path = os.path.join(str(tmp_path), "SH600000", "day.bars")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    result, _ = screener.scan(["SH600000"], "close > ma5")
+    assert [code for code, _ in result] == ["SH600000"]
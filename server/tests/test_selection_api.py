@@ -0,0 +1,24 @@
+import csv
+
+import selection_api
+
+
+def test_duplicate_rows_keep_last(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open(selection_api.CSV_FILE, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=selection_api.CSV_HEADERS)
+        writer.writeheader()
+        writer.writerow(
+            dict(code="SH600000", name="浦发", color="", remark="旧", sort="1")
+        )
+        writer.writerow(
+            dict(code="SZ000001", name="平安", color="", remark="", sort="2")
+        )
+        writer.writerow(
+            dict(code="SH600000", name="浦发", color="", remark="新", sort="1")
+        )
+
+    store = selection_api._SelectionStore(selection_api.CSV_FILE)
+    store.load()
+    assert [row["code"] for row in store.rows.values()] == ["SH600000", "SZ000001"]
+    assert store.rows["600000"]["remark"] == "新"
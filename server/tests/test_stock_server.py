@@ -0,0 +1,26 @@
+import metrics
+from stock_server import handle_batch
+
+
+def count(route, method, status):
+    return metrics.http_requests._values.get((route, method, status), 0)
+
+
+def test_batch_items_are_counted_under_their_routes():
+    before = count("/prefetch_status", "GET", "200")
+    missing = count("not_found", "GET", "404")
+    response = handle_batch(
+        {},
+        {
+            "requests": [
+                {"path": "/prefetch_status"},
+                {"path": "/prefetch_status", "method": "GET"},
+                {"path": "/no_such_route"},
+            ]
+        },
+    )
+    assert [item["status"] for item in response["data"]] == [200, 200, 404]
+    assert count("/prefetch_status", "GET", "200") == before + 2
+    assert count("not_found", "GET", "404") == missing + 1
+    samples = "\n".join(metrics.http_request_seconds.samples())
+    assert 'route="/prefetch_status",method="GET"' in samples
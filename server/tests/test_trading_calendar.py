@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+
+from trading_calendar import (
+    CLOSED,
+    SETTLE_SECONDS,
+    _to_timestamp,
+    frozen_since,
+    is_fresh,
+    is_trading_day,
+    is_market_live,
+    next_open,
+    next_trading_day,
+    previous_trading_day,
+    session_phase,
+)
+
+
+def at(*args) -> float:
+    """北京时间 -> 时间戳（秒）"""
+    return _to_timestamp(datetime.datetime(*args))
+
+
+@pytest.mark.parametrize(
+    "time, phase, live",
+    [
+        ((8, 0), "pre_market", False),
+        ((9, 15), "opening_auction", True),
+        ((9, 24, 59), "opening_auction", True),
+        ((9, 25), "pre_open", False),
+        ((9, 30), "continuous", True),
+        ((11, 29, 59), "continuous", True),
+        ((11, 30), "lunch_break", False),
+        ((13, 0), "continuous", True),
+        ((14, 57), "closing_auction", True),
+        ((15, 0), "after_close", False),
+        ((23, 59), "after_close", False),
+    ],
+)
+def test_session_phases(time, phase, live):
+    now = at(2026, 10, 16, *time)
+    assert session_phase(now) == phase
+    assert is_market_live(now) is live
+
+
+@pytest.mark.parametrize(
+    "day",
+    [
+        (2026, 10, 17),  # 周六
+        (2026, 10, 18),  # 周日
+        (2026, 10, 1),  # 国庆
+        (2026, 10, 7),
+        (2026, 2, 18),  # 春节
+        (2027, 1, 1),
+        (2027, 2, 10),
+        (2027, 10, 5),
+    ],
+)
+def test_weekends_and_holidays_are_closed(day):
+    now = at(*day, 10, 0)
+    assert session_phase(now) == CLOSED
+    assert not is_market_live(now)
+
+
+def test_trading_day_navigation():
+    assert previous_trading_day(datetime.date(2026, 10, 8)) == datetime.date(
+        2026, 9, 30
+    )
+    assert next_trading_day(datetime.date(2026, 9, 30)) == datetime.date(2026, 10, 8)
+    assert next_trading_day(datetime.date(2026, 10, 16)) == datetime.date(2026, 10, 19)
+
+
+def test_frozen_since():
+    close = at(2026, 10, 16, 15, 0)
+    settled = close + SETTLE_SECONDS
+    # 盘中和收盘后尚未定格时没有定格时间
+    assert frozen_since(at(2026, 10, 16, 10, 0)) is None
+    assert frozen_since(close + SETTLE_SECONDS - 1) is None
+    assert frozen_since(settled) == settled
+    # 周末和下一个交易日开盘前沿用上一个交易日收盘后的定格时间
+    assert frozen_since(at(2026, 10, 18, 12, 0)) == settled
+    assert frozen_since(at(2026, 10, 19, 9, 0)) == settled
+    # 午休期间以上午收盘为准
+    assert frozen_since(at(2026, 10, 16, 12, 0)) == at(2026, 10, 16, 11, 32)
+    # 开盘集合竞价结束后到连续竞价之间
+    assert frozen_since(at(2026, 10, 16, 9, 29)) == at(2026, 10, 16, 9, 27)
+
+
+def test_next_open():
+    now = at(2026, 10, 16, 10, 0)
+    assert next_open(now) == now
+    assert next_open(at(2026, 10, 16, 8, 0)) == at(2026, 10, 16, 9, 15)
+    assert next_open(at(2026, 10, 16, 12, 0)) == at(2026, 10, 16, 13, 0)
+    assert next_open(at(2026, 10, 16, 15, 30)) == at(2026, 10, 19, 9, 15)
+    assert next_open(at(2026, 9, 30, 16, 0)) == at(2026, 10, 8, 9, 15)
+
+
+def test_is_fresh():
+    # 盘中按 live_ttl 过期
+    now = at(2026, 10, 16, 10, 0)
+    assert is_fresh(now - 5, 10, now)
+    assert not is_fresh(now - 15, 10, now)
+    # 定格后获取的数据在下一次开盘前一直有效
+    fetched = at(2026, 10, 16, 15, 5)
+    assert is_fresh(fetched, 10, at(2026, 10, 18, 12, 0))
+    assert not is_fresh(fetched, 10, at(2026, 10, 19, 9, 40))
+    # 收盘后定格前获取的数据在定格后失效
+    fetched = at(2026, 10, 16, 15, 1)
+    assert not is_fresh(fetched, 10, at(2026, 10, 16, 15, 30))
+
+
+def test_unknown_year_warns_once(capsys):
+    day = datetime.date(2031, 1, 2)
+    assert is_trading_day(day)
+    assert is_trading_day(day)
+    assert capsys.readouterr().out.count("2031年的休市安排未收录") == 1
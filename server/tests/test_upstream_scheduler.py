@@ -0,0 +1,201 @@
+import threading
+import time
+
+import pytest
+
+from upstream_scheduler import (
+    BACKGROUND,
+    INTERACTIVE,
+    CircuitBreaker,
+    CircuitOpenError,
+    Priority,
+    RateLimitedError,
+    TokenBucket,
+    UpstreamScheduler,
+    background,
+)
+
+RESET = 0.05
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def open_breaker(breaker, count=2):
+    for _ in range(count):
+        breaker.before_call()
+        breaker.record_failure(ValueError("boom"))
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    breaker.before_call()
+    breaker.record_failure(ValueError("boom"))
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record_failure(ValueError("boom"))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError, match="boom"):
+        breaker.before_call()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    breaker.record_failure(ValueError("boom"))
+    breaker.record_success()
+    breaker.record_failure(ValueError("boom"))
+    assert breaker.state == "closed"
+    assert breaker.stats()["failures"] == 1
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    open_breaker(breaker)
+    time.sleep(RESET)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # 试探请求未结束前其他请求仍直接失败
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_rejection_during_probe_reports_positive_retry():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    open_breaker(breaker)
+    time.sleep(RESET * 2)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError, match="，1秒后重试"):
+        breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    open_breaker(breaker)
+    time.sleep(RESET)
+    breaker.before_call()
+    breaker.record_failure(ValueError("again"))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError, match="again"):
+        breaker.before_call()
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+    open_breaker(breaker)
+    time.sleep(RESET)
+    breaker.before_call()
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    breaker.before_call()
+
+
+def test_reset_closes_immediately():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    open_breaker(breaker)
+    breaker.reset()
+    assert breaker.stats()["state"] == "closed"
+    breaker.before_call()
+
+
+def wait_for_waiters(bucket, count):
+    deadline = time.monotonic() + 2
+    while bucket.stats()["waiting"] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def run_waiters(bucket, priorities, order):
+    threads = []
+    for name, priority in priorities:
+
+        def acquire(name=name, priority=priority):
+            assert bucket.acquire(priority, 5)
+            order.append(name)
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(bucket, len(threads))
+    return threads
+
+
+def test_bucket_serves_interactive_first():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.acquire(Priority(INTERACTIVE), 1)
+    order = []
+    threads = run_waiters(
+        bucket,
+        [
+            ("background", Priority(BACKGROUND)),
+            ("interactive", Priority(INTERACTIVE)),
+        ],
+        order,
+    )
+    for thread in threads:
+        thread.join()
+    assert order == ["interactive", "background"]
+
+
+def test_promoted_waiter_moves_ahead():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.acquire(Priority(INTERACTIVE), 1)
+    promoted = Priority(BACKGROUND)
+    order = []
+    threads = run_waiters(
+        bucket,
+        [("first", Priority(BACKGROUND)), ("promoted", promoted)],
+        order,
+    )
+    promoted.promote(INTERACTIVE)
+    for thread in threads:
+        thread.join()
+    assert order == ["promoted", "first"]
+    assert promoted.level == INTERACTIVE
+
+
+def test_bucket_timeout_leaves_queue():
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    assert bucket.acquire(Priority(INTERACTIVE), 1)
+    assert not bucket.acquire(Priority(INTERACTIVE), 0.02)
+    assert bucket.stats()["waiting"] == 0
+
+
+def test_scheduler_state_transitions():
+    scheduler = UpstreamScheduler("test", rate=100, capacity=10)
+    scheduler._breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+
+    assert scheduler.call(lambda: 1, endpoint="ok") == 1
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            scheduler.call(fail)
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(lambda: 1)
+    time.sleep(RESET)
+    assert scheduler.call(lambda: 2) == 2
+
+    stats = scheduler.stats()
+    assert stats["state"] == "closed"
+    assert (stats["calls"], stats["failed"], stats["rejected"]) == (4, 2, 1)
+
+
+def test_throttled_probe_is_released(monkeypatch):
+    import upstream_scheduler
+
+    monkeypatch.setitem(upstream_scheduler.MAX_WAIT, BACKGROUND, 0.02)
+    scheduler = UpstreamScheduler("test", rate=0.1, capacity=1)
+    scheduler._breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET)
+    with pytest.raises(ValueError):
+        scheduler.call(fail)
+    time.sleep(RESET)
+    with background():
+        with pytest.raises(RateLimitedError):
+            scheduler.call(lambda: 1)
+    stats = scheduler.stats()
+    assert stats["throttled"] == 1
+    assert stats["state"] == "half_open"
+    # 排队超时的试探名额已归还，下一次调用仍可作为试探请求
+    scheduler._breaker.before_call()
@@ -0,0 +1,219 @@
+import datetime
+import time
+from typing import Optional
+
+# 北京时间与UTC的偏移
+CHINA_OFFSET = datetime.timedelta(hours=8)
+
+# 沪深交易所休市日（不含周末），按交易所每年公布的休市安排更新
+HOLIDAYS = {
+    datetime.date(*day)
+    for day in [
+        # 2025年
+        (2025, 1, 1),
+        (2025, 1, 28),
+        (2025, 1, 29),
+        (2025, 1, 30),
+        (2025, 1, 31),
+        (2025, 2, 3),
+        (2025, 2, 4),
+        (2025, 4, 4),
+        (2025, 5, 1),
+        (2025, 5, 2),
+        (2025, 5, 5),
+        (2025, 6, 2),
+        (2025, 10, 1),
+        (2025, 10, 2),
+        (2025, 10, 3),
+        (2025, 10, 6),
+        (2025, 10, 7),
+        (2025, 10, 8),
+        # 2026年
+        (2026, 1, 1),
+        (2026, 1, 2),
+        (2026, 2, 16),
+        (2026, 2, 17),
+        (2026, 2, 18),
+        (2026, 2, 19),
+        (2026, 2, 20),
+        (2026, 2, 23),
+        (2026, 4, 6),
+        (2026, 5, 1),
+        (2026, 5, 4),
+        (2026, 5, 5),
+        (2026, 6, 19),
+        (2026, 9, 25),
+        (2026, 10, 1),
+        (2026, 10, 2),
+        (2026, 10, 5),
+        (2026, 10, 6),
+        (2026, 10, 7),
+        # 2027年（交易所尚未公布，按法定节假日和农历日期预估，公布后核对更新）
+        (2027, 1, 1),
+        (2027, 2, 5),
+        (2027, 2, 8),
+        (2027, 2, 9),
+        (2027, 2, 10),
+        (2027, 2, 11),
+        (2027, 2, 12),
+        (2027, 4, 5),
+        (2027, 5, 3),
+        (2027, 5, 4),
+        (2027, 5, 5),
+        (2027, 6, 9),
+        (2027, 9, 15),
+        (2027, 10, 1),
+        (2027, 10, 4),
+        (2027, 10, 5),
+        (2027, 10, 6),
+        (2027, 10, 7),
+    ]
+}
+# 休市安排已收录的年份，其他年份只按周末判断
+HOLIDAY_YEARS = {day.year for day in HOLIDAYS}
+_warned_years = set()
+
+# 交易日内的时段：(开始时间, 时段名称, 行情是否变化)，按时间顺序排列
+SESSION_PHASES = [
+    (datetime.time(0, 0), "pre_market", False),
+    (datetime.time(9, 15), "opening_auction", True),  # 开盘集合竞价
+    (datetime.time(9, 25), "pre_open", False),  # 竞价撮合完成，等待连续竞价
+    (datetime.time(9, 30), "continuous", True),
+    (datetime.time(11, 30), "lunch_break", False),
+    (datetime.time(13, 0), "continuous", True),
+    (datetime.time(14, 57), "closing_auction", True),  # 收盘集合竞价
+    (datetime.time(15, 0), "after_close", False),
+]
+# 非交易日的时段名称
+CLOSED = "closed"
+# 行情停止变化后仍视为活跃的时间（秒）：收盘价、最后一根K线需要一点时间才在上游定格
+SETTLE_SECONDS = 120
+
+
+def china_now(now: Optional[float] = None) -> datetime.datetime:
+    """当前的北京时间（不含时区信息）"""
+    if now is None:
+        now = time.time()
+    utc = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+    return utc.replace(tzinfo=None) + CHINA_OFFSET
+
+
+def _to_timestamp(china_time: datetime.datetime) -> float:
+    return (china_time - CHINA_OFFSET - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def is_trading_day(day: datetime.date) -> bool:
+    if day.year not in HOLIDAY_YEARS and day.year not in _warned_years:
+        # 每个年份只提示一次（并发时重复打印无影响）
+        _warned_years.add(day.year)
+        print(
+            f"警告：{day.year}年的休市安排未收录，节假日将被视为交易日，请更新 HOLIDAYS"
+        )
+    return day.weekday() < 5 and day not in HOLIDAYS
+
+
+def previous_trading_day(day: datetime.date) -> datetime.date:
+    """day 之前（不含）最近的交易日"""
+    day -= datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day -= datetime.timedelta(days=1)
+    return day
+
+
+def next_trading_day(day: datetime.date) -> datetime.date:
+    """day 之后（不含）最近的交易日"""
+    day += datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def session_phase(now: Optional[float] = None) -> str:
+    """当前所处的交易时段（非交易日为 closed）"""
+    china_time = china_now(now)
+    if not is_trading_day(china_time.date()):
+        return CLOSED
+    current = china_time.time()
+    phase = SESSION_PHASES[0][1]
+    for start, name, _ in SESSION_PHASES:
+        if current < start:
+            break
+        phase = name
+    return phase
+
+
+def is_market_live(now: Optional[float] = None) -> bool:
+    """行情是否正在变化（集合竞价和连续竞价时段）"""
+    phase = session_phase(now)
+    return any(name == phase and live for _, name, live in SESSION_PHASES)
+
+
+def frozen_since(now: Optional[float] = None) -> Optional[float]:
+    """
+    行情最近一次定格的时间戳（秒）：最近一个活跃时段结束后再过 SETTLE_SECONDS；
+    行情仍在变化（或尚未定格）时返回None
+    """
+    if now is None:
+        now = time.time()
+    china_time = china_now(now)
+    day = china_time.date()
+    while True:
+        if is_trading_day(day):
+            # 从后往前找当天已经结束的活跃时段
+            for i in range(len(SESSION_PHASES) - 1, -1, -1):
+                start, _, live = SESSION_PHASES[i]
+                if not live:
+                    continue
+                end = SESSION_PHASES[i + 1][0]
+                live_start = datetime.datetime.combine(day, start)
+                live_end = datetime.datetime.combine(day, end)
+                if china_time < live_start:
+                    continue
+                settled = live_end + datetime.timedelta(seconds=SETTLE_SECONDS)
+                return _to_timestamp(settled) if china_time >= settled else None
+        day = previous_trading_day(day)
+        china_time = datetime.datetime.combine(day, datetime.time.max)
+
+
+def next_open(now: Optional[float] = None) -> float:
+    """下一个活跃时段开始的时间戳（秒），当前处于活跃时段时返回当前时间"""
+    if now is None:
+        now = time.time()
+    if is_market_live(now):
+        return now
+    china_time = china_now(now)
+    day = china_time.date()
+    if is_trading_day(day):
+        for start, _, live in SESSION_PHASES:
+            begin = datetime.datetime.combine(day, start)
+            if live and begin > china_time:
+                return _to_timestamp(begin)
+    day = next_trading_day(day)
+    return _to_timestamp(datetime.datetime.combine(day, SESSION_PHASES[1][0]))
+
+
+def is_fresh(fetched_at: float, live_ttl: float, now: Optional[float] = None) -> bool:
+    """
+    缓存是否仍然有效（fetched_at 为获取数据时的时间戳，秒）：
+    行情变化期间按 live_ttl 过期；行情定格后获取的数据一直有效，直到下一个活跃时段
+    """
+    if now is None:
+        now = time.time()
+    if now - fetched_at < live_ttl:
+        return True
+    since = frozen_since(now)
+    return since is not None and fetched_at >= since
+
+
+def get_market_session(params):
+    """当前交易时段：phase、是否交易日、行情是否变化及下一次开盘时间（毫秒）"""
+    now = time.time()
+    return {
+        "success": True,
+        "data": {
+            "phase": session_phase(now),
+            "trading_day": is_trading_day(china_now(now).date()),
+            "live": is_market_live(now),
+            "next_open": int(next_open(now) * 1000),
+        },
+    }
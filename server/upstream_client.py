@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+import urllib.parse
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from upstream_scheduler import (
+    CookieExpiredError,
+    RateLimitedError,
+    UpstreamScheduler,
+    get_scheduler,
+    scheduler_stats,
+)
+
+COOKIE_FILE = "cookie.txt"
+# 每个上游主机保持的连接数，与服务器工作线程数一致（同一环境变量 STOCK_SERVER_WORKERS）
+POOL_SIZE = int(os.environ.get("STOCK_SERVER_WORKERS", "32"))
+# 请求超时（秒）
+REQUEST_TIMEOUT = 10
+# 保留最近多少次调用的耗时明细
+RECENT_CALLS = 50
+# 雪球表示未登录（cookie失效）的错误码
+COOKIE_ERROR_CODES = {"400016"}
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36"
+
+# 当前线程本次调用中新建连接的耗时（连接在发起请求的线程中同步建立）
+_connect_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    """记录新建连接的TCP握手和TLS握手耗时（复用连接时不会调用）"""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        _connect_timing.tcp_ms = (time.perf_counter() - started) * 1000
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        _connect_timing.tcp_ms = 0.0
+        super().connect()
+        total_ms = (time.perf_counter() - started) * 1000
+        _connect_timing.connects = getattr(_connect_timing, "connects", 0) + 1
+        _connect_timing.connect_tcp_ms = _connect_timing.tcp_ms
+        _connect_timing.connect_tls_ms = total_ms - _connect_timing.tcp_ms
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """连接池使用可计时的连接类"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def check_response(response: requests.Response) -> None:
+    """区分cookie失效与限流：前者需要更新cookie，后者等待一段时间即可恢复"""
+    status = response.status_code
+    if status == 429:
+        raise RateLimitedError()
+    if status in (400, 401, 403):
+        try:
+            error_code = str(response.json().get("error_code", ""))
+        except ValueError:
+            error_code = ""
+        if status == 401 or error_code in COOKIE_ERROR_CODES:
+            raise CookieExpiredError()
+        if status == 403:
+            # 非JSON的403来自防火墙拦截，属于限流
+            raise RateLimitedError()
+
+
+class UpstreamClient:
+    """
+    上游HTTP客户端：所有请求共享一个保持长连接的会话（连接池大小与服务器并发数一致），
+    cookie缓存在内存中，文件修改时间变化后才重新读取；记录每次调用的连接与TLS耗时
+    请求经调度器限速和熔断，cookie失效、限流分别抛出对应异常
+    """
+
+    def __init__(
+        self,
+        scheduler: UpstreamScheduler,
+        cookie_file: str = COOKIE_FILE,
+        pool_size: int = POOL_SIZE,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        self._scheduler = scheduler
+        self._cookie_file = cookie_file
+        self._timeout = timeout
+        self._session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._cookie_lock = threading.Lock()
+        self._cookie: Optional[str] = None
+        self._cookie_mtime = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "tcp_ms": 0.0,
+            "tls_ms": 0.0,
+            "total_ms": 0.0,
+        }
+        self._recent = deque(maxlen=RECENT_CALLS)
+
+    def cookie(self) -> Optional[str]:
+        """当前cookie（文件不存在时返回None）"""
+        try:
+            mtime = os.stat(self._cookie_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._cookie_mtime:
+            with self._cookie_lock:
+                if mtime != self._cookie_mtime:
+                    with open(self._cookie_file, "r", encoding="utf-8") as f:
+                        self._cookie = f.read().strip()
+                    if self._cookie_mtime is not None:
+                        # cookie已更新，之前因cookie失效导致的熔断立即解除
+                        self._scheduler.reset()
+                    self._cookie_mtime = mtime
+        return self._cookie
+
+    def headers(self) -> Dict[str, str]:
+        cookie = self.cookie()
+        if not cookie:
+            raise RuntimeError("cookie文件不存在")
+        return {
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json, text/plain, */*",
+            "Referer": "https://xueqiu.com/",
+            "Cookie": cookie,
+        }
+
+    def get(self, url: str) -> requests.Response:
+        """
+        经调度器发起GET请求：cookie失效抛出 CookieExpiredError，限流抛出 RateLimitedError，
+        熔断中抛出 CircuitOpenError，其他HTTP错误由调用方检查状态码
+        """
+        headers = self.headers()
+        # 按接口路径（不含域名和查询参数）分别统计
+        endpoint = urllib.parse.urlsplit(url).path
+        return self._scheduler.call(self._get, url, headers, endpoint=endpoint)
+
+    def _get(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        """发起请求并记录本次调用的耗时"""
+        _connect_timing.connects = 0
+        _connect_timing.connect_tcp_ms = _connect_timing.connect_tls_ms = 0.0
+        started = time.perf_counter()
+        error = None
+        try:
+            response = self._session.get(url, headers=headers, timeout=self._timeout)
+            check_response(response)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(url, (time.perf_counter() - started) * 1000, error)
+
+    def _record(self, url: str, total_ms: float, error) -> None:
+        connects = _connect_timing.connects
+        call = {
+            "url": url.split("?", 1)[0],
+            "reused": connects == 0,
+            "tcp_ms": round(_connect_timing.connect_tcp_ms, 2),
+            "tls_ms": round(_connect_timing.connect_tls_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "error": str(error) if error else None,
+            "time": int(time.time() * 1000),
+        }
+        with self._stats_lock:
+            stats = self._stats
+            stats["calls"] += 1
+            stats["errors"] += error is not None
+            stats["new_connections"] += connects
+            stats["tcp_ms"] += _connect_timing.connect_tcp_ms
+            stats["tls_ms"] += _connect_timing.connect_tls_ms
+            stats["total_ms"] += total_ms
+            self._recent.append(call)
+
+    def stats(self) -> Dict:
+        """汇总耗时（握手耗时按新建连接数平均，总耗时按调用数平均）和最近的调用明细"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            recent = list(self._recent)
+        calls, connections = stats["calls"], stats["new_connections"]
+        return {
+            "calls": calls,
+            "errors": stats["errors"],
+            "new_connections": connections,
+            "reuse_rate": round(1 - connections / calls, 4) if calls else None,
+            "avg_tcp_ms": (
+                round(stats["tcp_ms"] / connections, 2) if connections else None
+            ),
+            "avg_tls_ms": (
+                round(stats["tls_ms"] / connections, 2) if connections else None
+            ),
+            "avg_total_ms": round(stats["total_ms"] / calls, 2) if calls else None,
+            "recent": recent,
+        }
+
+
+# 全局上游客户端：雪球接口共用
+upstream = UpstreamClient(get_scheduler("xueqiu"))
+
+
+def get_upstream_stats(params):
+    """上游调用统计：连接复用率、TCP/TLS握手与请求耗时，以及各上游的限速与熔断状态"""
+    return {
+        "success": True,
+        "data": {**upstream.stats(), "schedulers": scheduler_stats()},
+    }
@@ -0,0 +1,323 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import metrics
+
+# 请求优先级（数值越小越先执行）：交互请求（页面加载）优先于后台任务（预取等）
+INTERACTIVE = 0
+BACKGROUND = 1
+# 各优先级排队等待令牌的最长时间（秒），超时视为被限流
+MAX_WAIT = {INTERACTIVE: 5.0, BACKGROUND: 30.0}
+
+# 各上游的限速：名称 -> (每秒请求数, 突发容量)，可通过环境变量 STOCK_UPSTREAM_RATE 调整雪球限速
+UPSTREAM_LIMITS = {
+    "xueqiu": (float(os.environ.get("STOCK_UPSTREAM_RATE", "10")), 20),
+    # akshare 全市场接口内部会连续请求多页，按调用次数限制
+    "akshare": (0.5, 2),
+}
+# 连续失败多少次后熔断
+FAILURE_THRESHOLD = 5
+# 熔断持续时间（秒），之后放行一次试探请求
+RESET_TIMEOUT = 30.0
+
+# 当前调用的优先级（后台线程通过 background() 设置，未设置时为交互优先级）
+_priority = contextvars.ContextVar("upstream_priority", default=None)
+
+
+class UpstreamError(Exception):
+    """上游不可用：消息可直接返回给前端"""
+
+
+class CookieExpiredError(UpstreamError):
+    def __init__(self, message: str = "cookie已过期"):
+        super().__init__(message)
+
+
+class RateLimitedError(UpstreamError):
+    def __init__(self, message: str = "上游请求过于频繁，请稍后重试"):
+        super().__init__(message)
+
+
+class CircuitOpenError(UpstreamError):
+    """熔断期间直接失败，消息中包含导致熔断的原因"""
+
+
+class Priority:
+    """
+    一次调用的优先级，可在排队期间提升：
+    合并请求时前台请求加入后台发起的调用，会将其提升为前台优先级，避免前台请求跟着后台排队
+    """
+
+    def __init__(self, level: int):
+        self.level = level
+        self._lock = threading.Lock()
+        # 正在排队时为 (令牌桶, 队列项)
+        self._waiting = None
+
+    def promote(self, level: int) -> None:
+        """提升到 level（数值更小才生效），正在排队时立即按新优先级重新排序"""
+        with self._lock:
+            if level >= self.level:
+                return
+            self.level = level
+            waiting = self._waiting
+        if waiting is not None:
+            bucket, entry = waiting
+            bucket.promote(entry, level, MAX_WAIT[level])
+
+
+def current_level() -> int:
+    """当前上下文的优先级"""
+    priority = _priority.get()
+    return INTERACTIVE if priority is None else priority.level
+
+
+@contextlib.contextmanager
+def use_priority(priority: Priority):
+    """在该上下文中发起的上游请求使用指定的优先级对象"""
+    token = _priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _priority.reset(token)
+
+
+def background():
+    """在该上下文中发起的上游请求使用后台优先级"""
+    return use_priority(Priority(BACKGROUND))
+
+
+class TokenBucket:
+    """
+    令牌桶限速：按固定速率补充令牌，令牌不足时排队等待，
+    等待队列按 (优先级, 到达顺序) 出队，高优先级请求总是先拿到令牌
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+        self._updated = now
+
+    def acquire(self, priority: Priority, timeout: float) -> bool:
+        """获取一个令牌，超时返回False（排队期间优先级可被提升，见 Priority.promote）"""
+        with self._cond:
+            # 队列项：[优先级, 到达顺序, 截止时间]，到达顺序唯一，不会比较到截止时间
+            with priority._lock:
+                entry = [priority.level, next(self._seq), time.monotonic() + timeout]
+                priority._waiting = (self, entry)
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    is_head = self._waiters[0] is entry
+                    if is_head and self._tokens >= 1:
+                        self._tokens -= 1
+                        heapq.heappop(self._waiters)
+                        return True
+                    remaining = entry[2] - now
+                    if remaining <= 0:
+                        return False
+                    if is_head:
+                        # 队首只需等到下一个令牌生成
+                        remaining = min(remaining, (1 - self._tokens) / self._rate)
+                    self._cond.wait(remaining)
+            finally:
+                with priority._lock:
+                    priority._waiting = None
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                # 队首变化，唤醒其他等待者重新判断
+                self._cond.notify_all()
+
+    def promote(self, entry: list, level: int, timeout: float) -> None:
+        """提升排队中请求的优先级，最长等待时间按新优先级从现在起重新计算（不会延长）"""
+        with self._cond:
+            if entry not in self._waiters:
+                return
+            entry[0] = level
+            entry[2] = min(entry[2], time.monotonic() + timeout)
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {"tokens": round(self._tokens, 2), "waiting": len(self._waiters)}
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，打开期间直接失败；
+    超过恢复时间后进入半开状态，只放行一次试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+    ):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._last_error = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self._reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """检查是否允许调用，熔断中抛出 CircuitOpenError"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            # 半开状态下试探请求进行中时，恢复时间已过，提示稍后重试
+            retry_in = max(
+                1,
+                math.ceil(self._reset_timeout - (time.monotonic() - self._opened_at)),
+            )
+            raise CircuitOpenError(
+                f"上游暂不可用（{self._last_error}），{retry_in}秒后重试"
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self._failures += 1
+            self._last_error = str(error) or type(error).__name__
+            if self._probing or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """试探请求未实际发出时归还名额"""
+        with self._lock:
+            self._probing = False
+
+    def reset(self) -> None:
+        """立即关闭熔断（如cookie已更新）"""
+        self.record_success()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+
+class UpstreamScheduler:
+    """
+    上游调用调度：先经过熔断器（熔断中直接失败，由调用方返回本地旧数据），
+    再按优先级排队获取令牌，调用失败计入熔断器
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self._bucket = TokenBucket(rate, capacity)
+        self._breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "failed": 0, "rejected": 0, "throttled": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def call(
+        self, fn: Callable[..., Any], *args, endpoint: Optional[str] = None, **kwargs
+    ) -> Any:
+        """调用上游，endpoint 为统计用的接口名（默认取函数名）"""
+        endpoint = endpoint or getattr(fn, "__name__", "call")
+        try:
+            self._breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            metrics.upstream_calls.inc(self.name, endpoint, "rejected")
+            raise
+        priority = _priority.get() or Priority(INTERACTIVE)
+        if not self._bucket.acquire(priority, MAX_WAIT[priority.level]):
+            self._count("throttled")
+            metrics.upstream_calls.inc(self.name, endpoint, "throttled")
+            # 本地排队超时不计入熔断（上游本身没有失败），但半开状态的试探名额需要归还
+            self._breaker.release_probe()
+            raise RateLimitedError("请求排队超时，请稍后重试")
+        self._count("calls")
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._count("failed")
+            self._breaker.record_failure(e)
+            self._observe(endpoint, started, "error")
+            raise
+        self._breaker.record_success()
+        self._observe(endpoint, started, "ok")
+        return result
+
+    def _observe(self, endpoint: str, started: float, result: str) -> None:
+        metrics.upstream_call_seconds.observe(
+            time.perf_counter() - started, self.name, endpoint
+        )
+        metrics.upstream_calls.inc(self.name, endpoint, result)
+
+    def reset(self) -> None:
+        self._breaker.reset()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self._counts)
+        return {**counts, **self._breaker.stats(), **self._bucket.stats()}
+
+
+_schedulers: Dict[str, UpstreamScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: str) -> UpstreamScheduler:
+    """获取指定上游的调度器（按 UPSTREAM_LIMITS 配置限速）"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = _schedulers[name] = UpstreamScheduler(
+                name, *UPSTREAM_LIMITS[name]
+            )
+        return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict]:
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.stats() for name, scheduler in schedulers.items()}